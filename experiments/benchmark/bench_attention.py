@@ -0,0 +1,123 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Measure the time of attention per output token when the key projection
+   of the encoder outputs (U_a * h_j) is computed once per utterance, against
+   computing it at every decoder step, and with windowed attention. The
+   attention layer runs U steps in a tf.while_loop over random encoder
+   outputs of T frames. In windowed attention, the peak moves along the
+   diagonal.
+
+   Usage:
+       python bench_attention.py [batch_size]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../')
+sys.path.append('../../')
+from models.attention.decoders.attention_layer import AttentionLayer
+
+
+def measure(is_precomputed, batch_size, max_time, num_token, window=None,
+            encoder_num_unit=512, decoder_num_unit=256, attention_dim=256,
+            num_run=5):
+    """
+    Args:
+        is_precomputed: if True, project the encoder outputs once before the
+            loop, else at every step
+        batch_size: int, the size of mini-batch
+        max_time: int, the number of encoder frames (T)
+        num_token: int, the number of decoder steps (U)
+        window: tuple of `(left, right)` frames of windowed attention. If
+            None, attend all frames
+        encoder_num_unit: int, the dimensions of encoder outputs
+        decoder_num_unit: int, the dimensions of decoder states
+        attention_dim: int, the number of units in the attention layer
+        num_run: int, the number of runs to average
+    Returns:
+        duration: float, seconds per output token
+    """
+    rng = np.random.RandomState(0)
+    with tf.Graph().as_default():
+        encoder_states = tf.constant(rng.randn(
+            batch_size, max_time, encoder_num_unit).astype(np.float32))
+        decoder_states = tf.constant(rng.randn(
+            num_token, batch_size, decoder_num_unit).astype(np.float32))
+        values_length = tf.fill([batch_size], max_time)
+        attention_layer = AttentionLayer(num_unit=attention_dim,
+                                         attention_weights_tempareture=1.0,
+                                         window=window)
+
+        with tf.variable_scope('attention') as scope:
+            # Create variables out of the loop
+            att_encoder_states = attention_layer.project_encoder_states(
+                encoder_states)
+            attention_layer(att_encoder_states=att_encoder_states,
+                            current_decoder_state=decoder_states[0],
+                            values=encoder_states,
+                            values_length=values_length,
+                            attention_peak=tf.zeros([batch_size], tf.int32))
+            scope.reuse_variables()
+
+            def body(i, context_sum):
+                if is_precomputed:
+                    att_encoder_states_i = att_encoder_states
+                else:
+                    att_encoder_states_i = \
+                        attention_layer.project_encoder_states(
+                            encoder_states)
+                _, attention_context = attention_layer(
+                    att_encoder_states=att_encoder_states_i,
+                    current_decoder_state=decoder_states[i],
+                    values=encoder_states,
+                    values_length=values_length,
+                    attention_peak=tf.fill([batch_size],
+                                           i * max_time // num_token))
+                return i + 1, context_sum + attention_context
+
+            _, context_sum = tf.while_loop(
+                lambda i, _: i < num_token, body,
+                [tf.constant(0), tf.zeros([batch_size, encoder_num_unit])])
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            sess.run(context_sum)  # Warm up
+            start_time = time.time()
+            for _ in range(num_run):
+                sess.run(context_sum)
+            return (time.time() - start_time) / num_run / num_token
+
+
+def main(batch_size=32, num_token=75, window=(40, 40)):
+    print('batch_size: %d, tokens: %d, window: %s' %
+          (batch_size, num_token, str(window)))
+    print('%8s %16s %16s %8s %16s %8s' %
+          ('frames', 'per step (ms)', 'once (ms)', 'speedup', 'window (ms)',
+           'speedup'))
+    # The last ones are in the scale of CSJ lectures
+    for max_time in [100, 250, 500, 2000, 4000]:
+        duration_step = measure(False, batch_size, max_time, num_token)
+        duration_once = measure(True, batch_size, max_time, num_token)
+        duration_window = measure(True, batch_size, max_time, num_token,
+                                  window=window)
+        print('%8d %16.3f %16.3f %7.2fx %16.3f %7.2fx' %
+              (max_time, duration_step * 1000, duration_once * 1000,
+               duration_step / duration_once, duration_window * 1000,
+               duration_once / duration_window))
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) == 2:
+        main(batch_size=int(args[1]))
+    else:
+        main()
@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Measure how long the training thread is blocked by saving a checkpoint of
+   BLSTM-CTC (with Adam slots), with tf.train.Saver and with CheckpointSaver
+   which writes in the background.
+
+   Usage:
+       python bench_checkpoint.py [num_unit]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import tempfile
+import shutil
+from os.path import join
+import tensorflow as tf
+
+sys.path.append('../')
+sys.path.append('../../')
+from models.ctc.blstm_ctc import BLSTM_CTC
+from utils.checkpoint import CheckpointSaver
+
+
+def measure(num_unit, num_save=5):
+    """
+    Args:
+        num_unit: int, the number of units in each layer
+        num_save: int, the number of checkpoints to save
+    Returns:
+        duration_sync: float, seconds per save by tf.train.Saver
+        duration_async: float, seconds per save by CheckpointSaver (the time
+            to take a snapshot)
+        duration_flush: float, seconds to wait for the remaining writes
+    """
+    model_dir = tempfile.mkdtemp()
+    try:
+        with tf.Graph().as_default():
+            network = BLSTM_CTC(batch_size=1,
+                                input_size=123,
+                                num_unit=num_unit,
+                                num_layer=5,
+                                output_size=61)
+            inputs_pl = tf.placeholder(tf.float32,
+                                       shape=[None, None, network.input_size])
+            labels_pl = tf.SparseTensor(tf.placeholder(tf.int64),
+                                        tf.placeholder(tf.int32),
+                                        tf.placeholder(tf.int64))
+            inputs_seq_len_pl = tf.placeholder(tf.int64, shape=[None])
+            loss, _ = network.compute_loss(inputs_pl, labels_pl,
+                                           inputs_seq_len_pl)
+            network.train(loss, optimizer='adam', learning_rate_init=1e-3)
+            saver = tf.train.Saver(max_to_keep=None)
+            checkpointer = CheckpointSaver(model_dir, num_keep_last=2)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+
+                start_time = time.time()
+                for epoch in range(num_save):
+                    saver.save(sess, join(model_dir, 'sync.ckpt'),
+                               global_step=epoch)
+                duration_sync = (time.time() - start_time) / num_save
+
+                start_time = time.time()
+                for epoch in range(num_save):
+                    checkpointer.save(sess, epoch, state={'step': epoch})
+                duration_async = (time.time() - start_time) / num_save
+
+                start_time = time.time()
+                checkpointer.close()
+                duration_flush = time.time() - start_time
+    finally:
+        shutil.rmtree(model_dir)
+
+    return duration_sync, duration_async, duration_flush
+
+
+def main(num_unit=512):
+    duration_sync, duration_async, duration_flush = measure(num_unit)
+    print('tf.train.Saver:  %.3f sec/save' % duration_sync)
+    print('CheckpointSaver: %.3f sec/save (+ %.3f sec to flush at the end)' %
+          (duration_async, duration_flush))
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) == 2:
+        main(num_unit=int(args[1]))
+    else:
+        main()
@@ -0,0 +1,153 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Measure the real time factor (RTF) of CTC beam search decoding: the
+   in-graph tf.nn.ctc_beam_search_decoder against the numpy prefix beam
+   search (BeamSearchDecoder) in 1 or more processes, with and without a
+   bigram language model. Posteriors are random but peaky like those of
+   trained CTC models (most frames are blank).
+
+   Usage:
+       python bench_ctc_decoder.py [num_process]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../')
+sys.path.append('../../')
+from models.ctc.decoders.beam_search_decoder import BeamSearchDecoder
+from models.ctc.decoders.ngram_lm import NgramLM
+
+
+def generate_posteriors(batch_size, num_classes=62, seed=0):
+    """Generate log-posteriors of a mini-batch in the TIMIT scale (the
+       blank class is the last one).
+    Args:
+        batch_size: int, the size of mini-batch
+        num_classes: int, the number of classes including blank
+        seed: int, random seed
+    Returns:
+        log_probs: A tensor of size `[batch_size, max_time, num_classes]`
+        inputs_seq_len: A tensor of size `[batch_size]`
+        labels: list of label sequences used to make the posteriors
+    """
+    rng = np.random.RandomState(seed)
+    inputs_seq_len = rng.randint(100, 250, size=batch_size)
+    max_time = inputs_seq_len.max()
+
+    logits = rng.randn(batch_size, max_time, num_classes)
+    logits[:, :, -1] += 6
+    labels = []
+    for i_batch in range(batch_size):
+        # A token is dominant at about one frame in four
+        frames = np.sort(rng.choice(inputs_seq_len[i_batch],
+                                    size=inputs_seq_len[i_batch] // 4,
+                                    replace=False))
+        labels.append(rng.randint(0, num_classes - 1, size=len(frames)))
+        logits[i_batch, frames, labels[-1]] += 10
+    logits -= logits.max(axis=2, keepdims=True)
+    log_probs = logits - np.log(np.exp(logits).sum(axis=2, keepdims=True))
+    return log_probs.astype(np.float32), inputs_seq_len, labels
+
+
+def write_bigram_arpa(labels, num_classes, arpa_path):
+    """Write a rough bigram language model (add-one unigrams and relative
+       frequencies of bigrams with a constant back-off weight). This is only
+       to measure speed.
+    """
+    unigrams = np.ones(num_classes - 1)
+    bigrams = {}
+    for seq in labels:
+        for i, token in enumerate(seq):
+            unigrams[token] += 1
+            if i > 0:
+                bigrams[(seq[i - 1], token)] = bigrams.get(
+                    (seq[i - 1], token), 0) + 1
+
+    with open(arpa_path, 'w') as f:
+        f.write('\\data\\\nngram 1=%d\nngram 2=%d\n\n\\1-grams:\n' %
+                (num_classes + 1, len(bigrams)))
+        f.write('-99 <s> -0.5\n-1.0 </s>\n')
+        for token, count in enumerate(unigrams):
+            f.write('%f %d -0.5\n' % (np.log10(count / unigrams.sum()),
+                                      token))
+        f.write('\n\\2-grams:\n')
+        for (prev, token), count in bigrams.items():
+            f.write('%f %d %d\n' % (np.log10(count / unigrams[prev]),
+                                    prev, token))
+        f.write('\n\\end\\\n')
+
+
+def measure_tf(log_probs, inputs_seq_len, beam_width):
+    with tf.Graph().as_default():
+        # Log-posteriors are valid logits
+        logits_pl = tf.placeholder(tf.float32,
+                                   shape=[None, None, log_probs.shape[2]])
+        seq_len_pl = tf.placeholder(tf.int32, shape=[None])
+        decoded, _ = tf.nn.ctc_beam_search_decoder(
+            tf.transpose(logits_pl, (1, 0, 2)), seq_len_pl,
+            beam_width=beam_width)
+        with tf.Session() as sess:
+            feed_dict = {logits_pl: log_probs, seq_len_pl: inputs_seq_len}
+            sess.run(decoded, feed_dict=feed_dict)  # Warm up
+            start_time = time.time()
+            sess.run(decoded, feed_dict=feed_dict)
+            return time.time() - start_time
+
+
+def measure_numpy(decoder, log_probs, inputs_seq_len, num_process):
+    start_time = time.time()
+    decoder.decode_batch(log_probs, inputs_seq_len, num_process=num_process)
+    return time.time() - start_time
+
+
+def main(num_process=4, batch_size=32, beam_width=20, frame_shift=0.03):
+    log_probs, inputs_seq_len, labels = generate_posteriors(batch_size)
+    num_classes = log_probs.shape[2]
+    duration_audio = inputs_seq_len.sum() * frame_shift
+
+    arpa_path = tempfile.mktemp(suffix='.arpa')
+    write_bigram_arpa(labels, num_classes, arpa_path)
+    try:
+        lm = NgramLM(arpa_path)
+    finally:
+        os.remove(arpa_path)
+    vocab = [str(i) for i in range(num_classes - 1)]
+
+    results = [('tf.nn.ctc_beam_search_decoder',
+                measure_tf(log_probs, inputs_seq_len, beam_width))]
+    decoder = BeamSearchDecoder(blank_index=num_classes - 1,
+                                beam_width=beam_width)
+    decoder_lm = BeamSearchDecoder(blank_index=num_classes - 1,
+                                   beam_width=beam_width, lm=lm, vocab=vocab,
+                                   lm_weight=0.5, insertion_bonus=1.0)
+    for name, decoder_i in [('numpy', decoder), ('numpy + LM', decoder_lm)]:
+        for num_process_i in sorted(set([1, num_process])):
+            results.append(('%s (%d proc)' % (name, num_process_i),
+                            measure_numpy(decoder_i, log_probs,
+                                          inputs_seq_len, num_process_i)))
+
+    print('%d utterances, %.1f sec of audio, beam width %d' %
+          (batch_size, duration_audio, beam_width))
+    print('%-36s %10s %8s' % ('decoder', 'sec', 'RTF'))
+    for name, duration in results:
+        print('%-36s %10.3f %8.4f' %
+              (name, duration, duration / duration_audio))
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) == 2:
+        main(num_process=int(args[1]))
+    else:
+        main()
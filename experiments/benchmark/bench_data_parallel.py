@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Measure the scaling of data-parallel training of BLSTM-CTC with 1, 2, 4
+   and 8 towers on CPU devices. A mini-batch of random data is split into
+   towers, and gradients of all towers are averaged and applied once.
+
+   Usage:
+       python bench_data_parallel.py [batch_size]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../')
+sys.path.append('../../')
+from models.ctc.blstm_ctc import BLSTM_CTC
+from models.data_parallel import tower_scopes, split_batch, session_config
+from utils.sparsetensor import list2sparsetensor
+
+
+def generate_data(batch_size, input_size=123, output_size=61, seed=0):
+    """Generate a mini-batch of random inputs and labels in the TIMIT scale.
+    Args:
+        batch_size: int, the size of mini-batch
+        input_size: int, the dimensions of input vectors
+        output_size: int, the number of classes (except for blank class)
+        seed: int, random seed
+    Returns:
+        inputs: A tensor of size `[batch_size, max_time, input_size]`
+        labels: list of target labels
+        inputs_seq_len: A tensor of size `[batch_size]`
+    """
+    rng = np.random.RandomState(seed)
+    inputs_seq_len = rng.randint(200, 400, size=batch_size)
+    inputs = rng.randn(batch_size, inputs_seq_len.max(),
+                       input_size).astype(np.float32)
+    labels = [rng.randint(0, output_size, size=seq_len // 8)
+              for seq_len in inputs_seq_len]
+    return inputs, labels, inputs_seq_len
+
+
+def measure(num_tower, inputs, labels, inputs_seq_len, num_step=20):
+    """
+    Args:
+        num_tower: int, the number of towers
+        inputs, labels, inputs_seq_len: a mini-batch
+        num_step: int, the number of training steps to measure
+    Returns:
+        duration: float, seconds per step
+    """
+    with tf.Graph().as_default():
+        network = BLSTM_CTC(batch_size=len(inputs),
+                            input_size=inputs.shape[2],
+                            num_unit=256,
+                            num_layer=3,
+                            output_size=61,
+                            clip_grad=5.0)
+
+        inputs_pl_list, labels_pl_list, inputs_seq_len_pl_list = [], [], []
+        tower_losses = []
+        for i_tower, scope in tower_scopes(num_tower):
+            inputs_pl_list.append(tf.placeholder(
+                tf.float32, shape=[None, None, network.input_size]))
+            labels_pl_list.append(tf.SparseTensor(
+                tf.placeholder(tf.int64),
+                tf.placeholder(tf.int32),
+                tf.placeholder(tf.int64)))
+            inputs_seq_len_pl_list.append(
+                tf.placeholder(tf.int64, shape=[None]))
+            loss, _ = network.compute_loss(inputs_pl_list[-1],
+                                           labels_pl_list[-1],
+                                           inputs_seq_len_pl_list[-1],
+                                           num_gpu=num_tower,
+                                           scope=scope)
+            tower_losses.append(loss)
+        train_op = network.train(tower_losses if num_tower > 1 else loss,
+                                 optimizer='adam',
+                                 learning_rate_init=1e-3)
+
+        feed_dict = {network.keep_prob_input: 1.0,
+                     network.keep_prob_hidden: 1.0}
+        for i_tower, indices in enumerate(
+                split_batch(inputs_seq_len, num_tower=num_tower)[0]):
+            max_frame_num = max(inputs_seq_len[indices])
+            feed_dict[inputs_pl_list[i_tower]] = inputs[
+                indices, :max_frame_num]
+            feed_dict[labels_pl_list[i_tower]] = list2sparsetensor(
+                [labels[j] for j in indices])
+            feed_dict[inputs_seq_len_pl_list[i_tower]] = inputs_seq_len[
+                indices]
+
+        with tf.Session(config=session_config(num_tower)) as sess:
+            sess.run(tf.global_variables_initializer())
+
+            # Warm up
+            for _ in range(3):
+                sess.run(train_op, feed_dict=feed_dict)
+
+            start_time = time.time()
+            for _ in range(num_step):
+                sess.run(train_op, feed_dict=feed_dict)
+            return (time.time() - start_time) / num_step
+
+
+def main(batch_size=64):
+    inputs, labels, inputs_seq_len = generate_data(batch_size)
+    print('%-8s %12s %12s %12s %8s' %
+          ('towers', 'sec/step', 'steps/sec', 'utt/sec', 'speedup'))
+    duration_single = None
+    for num_tower in [1, 2, 4, 8]:
+        duration = measure(num_tower, inputs, labels, inputs_seq_len)
+        if duration_single is None:
+            duration_single = duration
+        print('%-8d %12.3f %12.2f %12.1f %7.2fx' %
+              (num_tower, duration, 1 / duration, batch_size / duration,
+               duration_single / duration))
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) == 2:
+        main(batch_size=int(args[1]))
+    else:
+        main()
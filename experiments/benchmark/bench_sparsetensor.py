@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compare the conversion between lists and sparse tensors with the
+   previous (per-label loop) implementations.
+
+   Usage:
+       python bench_sparsetensor.py
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import timeit
+from collections import namedtuple
+import numpy as np
+
+sys.path.append('../')
+from utils.sparsetensor import list2sparsetensor, sparsetensor2list
+
+SparseTensorValue = namedtuple('SparseTensorValue',
+                               ['indices', 'values', 'dense_shape'])
+
+
+def list2sparsetensor_loop(labels):
+    """The previous implementation of list2sparsetensor."""
+    indices, values = [], []
+    for i_utt, each_label in enumerate(labels):
+        for i_l, l in enumerate(each_label):
+            indices.append([i_utt, i_l])
+            values.append(l)
+    dense_shape = [len(labels), np.asarray(indices).max(0)[1] + 1]
+    return [np.array(indices), np.array(values), np.array(dense_shape)]
+
+
+def sparsetensor2list_loop(labels_st, batch_size):
+    """The previous implementation of sparsetensor2list."""
+    indices = labels_st.indices
+    values = labels_st.values
+    labels = []
+    batch_boundary = np.where(indices[:, 1] == 0)[0]
+    for i in range(batch_size - 1):
+        labels.append(values[batch_boundary[i]:batch_boundary[i + 1]].tolist())
+    labels.append(values[batch_boundary[-1]:].tolist())
+    return labels
+
+
+def main():
+    rng = np.random.RandomState(0)
+    number = 100
+    print('%-12s %-10s %12s %12s %8s' %
+          ('batch_size', 'label_len', 'loop [ms]', 'numpy [ms]', 'speedup'))
+    for batch_size in [32, 64, 256]:
+        for label_len in [30, 100]:
+            labels = [rng.randint(0, 61, size=rng.randint(1, label_len * 2))
+                      for _ in range(batch_size)]
+            labels_st = SparseTensorValue(*list2sparsetensor(labels))
+
+            for name, func_loop, func, args in [
+                    ('list2st', list2sparsetensor_loop, list2sparsetensor,
+                     (labels,)),
+                    ('st2list', sparsetensor2list_loop, sparsetensor2list,
+                     (labels_st, batch_size))]:
+                time_loop = timeit.timeit(
+                    lambda: func_loop(*args), number=number) / number
+                time_numpy = timeit.timeit(
+                    lambda: func(*args), number=number) / number
+                print('%-12s %-10s %12.3f %12.3f %7.1fx  (%s)' %
+                      (batch_size, label_len, time_loop * 1000,
+                       time_numpy * 1000, time_loop / time_numpy, name))
+
+
+if __name__ == '__main__':
+    main()
@@ -11,11 +11,13 @@ from __future__ import print_function
 
 from os.path import join, basename
 import pickle
-import random
 import numpy as np
 from tqdm import tqdm
 
-from utils.data.frame_stack import stack_frame
+from utils.frame_stack import stack_frame, stack_frame_utterance, stacked_frame_num
+from utils.packed_dataset import PackedArray
+from utils.sampler import BucketSampler
+from utils.cluster_loader import ClusterLoader
 
 
 class DataSet(object):
@@ -23,7 +25,9 @@ class DataSet(object):
 
     def __init__(self, data_type, train_data_size, label_type_main,
                  label_type_second, num_stack=None, num_skip=None,
-                 is_sorted=True, is_progressbar=False):
+                 is_sorted=True, is_progressbar=False, is_packed=False,
+                 bucket_width=20, seed=None, is_lazy_stack=False,
+                 dtype=np.float32, storage_dtype=None, max_resident_cluster=2):
         """
         Args:
             data_type: train or train_all dev or eval1 or eval2 or eval3
@@ -32,8 +36,25 @@ class DataSet(object):
             label_type_second: phone or character
             num_stack: int, the number of frames to stack
             num_skip: int, the number of frames to skip
-            is_sorted: if True, sort dataset by frame num
+            is_sorted: if True, make mini-batches of utterances which have
+                similar frame num (length-bucketed), else sample randomly
             is_progressbar: if True, visualize progressbar
+            is_packed: if True, memory-map the packed dataset made by
+                utils/packed_dataset.py instead of loading each file
+            bucket_width: int, the width of each bucket (the number of
+                frames) when is_sorted is True
+            seed: int, random seed for sampling mini-batches
+            is_lazy_stack: if True, stack frames of only utterances in each
+                mini-batch, so that stacked inputs of the whole dataset are
+                not kept in memory
+            dtype: data type of inputs in mini-batches
+            storage_dtype: data type to keep inputs in memory. If None, the
+                same as dtype. ex.) np.float16 halves memory and inputs are
+                upcast to dtype in each mini-batch
+            max_resident_cluster: int, the maximum number of clusters in
+                memory (train only). If 2 or more, the next clusters are
+                loaded and stacked in the background during training.
+                If 1, each cluster is loaded when the previous one runs out
         """
         if data_type not in ['train', 'dev', 'eval1', 'eval2', 'eval3']:
             raise ValueError(
@@ -48,6 +69,14 @@ class DataSet(object):
         self.num_skip = num_skip
         self.is_sorted = is_sorted
         self.is_progressbar = is_progressbar
+        self.is_packed = is_packed
+        self.bucket_width = bucket_width
+        self.seed = seed
+        self.dtype = dtype
+        self.storage_dtype = dtype if storage_dtype is None else storage_dtype
+        self.is_lazy_stack = is_lazy_stack and (
+            num_stack is not None) and (num_skip is not None)
+        self.rng = np.random.RandomState(seed)
 
         self.input_size = 123
         self.input_size = self.input_size * self.num_stack
@@ -84,6 +113,15 @@ class DataSet(object):
         self.label_main_paths = np.array(label_main_paths)
         self.label_second_paths = np.array(label_second_paths)
 
+        if is_packed:
+            # Only the index is read here
+            self.packed_input = PackedArray(
+                join(self.dataset_main_path, 'packed', 'input'))
+            self.packed_label_main = PackedArray(
+                join(self.dataset_main_path, 'packed', 'label'))
+            self.packed_label_second = PackedArray(
+                join(self.dataset_second_path, 'packed', 'label'))
+
         # Divide dataset into some clusters
         # total: 384198 utterances (train)
         # total: 896755 utterances (train_all)
@@ -92,52 +130,146 @@ class DataSet(object):
         elif train_data_size == 'large':
             self.num_cluster = 15
         if data_type in ['train', 'train_all']:
-            self.rest_cluster = self.num_cluster - 1
             self.data_num_cluster = int(
                 (self.data_num / self.num_cluster) / 128) * 128
-            self.input_paths_cluster = self.input_paths[0:self.data_num_cluster]
-            self.label_main_paths_cluster = self.label_main_paths[0:self.data_num_cluster]
-            self.label_second_paths_cluster = self.label_second_paths[0:self.data_num_cluster]
         else:
-            self.rest_cluster = 0
+            self.num_cluster = 1
             self.data_num_cluster = self.data_num
-            self.input_paths_cluster = self.input_paths
-            self.label_main_paths_cluster = self.label_main_paths
-            self.label_second_paths_cluster = self.label_second_paths
+        self.cluster_index = 0
+
+        # Length-bucketed sampler (random sampling if not sorted). One
+        # sampler is used over all clusters, so that its epoch, RNG and
+        # padding efficiency are carried over
+        self.sampler = BucketSampler(
+            [], bucket_width=bucket_width if is_sorted else None,
+            seed=self.rng)
+
+        # Load the next clusters in the background
+        self.is_async_cluster = self.num_cluster > 1 and (
+            max_resident_cluster > 1)
+        self.max_resident_cluster = max_resident_cluster
+        if self.is_async_cluster:
+            self.cluster_loader = ClusterLoader(
+                self._load_cluster, self.num_cluster,
+                max_resident_cluster=max_resident_cluster)
+        else:
+            self.cluster_loader = None
 
         # Load dataset in one cluster
         self.next_cluster()
-        self.next_cluster_flag = False
 
-    def next_cluster(self):
+    def _load_cluster(self, cluster_index):
+        """Load (and stack) inputs & labels in one cluster.
+        Args:
+            cluster_index: int, the index of the cluster
+        Returns:
+            input_list: np.ndarray of inputs
+            label_main_list: np.ndarray of labels for the main task
+            label_second_list: np.ndarray of labels for the second task
+        """
+        offset = cluster_index * self.data_num_cluster
+        input_paths = self.input_paths[offset:offset + self.data_num_cluster]
+        label_main_paths = self.label_main_paths[
+            offset:offset + self.data_num_cluster]
+        label_second_paths = self.label_second_paths[
+            offset:offset + self.data_num_cluster]
+
         # Load all dataset
-        print('=> Loading next cluster...')
-        self.input_list, self.label_main_list, self.label_second_list = [], [], []
-        iterator = tqdm(range(self.data_num_cluster)
-                        ) if self.is_progressbar else range(self.data_num_cluster)
-        for i in iterator:
-            self.input_list.append(
-                np.load(self.input_paths_cluster[i]))
-            self.label_main_list.append(
-                np.load(self.label_main_paths_cluster[i]))
-            self.label_second_list.append(
-                np.load(self.label_second_paths_cluster[i]))
-        self.input_list = np.array(self.input_list)
-        self.label_main_list = np.array(self.label_main_list)
-        self.label_second_list = np.array(self.label_second_list)
+        if self.is_packed:
+            input_names = [basename(path).split('.')[0]
+                           for path in input_paths]
+            input_list = self.packed_input.load(input_names,
+                                                dtype=self.storage_dtype)
+            label_main_list = self.packed_label_main.load(input_names)
+            label_second_list = self.packed_label_second.load(input_names)
+        else:
+            input_list, label_main_list, label_second_list = [], [], []
+            # NOTE: progressbar is not shown in the background
+            is_progressbar = self.is_progressbar and (
+                not self.is_async_cluster)
+            iterator = tqdm(range(self.data_num_cluster)
+                            ) if is_progressbar else range(self.data_num_cluster)
+            for i in iterator:
+                input_list.append(
+                    np.load(input_paths[i]).astype(self.storage_dtype))
+                label_main_list.append(np.load(label_main_paths[i]))
+                label_second_list.append(np.load(label_second_paths[i]))
+            input_list = np.array(input_list)
+            label_main_list = np.array(label_main_list)
+            label_second_list = np.array(label_second_list)
 
         # Frame stacking
-        if (self.num_stack is not None) and (self.num_skip is not None):
-            print('=> Stacking frames...')
-            stacked_input_list = stack_frame(self.input_list,
-                                             self.input_paths_cluster,
+        if (self.num_stack is not None) and (self.num_skip is not None) and (
+                not self.is_lazy_stack):
+            stacked_input_list = stack_frame(input_list,
+                                             input_paths,
                                              self.frame_num_dict,
                                              self.num_stack,
-                                             self.num_skip,
-                                             self.is_progressbar)
-            self.input_list = np.array(stacked_input_list)
+                                             self.num_skip)
+            input_list = np.array(stacked_input_list)
+
+        return input_list, label_main_list, label_second_list
+
+    def next_cluster(self):
+        """Set the cluster of cluster_index for sampling mini-batches."""
+        offset = self.cluster_index * self.data_num_cluster
+        self.input_paths_cluster = self.input_paths[
+            offset:offset + self.data_num_cluster]
+
+        # Release the previous cluster before loading the next one
+        self.input_list = None
+        self.label_main_list, self.label_second_list = None, None
+        if self.is_async_cluster:
+            cluster_index, cluster = self.cluster_loader.next()
+            assert cluster_index == self.cluster_index
+        else:
+            print('=> Loading next cluster...')
+            cluster = self._load_cluster(self.cluster_index)
+        self.input_list, self.label_main_list, self.label_second_list = cluster
 
-        self.rest = set([j for j in range(len(self.input_paths_cluster))])
+        # Sample mini-batches from the new cluster
+        self.sampler.set_frame_num_list(self._frame_num_list())
+
+        # The state to sample this cluster again (set at once because
+        # state_dict can be called from another thread)
+        self._cluster_state = {'cluster_index': self.cluster_index,
+                               'sampler': self.sampler.state_dict()}
+
+    def state_dict(self):
+        """Return the state to draw mini-batches from the beginning of the
+           current cluster again.
+        Returns:
+            state: dictionary of the cluster index and the state of the
+                sampler
+        """
+        return self._cluster_state
+
+    def load_state_dict(self, state):
+        """Restore the state returned by state_dict. The cluster is loaded
+           again and the next mini-batch is the first one of the cluster.
+           Call this before drawing mini-batches in another thread.
+        Args:
+            state: dictionary of the cluster index and the state of the
+                sampler
+        """
+        self.cluster_index = state['cluster_index']
+        if self.is_async_cluster:
+            # Load clusters from the restored one
+            self.cluster_loader.stop()
+            self.cluster_loader = ClusterLoader(
+                self._load_cluster, self.num_cluster,
+                max_resident_cluster=self.max_resident_cluster,
+                start_index=self.cluster_index)
+        self.next_cluster()
+        self.sampler.load_state_dict(state['sampler'])
+        self._cluster_state = state
+
+    def _frame_num_list(self):
+        """Return the number of frames of each utterance after stacking."""
+        if self.is_lazy_stack:
+            return [stacked_frame_num(data_i.shape[0], self.num_skip)
+                    for data_i in self.input_list]
+        return [data_i.shape[0] for data_i in self.input_list]
 
     def next_batch(self, batch_size):
         """Make mini batch.
@@ -152,116 +284,46 @@ class DataSet(object):
             seq_len: list of length of each label, size batch_size
             input_names: list of file name of input data, size batch_size
         """
-        #########################
-        # sorted dataset
-        #########################
-        if self.is_sorted:
-            if len(self.rest) > batch_size:
-                sorted_indices = list(self.rest)[:batch_size]
-                self.rest -= set(sorted_indices)
-
-            else:
-                sorted_indices = list(self.rest)
-                if self.data_type == 'train':
-                    self.next_cluster_flag = True
-                    print('---Next cluster---')
-                else:
-                    self.rest = set(
-                        [i for i in range(len(self.input_paths_cluster))])
-
-            # Compute max frame num in mini batch
-            max_frame_num = self.input_list[sorted_indices[-1]].shape[0]
-
-            # Shuffle selected mini batch (0 ~ len(self.rest)-1)
-            random.shuffle(sorted_indices)
-
-            # Initialization
-            input_data = np.zeros(
-                (len(sorted_indices), max_frame_num, self.input_size))
-            labels_main = [None] * len(sorted_indices)
-            labels_second = [None] * len(sorted_indices)
-            seq_len = np.empty((len(sorted_indices),))
-            input_names = [None] * len(sorted_indices)
-
-            # Set values of each data in mini batch
-            for i_batch, x in enumerate(sorted_indices):
-                data_i = self.input_list[x]
-                frame_num = data_i.shape[0]
-                input_data[i_batch, :frame_num, :] = data_i
-                labels_main[i_batch] = self.label_main_list[x]
-                labels_second[i_batch] = self.label_second_list[x]
-                seq_len[i_batch] = frame_num
-                input_names[i_batch] = basename(
-                    self.input_paths_cluster[x]).split('.')[0]
-
-            if self.next_cluster_flag:
-                if self.rest_cluster >= 1:
-                    # Set fot the next clusters
-                    frame_offset = (self.num_cluster -
-                                    self.rest_cluster) * self.data_num_cluster
-                    self.input_paths_cluster = self.input_paths[frame_offset:frame_offset +
-                                                                self.data_num_cluster]
-                    self.label_main_paths_cluster = self.label_main_paths[frame_offset: frame_offset +
-                                                                          self.data_num_cluster]
-                    self.label_second_paths_cluster = self.label_second_paths[frame_offset: frame_offset +
-                                                                              self.data_num_cluster]
-                    self.rest_cluster -= 1
-                else:
-                    # Initialize clusters
-                    if self.data_type == 'train':
-                        self.rest_cluster = self.num_cluster - 1
-                        self.input_paths_cluster = self.input_paths[0: self.data_num_cluster]
-                        self.label_main_paths_cluster = self.label_main_paths[0: self.data_num_cluster]
-                        self.label_second_paths_cluster = self.label_second_paths[
-                            0: self.data_num_cluster]
-                        print('---Next epoch---')
-
-                # Load dataset in the next cluster
-                self.next_cluster()
-                self.next_cluster_flag = False
-
-        #########################
-        # not sorted dataset
-        #########################
+        indices, is_new_epoch = self.sampler.next(batch_size)
+
+        # Stack frames of utterances in mini batch
+        if self.is_lazy_stack:
+            input_list = [stack_frame_utterance(self.input_list[x],
+                                                self.num_stack,
+                                                self.num_skip)
+                          for x in indices]
         else:
-            if len(self.rest) > batch_size:
-                # Randomly sample mini batch
-                random_indices = random.sample(list(self.rest), batch_size)
-                self.rest -= set(random_indices)
-
-            else:
-                random_indices = list(self.rest)
-                self.rest = set(
-                    [i for i in range(len(self.input_paths_cluster))])
-                if self.data_type == 'train':
-                    print('---Next epoch---')
-
-                # Shuffle selected mini batch (0 ~ len(self.rest)-1)
-                random.shuffle(random_indices)
-
-            # Compute max frame num in mini batch
-            frame_num_list = []
-            for data_i in self.input_list[random_indices]:
-                frame_num_list.append(data_i.shape[0])
-            max_frame_num = max(frame_num_list)
-
-            # Initialization
-            input_data = np.zeros(
-                (len(random_indices), max_frame_num, self.input_size))
-            labels_main = [None] * len(random_indices)
-            labels_second = [None] * len(random_indices)
-            seq_len = np.empty((len(random_indices),))
-            input_names = [None] * len(random_indices)
-
-            # Set values of each data in mini batch
-            for i_batch, x in enumerate(random_indices):
-                data_i = self.input_list[x]
-                frame_num = data_i.shape[0]
-                input_data[i_batch, : frame_num, :] = data_i
-                labels_main[i_batch] = self.label_main_list[x]
-                labels_second[i_batch] = self.label_second_list[x]
-                seq_len[i_batch] = frame_num
-                input_names[i_batch] = basename(
-                    self.input_paths_cluster[x]).split('.')[0]
+            input_list = [self.input_list[x] for x in indices]
+
+        # Compute max frame num in mini batch
+        max_frame_num = max([data_i.shape[0] for data_i in input_list])
+
+        # Initialization
+        input_data = np.zeros(
+            (len(indices), max_frame_num, self.input_size), dtype=self.dtype)
+        labels_main = [None] * len(indices)
+        labels_second = [None] * len(indices)
+        seq_len = np.empty((len(indices),))
+        input_names = [None] * len(indices)
+
+        # Set values of each data in mini batch
+        for i_batch, x in enumerate(indices):
+            data_i = input_list[i_batch]
+            frame_num = data_i.shape[0]
+            input_data[i_batch, :frame_num, :] = data_i
+            labels_main[i_batch] = self.label_main_list[x]
+            labels_second[i_batch] = self.label_second_list[x]
+            seq_len[i_batch] = frame_num
+            input_names[i_batch] = basename(
+                self.input_paths_cluster[x]).split('.')[0]
+
+        if is_new_epoch and self.data_type == 'train':
+            print('---Next cluster---')
+            self.cluster_index = (self.cluster_index + 1) % self.num_cluster
+            if self.cluster_index == 0:
+                print('---Next epoch---')
+
+            # Load dataset in the next cluster
+            self.next_cluster()
 
         return input_data, labels_main, labels_second, seq_len, input_names
@@ -11,7 +11,7 @@ from tqdm import tqdm
 
 sys.path.append('../../')
 sys.path.append('../../../')
-from utils.data.sparsetensor import list2sparsetensor
+from utils.sparsetensor import list2sparsetensor
 from read_dataset_ctc import DataSet
 
 
@@ -30,6 +30,40 @@ class TestReadDatasetCTC(unittest.TestCase):
             print(labels[0])
             # indices, values, shape = list2sparsetensor(labels)
 
+    def test_resume(self):
+        batch_size = 64
+
+        def draw_names(dataset, num_batch):
+            names = []
+            for _ in range(num_batch):
+                input_names = dataset.next_batch(batch_size)[3]
+                names.append(list(input_names))
+            return names
+
+        dataset = DataSet(data_type='train', train_data_size='default',
+                          label_type='character',
+                          num_stack=3, num_skip=3,
+                          is_sorted=True, seed=1)
+
+        # Cross the boundary of the first cluster
+        while dataset.cluster_index == 0:
+            dataset.next_batch(batch_size)
+        state_boundary = dataset.state_dict()
+        names = draw_names(dataset, 10)
+        # The state in a cluster is that of the beginning of the cluster
+        state_middle = dataset.state_dict()
+        self.assertEqual(state_middle['cluster_index'], 1)
+
+        for state in [state_boundary, state_middle]:
+            dataset_resumed = DataSet(data_type='train',
+                                      train_data_size='default',
+                                      label_type='character',
+                                      num_stack=3, num_skip=3,
+                                      is_sorted=True, seed=2)
+            dataset_resumed.load_state_dict(state)
+            self.assertEqual(dataset_resumed.cluster_index, 1)
+            self.assertEqual(draw_names(dataset_resumed, 10), names)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -15,7 +15,7 @@ from tqdm import tqdm
 
 from utils.labels.character import num2char
 from utils.labels.phone import num2phone
-from utils.data.sparsetensor import list2sparsetensor, sparsetensor2list
+from utils.sparsetensor import list2sparsetensor, sparsetensor2list
 from utils.exception_func import exception
 
 
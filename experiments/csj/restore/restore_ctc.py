@@ -19,6 +19,7 @@ from data.read_dataset_ctc import DataSet
 from models.ctc.load_model import load
 # from evaluation.eval_ctc import do_eval_per, do_eval_cer, decode_test, posterior_test
 from evaluation.eval_ctc import do_eval_per, do_eval_cer, decode_test
+from utils.checkpoint import compatible_var_dict
 
 
 def do_restore(network, label_type, num_stack, num_skip, epoch=None):
@@ -50,9 +51,6 @@ def do_restore(network, label_type, num_stack, num_skip, epoch=None):
     posteriors_op = network.posteriors(decode_op)
     per_op = network.ler(decode_op)
 
-    # Create a saver for writing training checkpoints
-    saver = tf.train.Saver()
-
     with tf.Session() as sess:
         ckpt = tf.train.get_checkpoint_state(network.model_dir)
 
@@ -63,6 +61,9 @@ def do_restore(network, label_type, num_stack, num_skip, epoch=None):
             if epoch is not None:
                 model_path = model_path.split('/')[:-1]
                 model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
+            # Checkpoints with the legacy names of output layers can also
+            # be restored
+            saver = tf.train.Saver(compatible_var_dict(model_path))
             saver.restore(sess, model_path)
             print("Model restored: " + model_path)
         else:
@@ -21,7 +21,14 @@ sys.path.append('../../../')
 from data.read_dataset_multitask_ctc import DataSet
 from models.ctc.load_model_multitask import load
 from evaluation.eval_ctc import do_eval_per, do_eval_cer
-from utils.data.sparsetensor import list2sparsetensor, sparsetensor2list
+from utils.sparsetensor import list2sparsetensor, sparsetensor2list
+from models.data_parallel import split_batch
+from utils.prefetch import Prefetcher
+from utils.timer import StepTimer
+from utils.profiler import Profiler
+from utils.scheduler import LearningRateScheduler, EarlyStopping
+from utils.checkpoint import CheckpointSaver, restore_latest_checkpoint
+from utils.monitor import Monitor
 from utils.util import mkdir, mkdir_join
 from utils.parameter import count_total_parameters
 from utils.loss import save_loss
@@ -29,7 +36,11 @@ from utils.loss import save_loss
 
 def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
              label_type_main, label_type_second, num_stack, num_skip,
-             train_data_size):
+             train_data_size, num_prefetch=0,
+             storage_dtype=None, monitor_decode_type='greedy',
+             num_accumulate=1, is_resume=False, num_keep_last=None,
+             num_keep_best=1,
+             profile_steps=None, lr_scheduler=None, early_stopping=None):
     """Run training.
     Args:
         network: network to train
@@ -42,28 +53,62 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
         num_stack: int, the number of frames to stack
         num_skip: int, the number of frames to skip
         train_data_size: default or large
+        num_prefetch: int, the number of mini-batches to prefetch in the
+            background. If 0, mini-batches are made in the main thread.
+        storage_dtype: data type to keep inputs in memory.
+            ex.) float32, float16. If None, float32
+        monitor_decode_type: greedy or beam_search, the decoder to compute
+            LER at each report. Evaluation per epoch always uses beam search
+        num_accumulate: int, the number of micro-batches to accumulate
+            gradients over before one update. Each mini-batch is sorted by
+            length and split into num_accumulate micro-batches, so that the
+            effective batch size is batch_size while only
+            batch_size / num_accumulate utterances are in memory at a time
+        is_resume: if True, resume training from the latest checkpoint in
+            network.model_dir
+        num_keep_last: int, the number of the latest checkpoints to keep.
+            If None, all checkpoints are kept
+        num_keep_best: int, the number of checkpoints with the best dev
+            scores to keep in addition to the latest ones
+        profile_steps: list of steps (1-origin) to profile op by op. The
+            Chrome timeline and tables of ops and name scopes are saved in
+            network.model_dir. Steps with reports (every 10 steps) are not
+            profiled
+        lr_scheduler: LearningRateScheduler. If None, the learning rate is
+            constant
+        early_stopping: EarlyStopping. If None, train for epoch_num epochs
     """
+    if lr_scheduler is None:
+        lr_scheduler = LearningRateScheduler(learning_rate)
+    if early_stopping is None:
+        early_stopping = EarlyStopping()
+
     # Load dataset
     train_data = DataSet(data_type='train', label_type_main=label_type_main,
                          label_type_second=label_type_second,
                          train_data_size=train_data_size,
-                         num_stack=num_stack, num_skip=num_skip, is_sorted=True)
+                         num_stack=num_stack, num_skip=num_skip, is_sorted=True,
+                         storage_dtype=storage_dtype)
     dev_data = DataSet(data_type='dev', label_type_main=label_type_main,
                        label_type_second=label_type_second,
                        train_data_size=train_data_size,
-                       num_stack=num_stack, num_skip=num_skip, is_sorted=False)
+                       num_stack=num_stack, num_skip=num_skip, is_sorted=False,
+                       storage_dtype=storage_dtype)
     eval1_data = DataSet(data_type='eval1', label_type_main=label_type_main,
                          label_type_second=label_type_second,
                          train_data_size=train_data_size,
-                         num_stack=num_stack, num_skip=num_skip, is_sorted=False)
+                         num_stack=num_stack, num_skip=num_skip, is_sorted=False,
+                         storage_dtype=storage_dtype)
     eval2_data = DataSet(data_type='eval2', label_type_main=label_type_main,
                          label_type_second=label_type_second,
                          train_data_size=train_data_size,
-                         num_stack=num_stack, num_skip=num_skip, is_sorted=False)
+                         num_stack=num_stack, num_skip=num_skip, is_sorted=False,
+                         storage_dtype=storage_dtype)
     eval3_data = DataSet(data_type='eval3', label_type_main=label_type_main,
                          label_type_second=label_type_second,
                          train_data_size=train_data_size,
-                         num_stack=num_stack, num_skip=num_skip, is_sorted=False)
+                         num_stack=num_stack, num_skip=num_skip, is_sorted=False,
+                         storage_dtype=storage_dtype)
 
     # Tell TensorFlow that the model will be built into the default graph
     with tf.Graph().as_default():
@@ -76,22 +121,41 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
         loss_op = network.loss()
         train_op = network.train(optimizer=optimizer,
                                  learning_rate_init=learning_rate,
-                                 is_scheduled=False)
+                                 is_scheduled=True,
+                                 num_accumulate=num_accumulate)
         decode_op1, decode_op2 = network.decoder(decode_type='beam_search',
                                                  beam_width=20)
-        per_op1, per_op2 = network.ler(decode_op1, decode_op2)
+        if monitor_decode_type == 'beam_search':
+            decode_op1_monitor, decode_op2_monitor = decode_op1, decode_op2
+        else:
+            # Greedy decoding is enough to monitor training
+            decode_op1_monitor, decode_op2_monitor = network.decoder(
+                decode_type='greedy')
+        ler_op1, ler_op2 = network.ler(decode_op1_monitor, decode_op2_monitor)
 
         # Build the summary tensor based on the TensorFlow collection of
         # summaries
         summary_train = tf.summary.merge(network.summaries_train)
         summary_dev = tf.summary.merge(network.summaries_dev)
 
+        # PER by beam search for evaluation per epoch. This is made after
+        # the summaries, so that reports do not run beam search
+        if monitor_decode_type == 'beam_search':
+            per_op1, per_op2 = ler_op1, ler_op2
+        else:
+            per_op1, per_op2 = network.ler(decode_op1, decode_op2)
+
         # Add the variable initializer operation
         init_op = tf.global_variables_initializer()
 
-        # Create a saver for writing training checkpoints
+        # Create a saver for restoring checkpoints
         saver = tf.train.Saver(max_to_keep=None)
 
+        # Write checkpoints in the background and delete stale ones
+        checkpointer = CheckpointSaver(network.model_dir,
+                                       num_keep_last=num_keep_last,
+                                       num_keep_best=num_keep_best)
+
         # Count total parameters
         parameters_dict, total_parameters = count_total_parameters(
             tf.trainable_variables())
@@ -103,6 +167,7 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
         csv_steps = []
         csv_train_loss = []
         csv_dev_loss = []
+        cer_dev_best = 1
         # Create a session for running operation on the graph
         with tf.Session() as sess:
             # Instantiate a SummaryWriter to output summaries and the graph
@@ -112,45 +177,59 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
             # Initialize parameters
             sess.run(init_op)
 
-            # Train model
-            iter_per_epoch = int(train_data.data_num / batch_size)
-            if (train_data.data_num / batch_size) != int(train_data.data_num / batch_size):
-                iter_per_epoch += 1
-            max_steps = iter_per_epoch * epoch_num
-            start_time_train = time.time()
-            start_time_epoch = time.time()
-            start_time_step = time.time()
-            cer_dev_best = 1
-            for step in range(max_steps):
-                # Create feed dictionary for next mini batch (train)
-                inputs, labels_main, labels_second, seq_len, _ = train_data.next_batch(
-                    batch_size=batch_size)
-                indices_main, values_main, dense_shape_main = list2sparsetensor(
-                    labels_main)
-                indices_second, values_second, dense_shape_second = list2sparsetensor(
-                    labels_second)
-                feed_dict_train = {
-                    network.inputs_pl: inputs,
-                    network.label_indices_pl: indices_main,
-                    network.label_values_pl: values_main,
-                    network.label_shape_pl: dense_shape_main,
-                    network.label_indices_pl2: indices_second,
-                    network.label_values_pl2: values_second,
-                    network.label_shape_pl2: dense_shape_second,
-                    network.seq_len_pl: seq_len,
-                    network.keep_prob_input_pl: network.dropout_ratio_input,
-                    network.keep_prob_hidden_pl: network.dropout_ratio_hidden,
-                    network.lr_pl: learning_rate
-                }
-
-                # Create feed dictionary for next mini batch (dev)
-                inputs, labels_main, labels_second, seq_len, _ = dev_data.next_batch(
-                    batch_size=batch_size)
+            # Resume from the latest checkpoint (variables including the
+            # global step and slots of the optimizer, the cluster and the
+            # sampler of the training data and curves). Training data is
+            # drawn again from the beginning of the saved cluster
+            start_step = 0
+            if is_resume:
+                state = restore_latest_checkpoint(
+                    sess, saver, network.model_dir)
+                start_step = state['step']
+                cer_dev_best = state['cer_dev_best']
+                train_data.load_state_dict(state['dataset'])
+                lr_scheduler.load_state_dict(state['lr_scheduler'])
+                early_stopping.load_state_dict(state['early_stopping'])
+                (csv_steps, csv_train_loss, csv_dev_loss) = state['csv']
+
+            # Make feed dictionaries of training data in the background
+            def make_feed_dict_train(inputs, labels_main, labels_second,
+                                     seq_len, _):
+                # Split the mini-batch into micro-batches sorted by length
+                # (padding of each part is trimmed to its longest utterance)
+                feed_dict_list = []
+                for (indices_micro,) in split_batch(seq_len, num_accumulate):
+                    max_frame_num = int(max(seq_len[indices_micro]))
+                    indices_main, values_main, dense_shape_main = list2sparsetensor(
+                        [labels_main[j] for j in indices_micro])
+                    indices_second, values_second, dense_shape_second = list2sparsetensor(
+                        [labels_second[j] for j in indices_micro])
+                    feed_dict_list.append({
+                        network.inputs_pl: inputs[
+                            indices_micro, :max_frame_num],
+                        network.label_indices_pl: indices_main,
+                        network.label_values_pl: values_main,
+                        network.label_shape_pl: dense_shape_main,
+                        network.label_indices_pl2: indices_second,
+                        network.label_values_pl2: values_second,
+                        network.label_shape_pl2: dense_shape_second,
+                        network.seq_len_pl: seq_len[indices_micro],
+                        network.keep_prob_input_pl: network.dropout_ratio_input,
+                        network.keep_prob_hidden_pl: network.dropout_ratio_hidden
+                    })
+                return feed_dict_list
+            train_batches = Prefetcher(train_data, batch_size,
+                                       make_feed_dict_train,
+                                       queue_size=num_prefetch)
+
+            # Draw dev mini-batches only when a report is due
+            def make_feed_dict_dev(inputs, labels_main, labels_second,
+                                   seq_len, _):
                 indices_main, values_main, dense_shape_main = list2sparsetensor(
                     labels_main)
                 indices_second, values_second, dense_shape_second = list2sparsetensor(
                     labels_second)
-                feed_dict_dev = {
+                return {
                     network.inputs_pl: inputs,
                     network.label_indices_pl: indices_main,
                     network.label_values_pl: values_main,
@@ -159,38 +238,75 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                     network.label_values_pl2: values_second,
                     network.label_shape_pl2: dense_shape_second,
                     network.seq_len_pl: seq_len,
-                    network.keep_prob_input_pl: network.dropout_ratio_input,
-                    network.keep_prob_hidden_pl: network.dropout_ratio_hidden
+                    network.keep_prob_input_pl: 1.0,
+                    network.keep_prob_hidden_pl: 1.0
                 }
+            dev_monitor = Monitor(dev_data, batch_size, make_feed_dict_dev,
+                                  interval=100)
 
-                # Update parameters & compute loss
-                _, loss_train = sess.run(
-                    [train_op, loss_op], feed_dict=feed_dict_train)
-                loss_dev = sess.run(loss_op, feed_dict=feed_dict_dev)
-                csv_steps.append(step)
-                csv_train_loss.append(loss_train)
-                csv_dev_loss.append(loss_dev)
-
-                if (step + 1) % 100 == 0:
-                    # Change feed dict for evaluation
-                    feed_dict_train[network.keep_prob_input_pl] = 1.0
-                    feed_dict_train[network.keep_prob_hidden_pl] = 1.0
-                    feed_dict_dev[network.keep_prob_input_pl] = 1.0
-                    feed_dict_dev[network.keep_prob_hidden_pl] = 1.0
-
-                    # Compute accuracy & \update event file
-                    ler_main_train, ler_second_train, summary_str_train = sess.run([per_op1, per_op2, summary_train],
-                                                                                   feed_dict=feed_dict_train)
-                    ler_main_dev, lera_second_dev, summary_str_dev = sess.run([per_op1, per_op2, summary_dev],
-                                                                              feed_dict=feed_dict_dev)
-                    summary_writer.add_summary(summary_str_train, step + 1)
-                    summary_writer.add_summary(summary_str_dev, step + 1)
-                    summary_writer.flush()
+            # Train model
+            iter_per_epoch = int(train_data.data_num / batch_size)
+            if (train_data.data_num / batch_size) != int(train_data.data_num / batch_size):
+                iter_per_epoch += 1
+            max_steps = iter_per_epoch * epoch_num
+            start_time_train = time.time()
+            start_time_epoch = time.time()
+            start_time_step = time.time()
+            step_timer = StepTimer(save_path=network.model_dir)
+            profiler = Profiler(network.model_dir, steps=profile_steps)
+            for step in range(start_step, max_steps):
+                # Create feed dictionaries for next mini batch (train)
+                with step_timer.measure('data_wait'):
+                    feed_dict_train_list, batch_train = train_batches.next()
+                step_timer.add('feed', train_batches.duration_feed)
+                step_timer.count(batch_train[3])
+
+                # Accumulate gradients of micro-batches except the last one
+                with step_timer.measure('compute'):
+                    for feed_dict_train in feed_dict_train_list[:-1]:
+                        sess.run(network.accumulate_op,
+                                 feed_dict=feed_dict_train)
+                feed_dict_train = feed_dict_train_list[-1]
+                feed_dict_train[network.lr_pl] = lr_scheduler(step)
+
+                if not dev_monitor.is_due(step):
+                    # Update parameters
+                    with step_timer.measure('compute'):
+                        if profiler.is_due(step):
+                            profiler.run(sess, train_op, feed_dict_train,
+                                         step + 1)
+                        else:
+                            sess.run(train_op, feed_dict=feed_dict_train)
+
+                else:
+                    # Update parameters & compute loss & accuracy of the
+                    # mini batch in the same forward pass (with dropout)
+                    with step_timer.measure('compute'):
+                        _, loss_train, ler_main_train, ler_second_train, summary_str_train = sess.run(
+                            [train_op, loss_op, ler_op1, ler_op2, summary_train],
+                            feed_dict=feed_dict_train)
+
+                    # Compute loss & accuracy of dev data & update event file
+                    with step_timer.measure('summary'):
+                        (loss_dev, ler_main_dev, lera_second_dev, summary_str_dev), _ = dev_monitor.run(
+                            sess, [loss_op, ler_op1, ler_op2, summary_dev])
+                        summary_writer.add_summary(summary_str_train, step + 1)
+                        summary_writer.add_summary(summary_str_dev, step + 1)
+                        summary_writer.flush()
+                    csv_steps.append(step)
+                    csv_train_loss.append(loss_train)
+                    csv_dev_loss.append(loss_dev)
+
+                    # Report the breakdown of step time and throughput
+                    timing = step_timer.report(step + 1)
+                    summary_writer.add_summary(step_timer.summary(timing),
+                                               step + 1)
 
                     duration_step = time.time() - start_time_step
                     print('Step %d: loss = %.3f (%.3f) / ler_main = %.4f (%.4f) / ler_second = %.4f (%.4f) (%.3f min)' %
                           (step + 1, loss_train, loss_dev, ler_main_train, ler_main_dev,
                            ler_second_train, lera_second_dev, duration_step / 60))
+                    print(step_timer.format(timing))
                     sys.stdout.flush()
                     start_time_step = time.time()
 
@@ -200,12 +316,9 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                     epoch = (step + 1) // iter_per_epoch
                     print('-----EPOCH:%d (%.3f min)-----' %
                           (epoch, duration_epoch / 60))
-
-                    # Save model (check point)
-                    checkpoint_file = join(network.model_dir, 'model.ckpt')
-                    save_path = saver.save(
-                        sess, checkpoint_file, global_step=epoch)
-                    print("Model saved in file: %s" % save_path)
+                    print('Padding efficiency: %.3f' %
+                          train_data.sampler.padding_efficiency)
+                    train_data.sampler.reset_padding_efficiency()
 
                     start_time_eval = time.time()
                     print('■Dev Evaluation:■')
@@ -328,9 +441,37 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                     print('Evaluation time: %.3f min' %
                           (duration_eval / 60))
 
+                    # Schedule the learning rate and check convergence by the
+                    # dev error
+                    learning_rate_epoch = lr_scheduler.update(
+                        epoch, cer_dev_epoch)
+                    is_stop = early_stopping.update(cer_dev_epoch)
+                    print('Learning rate: %e' % learning_rate_epoch)
+
+                    # Save model (check point) with the training state
+                    with step_timer.measure('checkpoint'):
+                        save_path = checkpointer.save(
+                            sess, epoch,
+                            state={'step': step + 1,
+                                   'cer_dev_best': cer_dev_best,
+                                   'dataset': train_data.state_dict(),
+                                   'lr_scheduler': lr_scheduler.state_dict(),
+                                   'early_stopping': early_stopping.state_dict(),
+                                   'csv': (csv_steps, csv_train_loss, csv_dev_loss)},
+                            score=cer_dev_epoch)
+                    print("Model is being saved in file: %s" % save_path)
+
+                    if is_stop:
+                        print('Early stopping: no improvement in %d epochs' %
+                              early_stopping.patience)
+                        break
+
                     start_time_epoch = time.time()
                     start_time_step = time.time()
 
+            train_batches.stop()
+            checkpointer.close()
+
             duration_train = time.time() - start_time_train
             print('Total time: %.3f hour' % (duration_train / 3600))
 
@@ -403,12 +544,14 @@ def main(config_path):
         network.model_dir, corpus['train_data_size'])
     network.model_dir = mkdir_join(network.model_dir, network.model_name)
 
-    # Reset model directory
-    if not isfile(join(network.model_dir, 'complete.txt')):
+    # Reset model directory unless resuming from the latest checkpoint
+    if isfile(join(network.model_dir, 'complete.txt')):
+        raise ValueError('File exists.')
+    is_resume = (param.get('is_resume', False) and
+                 tf.train.latest_checkpoint(network.model_dir) is not None)
+    if not is_resume:
         tf.gfile.DeleteRecursively(network.model_dir)
         tf.gfile.MakeDirs(network.model_dir)
-    else:
-        raise ValueError('File exists.')
 
     # Set process name
     setproctitle('multitaskctc_csj_' + corpus['label_type_main'] + '_' +
@@ -417,7 +560,8 @@ def main(config_path):
     # Save config file
     shutil.copyfile(config_path, join(network.model_dir, 'config.yml'))
 
-    sys.stdout = open(join(network.model_dir, 'train.log'), 'w')
+    sys.stdout = open(join(network.model_dir, 'train.log'),
+                      'a' if is_resume else 'w')
     print(network.model_name)
     do_train(network=network,
              optimizer=param['optimizer'],
@@ -428,7 +572,25 @@ def main(config_path):
              label_type_second=corpus['label_type_second'],
              num_stack=feature['num_stack'],
              num_skip=feature['num_skip'],
-             train_data_size=corpus['train_data_size'])
+             train_data_size=corpus['train_data_size'],
+             num_prefetch=param.get('num_prefetch', 0),
+             storage_dtype=feature.get('storage_dtype'),
+             monitor_decode_type=param.get('monitor_decode_type', 'greedy'),
+             num_accumulate=param.get('num_accumulate', 1),
+             is_resume=is_resume,
+             num_keep_last=param.get('num_keep_last'),
+             num_keep_best=param.get('num_keep_best', 1),
+             profile_steps=param.get('profile_steps'),
+             lr_scheduler=LearningRateScheduler(
+                 param['learning_rate'],
+                 decay_type=param.get('lr_decay_type'),
+                 decay_rate=param.get('lr_decay_rate', 0.5),
+                 decay_patience=param.get('lr_decay_patience', 1),
+                 decay_start_epoch=param.get('lr_decay_start_epoch', 1),
+                 min_learning_rate=param.get('min_learning_rate', 0.),
+                 warmup_steps=param.get('warmup_steps', 0)),
+             early_stopping=EarlyStopping(
+                 patience=param.get('early_stopping_patience')))
     sys.stdout = sys.__stdout__
 
 
@@ -11,26 +11,42 @@ from __future__ import print_function
 
 from os.path import join, basename
 import pickle
-import random
 import numpy as np
 from tqdm import tqdm
 
-from utils.frame_stack import stack_frame
+from utils.frame_stack import stack_frame, stack_frame_utterance, stacked_frame_num
+from utils.packed_dataset import PackedArray
+from utils.sampler import BucketSampler
 
 
 class DataSet(object):
     """Read dataset."""
 
     def __init__(self, data_type, label_type, num_stack=None, num_skip=None,
-                 is_sorted=True, is_progressbar=False):
+                 is_sorted=True, is_progressbar=False, is_packed=False,
+                 bucket_width=20, seed=None, is_lazy_stack=False,
+                 dtype=np.float32, storage_dtype=None):
         """
         Args:
             data_type: train or dev or test
             label_type: phone39 or phone48 or phone61 or character
             num_stack: int, the number of frames to stack
             num_skip: int, the number of frames to skip
-            is_sorted: if True, sort dataset by frame num
+            is_sorted: if True, make mini-batches of utterances which have
+                similar frame num (length-bucketed), else sample randomly
             is_progressbar: if True, visualize progressbar
+            is_packed: if True, memory-map the packed dataset made by
+                utils/packed_dataset.py instead of loading each file
+            bucket_width: int, the width of each bucket (the number of
+                frames) when is_sorted is True
+            seed: int, random seed for sampling mini-batches
+            is_lazy_stack: if True, stack frames of only utterances in each
+                mini-batch, so that stacked inputs of the whole dataset are
+                not kept in memory
+            dtype: data type of inputs in mini-batches
+            storage_dtype: data type to keep inputs in memory. If None, the
+                same as dtype. ex.) np.float16 halves memory and inputs are
+                upcast to dtype in each mini-batch
         """
         if data_type not in ['train', 'dev', 'test']:
             raise ValueError('data_type is "train" or "dev" or "test".')
@@ -41,6 +57,13 @@ class DataSet(object):
         self.num_skip = num_skip
         self.is_sorted = is_sorted
         self.is_progressbar = is_progressbar
+        self.is_packed = is_packed
+        self.bucket_width = bucket_width
+        self.seed = seed
+        self.dtype = dtype
+        self.storage_dtype = dtype if storage_dtype is None else storage_dtype
+        self.is_lazy_stack = is_lazy_stack and (
+            num_stack is not None) and (num_skip is not None)
 
         self.input_size = 123
         self.dataset_path = join(
@@ -65,29 +88,53 @@ class DataSet(object):
         self.data_num = len(self.input_paths)
 
         # Load all dataset
-        print('=> Loading ' + data_type + ' dataset (' + label_type + ')...')
-        input_list, label_list = [], []
-        iterator = tqdm(range(self.data_num)
-                        ) if is_progressbar else range(self.data_num)
-        for i in iterator:
-            input_list.append(np.load(self.input_paths[i]))
-            label_list.append(np.load(self.label_paths[i]))
-        self.input_list = np.array(input_list)
-        self.label_list = np.array(label_list)
+        if is_packed:
+            print('=> Loading packed ' + data_type +
+                  ' dataset (' + label_type + ')...')
+            input_names = [name for name, _ in self.frame_num_tuple_sorted]
+            self.input_list = PackedArray(
+                join(self.dataset_path, 'packed', 'input')).load(
+                    input_names, dtype=self.storage_dtype)
+            self.label_list = PackedArray(
+                join(self.dataset_path, 'packed', 'label')).load(input_names)
+        else:
+            print('=> Loading ' + data_type +
+                  ' dataset (' + label_type + ')...')
+            input_list, label_list = [], []
+            iterator = tqdm(range(self.data_num)
+                            ) if is_progressbar else range(self.data_num)
+            for i in iterator:
+                input_list.append(np.load(
+                    self.input_paths[i]).astype(self.storage_dtype))
+                label_list.append(np.load(self.label_paths[i]))
+            self.input_list = np.array(input_list)
+            self.label_list = np.array(label_list)
 
         # Frame stacking
         if (num_stack is not None) and (num_skip is not None):
-            print('=> Stacking frames...')
-            stacked_input_list = stack_frame(self.input_list,
-                                             self.input_paths,
-                                             self.frame_num_dict,
-                                             num_stack,
-                                             num_skip,
-                                             is_progressbar)
-            self.input_list = np.array(stacked_input_list)
+            if not self.is_lazy_stack:
+                print('=> Stacking frames...')
+                stacked_input_list = stack_frame(self.input_list,
+                                                 self.input_paths,
+                                                 self.frame_num_dict,
+                                                 num_stack,
+                                                 num_skip,
+                                                 is_progressbar)
+                self.input_list = np.array(stacked_input_list)
             self.input_size = self.input_size * num_stack
 
-        self.rest = set([i for i in range(self.data_num)])
+        # Length-bucketed sampler (random sampling if not sorted)
+        self.sampler = BucketSampler(
+            self._frame_num_list(),
+            bucket_width=self.bucket_width if self.is_sorted else None,
+            seed=self.seed)
+
+    def _frame_num_list(self):
+        """Return the number of frames of each utterance after stacking."""
+        if self.is_lazy_stack:
+            return [stacked_frame_num(data_i.shape[0], self.num_skip)
+                    for data_i in self.input_list]
+        return [data_i.shape[0] for data_i in self.input_list]
 
     def next_batch(self, batch_size):
         """Make mini batch.
@@ -100,82 +147,54 @@ class DataSet(object):
             inputs_seq_len: list of length of inputs of size `[batch_size]`
             input_names: list of file name of input data of size `[batch_size]`
         """
-        #########################
-        # sorted dataset
-        #########################
-        if self.is_sorted:
-            if len(self.rest) > batch_size:
-                sorted_indices = list(self.rest)[:batch_size]
-                self.rest -= set(sorted_indices)
-
-            else:
-                sorted_indices = list(self.rest)
-                self.rest = set([i for i in range(self.data_num)])
-                if self.data_type == 'train':
-                    print('---Next epoch---')
-
-            # Compute max frame num in mini batch
-            max_frame_num = self.input_list[sorted_indices[-1]].shape[0]
-
-            # Shuffle selected mini batch (0 ~ len(self.rest)-1)
-            random.shuffle(sorted_indices)
-
-            # Initialization
-            input_data = np.zeros(
-                (len(sorted_indices), max_frame_num, self.input_size))
-            labels = [None] * len(sorted_indices)
-            inputs_seq_len = np.empty((len(sorted_indices),))
-            input_names = [None] * len(sorted_indices)
-
-            # Set values of each data in mini batch
-            for i_batch, x in enumerate(sorted_indices):
-                data_i = self.input_list[x]
-                frame_num = data_i.shape[0]
-                input_data[i_batch, :frame_num, :] = data_i
-                labels[i_batch] = self.label_list[x]
-                inputs_seq_len[i_batch] = frame_num
-                input_names[i_batch] = basename(
-                    self.input_paths[x]).split('.')[0]
-
-        #########################
-        # not sorted dataset
-        #########################
+        indices, is_new_epoch = self.sampler.next(batch_size)
+        if is_new_epoch and self.data_type == 'train':
+            print('---Next epoch---')
+
+        return self._make_batch(indices)
+
+    def iter_batches(self, batch_size):
+        """Make mini batches of all utterances once in ascending order of
+           frame num without drawing from the sampler. This is used for
+           evaluation, where each utterance must be used exactly once.
+        Args:
+            batch_size: mini batch size
+        Returns:
+            generator of the same tuples as next_batch
+        """
+        indices = np.argsort(self.sampler.frame_nums, kind='mergesort')
+        for i in range(0, self.data_num, batch_size):
+            yield self._make_batch(indices[i:i + batch_size])
+
+    def _make_batch(self, indices):
+        """Pad utterances of indices into mini batch."""
+        # Stack frames of utterances in mini batch
+        if self.is_lazy_stack:
+            input_list = [stack_frame_utterance(self.input_list[x],
+                                                self.num_stack,
+                                                self.num_skip)
+                          for x in indices]
         else:
-            if len(self.rest) > batch_size:
-                # Randomly sample mini batch
-                random_indices = random.sample(list(self.rest), batch_size)
-                self.rest -= set(random_indices)
-
-            else:
-                random_indices = list(self.rest)
-                self.rest = set([i for i in range(self.data_num)])
-                if self.data_type == 'train':
-                    print('---Next epoch---')
-
-                # Shuffle selected mini batch (0 ~ len(self.rest)-1)
-                random.shuffle(random_indices)
-
-            # Compute max frame num in mini batch
-            frame_num_list = []
-            for data_i in self.input_list[random_indices]:
-                frame_num_list.append(data_i.shape[0])
-            max_frame_num = max(frame_num_list)
-
-            # Initialization
-            input_data = np.zeros(
-                (len(random_indices), max_frame_num, self.input_size))
-            labels = [None] * len(random_indices)
-            inputs_seq_len = np.empty((len(random_indices),))
-            input_names = [None] * len(random_indices)
-
-            # Set values of each data in mini batch
-            for i_batch, x in enumerate(random_indices):
-                data_i = self.input_list[x]
-                frame_num = data_i.shape[0]
-                input_data[i_batch, :frame_num, :] = data_i
-                labels[i_batch] = self.label_list[x]
-                inputs_seq_len[i_batch] = frame_num
-                input_names[i_batch] = basename(
-                    self.input_paths[x]).split('.')[0]
+            input_list = [self.input_list[x] for x in indices]
+
+        # Compute max frame num in mini batch
+        max_frame_num = max([data_i.shape[0] for data_i in input_list])
+
+        # Initialization
+        input_data = np.zeros(
+            (len(indices), max_frame_num, self.input_size), dtype=self.dtype)
+        labels = [None] * len(indices)
+        inputs_seq_len = np.empty((len(indices),))
+        input_names = [None] * len(indices)
+
+        # Set values of each data in mini batch
+        for i_batch, x in enumerate(indices):
+            data_i = input_list[i_batch]
+            frame_num = data_i.shape[0]
+            input_data[i_batch, :frame_num, :] = data_i
+            labels[i_batch] = self.label_list[x]
+            inputs_seq_len[i_batch] = frame_num
+            input_names[i_batch] = basename(
+                self.input_paths[x]).split('.')[0]
 
         return input_data, labels, inputs_seq_len, input_names
@@ -8,6 +8,7 @@ from __future__ import print_function
 import re
 import sys
 import unittest
+import numpy as np
 from tqdm import tqdm
 
 sys.path.append('../../')
@@ -33,6 +34,58 @@ class TestReadDatasetCTC(unittest.TestCase):
             str_true = re.sub(r'_', ' ', str_true)
             print(str_true)
 
+    def test_packed(self):
+        dataset = DataSet(data_type='dev', label_type='character',
+                          num_stack=3, num_skip=3,
+                          is_sorted=True, is_progressbar=True,
+                          is_packed=True)
+
+        print('=> Reading mini-batch (packed)...')
+        map_file_path = '../metric/mapping_files/ctc/char2num.txt'
+        for i in tqdm(range(200)):
+            inputs, labels, seq_len, input_names = dataset.next_batch(
+                batch_size=64)
+
+            str_true = num2char(labels[0], map_file_path)
+            str_true = re.sub(r'_', ' ', str_true)
+            print(str_true)
+
+    def test_lazy_stack(self):
+        dataset = DataSet(data_type='dev', label_type='character',
+                          num_stack=3, num_skip=3,
+                          is_sorted=True, seed=1)
+        dataset_lazy = DataSet(data_type='dev', label_type='character',
+                               num_stack=3, num_skip=3,
+                               is_sorted=True, seed=1, is_lazy_stack=True)
+        self.assertEqual(dataset.input_size, dataset_lazy.input_size)
+
+        print('=> Reading mini-batch (lazy stacking)...')
+        for i in tqdm(range(50)):
+            inputs, _, seq_len, input_names = dataset.next_batch(
+                batch_size=64)
+            inputs_lazy, _, seq_len_lazy, input_names_lazy = dataset_lazy.next_batch(
+                batch_size=64)
+            self.assertEqual(input_names, input_names_lazy)
+            self.assertTrue(np.array_equal(seq_len, seq_len_lazy))
+            self.assertTrue(np.array_equal(inputs, inputs_lazy))
+
+    def test_iter_batches(self):
+        dataset = DataSet(data_type='dev', label_type='character',
+                          num_stack=3, num_skip=3,
+                          is_sorted=True)
+
+        print('=> Reading all mini-batches once...')
+        input_names_all, seq_len_all = [], []
+        for inputs, _, seq_len, input_names in dataset.iter_batches(
+                batch_size=64):
+            input_names_all.extend(input_names)
+            seq_len_all.extend(seq_len)
+
+        # Each utterance must be used exactly once in ascending order
+        self.assertEqual(len(input_names_all), dataset.data_num)
+        self.assertEqual(len(set(input_names_all)), dataset.data_num)
+        self.assertTrue(np.all(np.diff(seq_len_all) >= 0))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,179 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compare windowed attention with full attention on the dev set (TIMIT
+   corpus). A trained model is decoded with each window and the error rate
+   and decoding speed are reported. No retraining is needed because the
+   window does not add any variables.
+
+   Usage:
+       python compare_attention_window.py path_to_saved_model
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+import yaml
+
+sys.path.append('../')
+sys.path.append('../../')
+sys.path.append('../../../')
+from data.read_dataset_attention import DataSet
+from models.attention import blstm_attention_seq2seq
+from utils.edit_distance import compute_error_rate
+
+# `(left, right)` frames around the previous peak. None is full attention
+WINDOWS = [None, (10, 20), (20, 40), (40, 80)]
+
+
+def cut_at_eos(labels, eos_index):
+    """Remove eos and labels after that."""
+    labels = list(labels)
+    if eos_index in labels:
+        return labels[:labels.index(eos_index)]
+    return labels
+
+
+def do_eval(network, model_path, label_type, eos_index, eval_batch_size=1,
+            beam_width=None):
+    """Decode the dev set and compute the token error rate.
+    Args:
+        network: model to restore (not defined yet)
+        model_path: path to the model directory
+        label_type: phone39 or phone48 or phone61 or character
+        eos_index: int, the index of <EOS> class
+        eval_batch_size: size of mini batch on evaluation
+        beam_width: beam width of beam search. If None, greedy decoding
+    Returns:
+        error: float, the token error rate
+        duration: float, seconds to decode the dev set
+    """
+    dev_data = DataSet(data_type='dev', label_type=label_type,
+                       eos_index=eos_index, is_sorted=False)
+
+    with tf.Graph().as_default():
+        network.define()
+        if beam_width is None:
+            _, decode_op = network.decoder(decode_type='greedy')
+        else:
+            _, decode_op = network.decoder(decode_type='beam_search',
+                                           beam_width=beam_width)
+        saver = tf.train.Saver()
+
+        with tf.Session() as sess:
+            checkpoint_path = tf.train.latest_checkpoint(model_path)
+            if checkpoint_path is None:
+                raise ValueError('There are not any checkpoints.')
+            saver.restore(sess, checkpoint_path)
+
+            def make_feed_dict(batch):
+                return {
+                    network.inputs: batch[0],
+                    network.inputs_seq_len: batch[2],
+                    network.keep_prob_input: 1.0,
+                    network.keep_prob_hidden: 1.0
+                }
+
+            # Warm up with a mini-batch
+            batch = next(dev_data.iter_batches(eval_batch_size))
+            sess.run(decode_op, feed_dict=make_feed_dict(batch))
+
+            error_sum = 0
+            start_time = time.time()
+            for batch in dev_data.iter_batches(eval_batch_size):
+                labels, labels_seq_len = batch[1], batch[3]
+                predicted_ids = sess.run(decode_op,
+                                         feed_dict=make_feed_dict(batch))
+
+                # Remove <SOS> and <EOS>
+                labels_true = [labels[i][1:labels_seq_len[i] - 1]
+                               for i in range(len(labels))]
+                labels_pred = [cut_at_eos(predicted_ids[i], eos_index)
+                               for i in range(len(labels))]
+                error_sum += np.sum(compute_error_rate(labels_true,
+                                                       labels_pred))
+            duration = time.time() - start_time
+
+    return error_sum / dev_data.data_num, duration
+
+
+def print_results(results):
+    """Print the error rate and the speedup of each window relative to the
+       first one."""
+    error_base, duration_base = results[0][1], results[0][2]
+    print('%-10s %10s %10s %10s %8s' %
+          ('window', 'error (%)', 'diff (%)', 'sec', 'speedup'))
+    for window, error, duration in results:
+        print('%-10s %10.3f %+10.3f %10.3f %7.2fx' %
+              ('full' if window is None else '%d-%d' % tuple(window),
+               error * 100, (error - error_base) * 100,
+               duration, duration_base / duration))
+
+
+def main(model_path, windows=WINDOWS, beam_width=None):
+
+    # Load config file
+    with open(os.path.join(model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        corpus = config['corpus']
+        feature = config['feature']
+        param = config['param']
+
+    if corpus['label_type'] == 'phone61':
+        output_size = 63
+    elif corpus['label_type'] == 'phone48':
+        output_size = 50
+    elif corpus['label_type'] == 'phone39':
+        output_size = 41
+    elif corpus['label_type'] == 'character':
+        output_size = 32
+
+    eval_batch_size = param.get('eval_batch_size') or param['batch_size']
+    results = []
+    for window in windows:
+        print('attention_window: %s' % str(window))
+        network = blstm_attention_seq2seq.BLSTMAttetion(
+            batch_size=eval_batch_size,
+            input_size=feature['input_size'],
+            encoder_num_unit=param['encoder_num_unit'],
+            encoder_num_layer=param['encoder_num_layer'],
+            attention_dim=param['attention_dim'],
+            decoder_num_unit=param['decoder_num_unit'],
+            decoder_num_layer=param['decoder_num_layer'],
+            embedding_dim=param['embedding_dim'],
+            output_size=output_size,
+            sos_index=output_size - 2,
+            eos_index=output_size - 1,
+            max_decode_length=param['max_decode_length'],
+            parameter_init=param['weight_init'],
+            clip_grad=param['clip_grad'],
+            clip_activation_encoder=param['clip_activation_encoder'],
+            clip_activation_decoder=param['clip_activation_decoder'],
+            dropout_ratio_input=param['dropout_input'],
+            dropout_ratio_hidden=param['dropout_hidden'],
+            weight_decay=param['weight_decay'],
+            attention_window=window)
+        error, duration = do_eval(network=network,
+                                  model_path=model_path,
+                                  label_type=corpus['label_type'],
+                                  eos_index=output_size - 1,
+                                  eval_batch_size=eval_batch_size,
+                                  beam_width=beam_width)
+        results.append((window, error, duration))
+    print_results(results)
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) != 2:
+        raise ValueError(
+            ("Set a path to saved model.\n"
+             "Usase: python compare_attention_window.py path_to_saved_model"))
+    main(model_path=args[1])
@@ -18,9 +18,11 @@ sys.path.append('../../../')
 from data.read_dataset_ctc import DataSet
 from models.ctc.load_model import load
 from metric.ctc import do_eval_per, do_eval_cer
+from utils.checkpoint import compatible_var_dict
 
 
-def do_eval(network, label_type, num_stack, num_skip, epoch=None):
+def do_eval(network, label_type, num_stack, num_skip, epoch=None,
+            blank_skip_threshold=None):
     """Evaluate the model.
     Args:
         network: model to restore
@@ -28,6 +30,8 @@ def do_eval(network, label_type, num_stack, num_skip, epoch=None):
         num_stack: int, the number of frames to stack
         num_skip: int, the number of frames to skip
         epoch: epoch to restore
+        blank_skip_threshold: float, runs of confident blank frames are
+            collapsed before beam search (see ctcBase.decoder)
     """
     # Load dataset
     if label_type == 'character':
@@ -59,12 +63,10 @@ def do_eval(network, label_type, num_stack, num_skip, epoch=None):
     decode_op = network.decoder(logits,
                                 network.inputs_seq_len,
                                 decode_type='beam_search',
-                                beam_width=20)
+                                beam_width=20,
+                                blank_skip_threshold=blank_skip_threshold)
     per_op = network.compute_ler(decode_op, network.labels)
 
-    # Create a saver for writing training checkpoints
-    saver = tf.train.Saver()
-
     with tf.Session() as sess:
         ckpt = tf.train.get_checkpoint_state(network.model_dir)
 
@@ -75,6 +77,9 @@ def do_eval(network, label_type, num_stack, num_skip, epoch=None):
             if epoch is not None:
                 model_path = model_path.split('/')[:-1]
                 model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
+            # Checkpoints with the legacy names of output layers can also
+            # be restored
+            saver = tf.train.Saver(compatible_var_dict(model_path))
             saver.restore(sess, model_path)
             print("Model restored: " + model_path)
         else:
@@ -142,7 +147,8 @@ def main(model_path):
             label_type=corpus['label_type'],
             num_stack=feature['num_stack'],
             num_skip=feature['num_skip'],
-            epoch=epoch)
+            epoch=epoch,
+            blank_skip_threshold=param.get('blank_skip_threshold'))
 
 
 if __name__ == '__main__':
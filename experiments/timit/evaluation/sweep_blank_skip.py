@@ -0,0 +1,194 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Sweep the threshold of blank frame collapsing in CTC beam search and
+   report the error rate and decoding speed on the dev set (TIMIT corpus),
+   to pick an operating point of `blank_skip_threshold`.
+
+   Usage:
+       python sweep_blank_skip.py path_to_saved_model
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import tensorflow as tf
+import yaml
+
+sys.path.append('../')
+sys.path.append('../../')
+sys.path.append('../../../')
+from data.read_dataset_ctc import DataSet
+from models.ctc.load_model import load
+from metric.ctc import do_eval_per, do_eval_cer
+from utils.checkpoint import compatible_var_dict
+
+THRESHOLDS = [None, 0.9, 0.99, 0.999, 0.9999]
+
+
+def do_sweep(network, label_type, num_stack, num_skip, eval_batch_size=1,
+             thresholds=THRESHOLDS, epoch=None):
+    """Evaluate the model on the dev set with each threshold.
+    Args:
+        network: model to restore
+        label_type: phone39 or phone48 or phone61 or character
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        eval_batch_size: size of mini batch on evaluation
+        thresholds: list of thresholds of blank posteriors. None means
+            decoding without collapsing (the baseline)
+        epoch: epoch to restore
+    Returns:
+        results: list of tuples `(threshold, error rate, seconds)`
+    """
+    # Load dataset
+    if label_type == 'character':
+        dev_data = DataSet(data_type='dev', label_type='character',
+                           num_stack=num_stack, num_skip=num_skip,
+                           is_sorted=False)
+    else:
+        dev_data = DataSet(data_type='dev', label_type='phone39',
+                           num_stack=num_stack, num_skip=num_skip,
+                           is_sorted=False)
+
+    # Define placeholders
+    network.inputs = tf.placeholder(
+        tf.float32,
+        shape=[None, None, network.input_size],
+        name='input')
+    indices_pl = tf.placeholder(tf.int64, name='indices')
+    values_pl = tf.placeholder(tf.int32, name='values')
+    shape_pl = tf.placeholder(tf.int64, name='shape')
+    network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+    network.inputs_seq_len = tf.placeholder(tf.int64,
+                                            shape=[None],
+                                            name='inputs_seq_len')
+
+    # Add to the graph each operation (including model definition)
+    loss_op, logits = network.compute_loss(network.inputs,
+                                           network.labels,
+                                           network.inputs_seq_len)
+    # The decoders share the model graph
+    decode_ops = [network.decoder(logits,
+                                  network.inputs_seq_len,
+                                  decode_type='beam_search',
+                                  beam_width=20,
+                                  blank_skip_threshold=threshold)
+                  for threshold in thresholds]
+
+    results = []
+    with tf.Session() as sess:
+        ckpt = tf.train.get_checkpoint_state(network.model_dir)
+        if ckpt:
+            model_path = ckpt.model_checkpoint_path
+            if epoch is not None:
+                model_path = model_path.split('/')[:-1]
+                model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
+            # Checkpoints with the legacy names of output layers can also
+            # be restored
+            saver = tf.train.Saver(compatible_var_dict(model_path))
+            saver.restore(sess, model_path)
+            print("Model restored: " + model_path)
+        else:
+            raise ValueError('There are not any checkpoints.')
+
+        # Warm up with a mini-batch so that the first threshold is not slow
+        batch = next(dev_data.iter_batches(eval_batch_size))
+        feed_dict = {
+            network.inputs: batch[0],
+            network.inputs_seq_len: batch[2],
+            network.keep_prob_input: 1.0,
+            network.keep_prob_hidden: 1.0
+        }
+        sess.run(decode_ops, feed_dict=feed_dict)
+
+        for threshold, decode_op in zip(thresholds, decode_ops):
+            print('blank_skip_threshold: %s' % str(threshold))
+            start_time = time.time()
+            if label_type == 'character':
+                error_dev = do_eval_cer(session=sess,
+                                        decode_op=decode_op,
+                                        network=network,
+                                        dataset=dev_data,
+                                        eval_batch_size=eval_batch_size)
+            else:
+                error_dev = do_eval_per(session=sess,
+                                        decode_op=decode_op,
+                                        per_op=None,
+                                        network=network,
+                                        dataset=dev_data,
+                                        label_type=label_type,
+                                        eval_batch_size=eval_batch_size)
+            results.append((threshold, error_dev, time.time() - start_time))
+
+    return results
+
+
+def print_results(results):
+    """Print the error rate and the speedup of each threshold relative to
+       the first one."""
+    error_base, duration_base = results[0][1], results[0][2]
+    print('%-10s %10s %10s %10s %8s' %
+          ('threshold', 'error (%)', 'diff (%)', 'sec', 'speedup'))
+    for threshold, error, duration in results:
+        print('%-10s %10.3f %+10.3f %10.3f %7.2fx' %
+              (str(threshold), error * 100, (error - error_base) * 100,
+               duration, duration_base / duration))
+
+
+def main(model_path):
+
+    # Load config file
+    with open(os.path.join(model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        corpus = config['corpus']
+        feature = config['feature']
+        param = config['param']
+
+    if corpus['label_type'] == 'phone61':
+        output_size = 61
+    elif corpus['label_type'] == 'phone48':
+        output_size = 48
+    elif corpus['label_type'] == 'phone39':
+        output_size = 39
+    elif corpus['label_type'] == 'character':
+        output_size = 30
+
+    # Model setting
+    CTCModel = load(model_type=config['model_name'])
+    network = CTCModel(
+        batch_size=1,
+        input_size=feature['input_size'] * feature['num_stack'],
+        num_unit=param['num_unit'],
+        num_layer=param['num_layer'],
+        output_size=output_size,
+        clip_grad=param['clip_grad'],
+        clip_activation=param['clip_activation'],
+        dropout_ratio_input=param['dropout_input'],
+        dropout_ratio_hidden=param['dropout_hidden'],
+        num_proj=param['num_proj'],
+        weight_decay=param['weight_decay'])
+
+    network.model_dir = model_path
+    print(network.model_dir)
+    results = do_sweep(network=network,
+                       label_type=corpus['label_type'],
+                       num_stack=feature['num_stack'],
+                       num_skip=feature['num_skip'],
+                       eval_batch_size=(param.get('eval_batch_size') or
+                                        param['batch_size']))
+    print_results(results)
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) != 2:
+        raise ValueError(
+            ("Set a path to saved model.\n"
+             "Usase: python sweep_blank_skip.py path_to_saved_model"))
+    main(model_path=args[1])
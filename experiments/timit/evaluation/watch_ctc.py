@@ -0,0 +1,266 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Evaluate checkpoints of CTC network in a separate process during training
+   (TIMIT corpus). The model directory is polled for new checkpoints, and
+   each of them is restored into its own session and evaluated on the dev
+   set (and on the test set when the dev score is the best). Results are
+   appended to `eval.csv` in the model directory, and the best model is
+   saved in `best/`, so that it survives the retention policy of the
+   trainer.
+
+   Usage:
+       python watch_ctc.py path_to_saved_model [interval_sec]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join, isfile
+import sys
+import time
+import tensorflow as tf
+import yaml
+
+sys.path.append('../')
+sys.path.append('../../')
+sys.path.append('../../../')
+from data.read_dataset_ctc import DataSet
+from models.ctc.load_model import load
+from metric.ctc import do_eval_per, do_eval_cer
+from utils.checkpoint import compatible_var_dict
+
+
+def list_checkpoints(model_dir):
+    """
+    Args:
+        model_dir: path to the model directory
+    Returns:
+        checkpoints: list of tuples `(epoch, path to the checkpoint)` sorted
+            by epoch
+    """
+    ckpt = tf.train.get_checkpoint_state(model_dir)
+    if ckpt is None:
+        return []
+    return sorted((int(checkpoint_path.split('-')[-1]), checkpoint_path)
+                  for checkpoint_path in ckpt.all_model_checkpoint_paths)
+
+
+def load_results(csv_path):
+    """Load results of the previous run of the evaluator.
+    Args:
+        csv_path: path to eval.csv
+    Returns:
+        epochs_evaluated: set of evaluated epochs
+        error_best: float, the best error rate on the dev set
+    """
+    epochs_evaluated, error_best = set([]), 1
+    if isfile(csv_path):
+        with open(csv_path, 'r') as f:
+            next(f)
+            for line in f:
+                epoch, error_dev = line.split(',')[:2]
+                epochs_evaluated.add(int(epoch))
+                if error_dev != '':
+                    error_best = min(error_best, float(error_dev))
+    return epochs_evaluated, error_best
+
+
+def do_watch(network, label_type, num_stack, num_skip, eval_batch_size=1,
+             interval=60, blank_skip_threshold=None):
+    """Evaluate new checkpoints until training is finished.
+    Args:
+        network: model to restore
+        label_type: phone39 or phone48 or phone61 or character
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        eval_batch_size: size of mini batch on evaluation
+        interval: int, seconds to wait between polls of the model directory
+        blank_skip_threshold: float, runs of confident blank frames are
+            collapsed before beam search (see ctcBase.decoder)
+    """
+    # Load dataset
+    if label_type == 'character':
+        dev_data = DataSet(data_type='dev', label_type='character',
+                           num_stack=num_stack, num_skip=num_skip,
+                           is_sorted=False)
+        test_data = DataSet(data_type='test', label_type='character',
+                            num_stack=num_stack, num_skip=num_skip,
+                            is_sorted=False)
+    else:
+        dev_data = DataSet(data_type='dev', label_type='phone39',
+                           num_stack=num_stack, num_skip=num_skip,
+                           is_sorted=False)
+        test_data = DataSet(data_type='test', label_type='phone39',
+                            num_stack=num_stack, num_skip=num_skip,
+                            is_sorted=False)
+
+    # Define placeholders
+    network.inputs = tf.placeholder(
+        tf.float32,
+        shape=[None, None, network.input_size],
+        name='input')
+    indices_pl = tf.placeholder(tf.int64, name='indices')
+    values_pl = tf.placeholder(tf.int32, name='values')
+    shape_pl = tf.placeholder(tf.int64, name='shape')
+    network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+    network.inputs_seq_len = tf.placeholder(tf.int64,
+                                            shape=[None],
+                                            name='inputs_seq_len')
+
+    # Add to the graph each operation (including model definition)
+    loss_op, logits = network.compute_loss(network.inputs,
+                                           network.labels,
+                                           network.inputs_seq_len)
+    decode_op = network.decoder(logits,
+                                network.inputs_seq_len,
+                                decode_type='beam_search',
+                                beam_width=20,
+                                blank_skip_threshold=blank_skip_threshold)
+    per_op = network.compute_ler(decode_op, network.labels)
+
+    # Create savers for restoring checkpoints and keeping the best model.
+    # The saver for restoring is made from the first checkpoint, so that
+    # checkpoints with the legacy names of output layers can also be restored
+    saver = None
+    saver_best = tf.train.Saver(max_to_keep=1)
+    best_dir = join(network.model_dir, 'best')
+
+    def evaluate(session, dataset):
+        if label_type == 'character':
+            return do_eval_cer(session=session,
+                               decode_op=decode_op,
+                               network=network,
+                               dataset=dataset,
+                               eval_batch_size=eval_batch_size)
+        else:
+            return do_eval_per(session=session,
+                               decode_op=decode_op,
+                               per_op=per_op,
+                               network=network,
+                               dataset=dataset,
+                               label_type=label_type,
+                               eval_batch_size=eval_batch_size)
+
+    csv_path = join(network.model_dir, 'eval.csv')
+    epochs_evaluated, error_best = load_results(csv_path)
+    if not isfile(csv_path):
+        with open(csv_path, 'w') as f:
+            f.write('epoch,dev,test,is_best\n')
+
+    while True:
+        # Checked before listing checkpoints, so that the final checkpoint
+        # is listed when training has been finished
+        is_complete = isfile(join(network.model_dir, 'complete.txt'))
+
+        for epoch, checkpoint_path in list_checkpoints(network.model_dir):
+            if epoch in epochs_evaluated:
+                continue
+            epochs_evaluated.add(epoch)
+
+            with tf.Session() as sess:
+                try:
+                    if saver is None:
+                        saver = tf.train.Saver(
+                            compatible_var_dict(checkpoint_path))
+                    saver.restore(sess, checkpoint_path)
+                except tf.errors.NotFoundError:
+                    # Deleted by the retention policy of the trainer
+                    print('%s was deleted before evaluation' %
+                          checkpoint_path)
+                    continue
+                print('-----EPOCH:%d-----' % epoch)
+
+                start_time_eval = time.time()
+                print('=== Dev Data Evaluation ===')
+                error_dev = evaluate(sess, dev_data)
+                print('  %s: %f %%' % ('CER' if label_type == 'character'
+                                       else 'PER', error_dev * 100))
+
+                error_test = None
+                is_best = error_dev < error_best
+                if is_best:
+                    error_best = error_dev
+                    print('■■■ ↑Best Score↑ ■■■')
+                    saver_best.save(sess, join(best_dir, 'model.ckpt'),
+                                    global_step=epoch,
+                                    write_meta_graph=False)
+
+                    print('=== Test Data Evaluation ===')
+                    error_test = evaluate(sess, test_data)
+                    print('  %s: %f %%' % ('CER' if label_type == 'character'
+                                           else 'PER', error_test * 100))
+
+                print('Evaluation time: %.3f min' %
+                      ((time.time() - start_time_eval) / 60))
+
+            with open(csv_path, 'a') as f:
+                f.write('%d,%f,%s,%d\n' %
+                        (epoch, error_dev,
+                         '' if error_test is None else '%f' % error_test,
+                         int(is_best)))
+            sys.stdout.flush()
+
+        if is_complete:
+            break
+        time.sleep(interval)
+
+
+def main(model_path, interval=60):
+
+    # Load config file
+    with open(os.path.join(model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        corpus = config['corpus']
+        feature = config['feature']
+        param = config['param']
+
+    if corpus['label_type'] == 'phone61':
+        output_size = 61
+    elif corpus['label_type'] == 'phone48':
+        output_size = 48
+    elif corpus['label_type'] == 'phone39':
+        output_size = 39
+    elif corpus['label_type'] == 'character':
+        output_size = 30
+
+    # Model setting
+    CTCModel = load(model_type=config['model_name'])
+    network = CTCModel(
+        batch_size=1,
+        input_size=feature['input_size'] * feature['num_stack'],
+        num_unit=param['num_unit'],
+        num_layer=param['num_layer'],
+        output_size=output_size,
+        clip_grad=param['clip_grad'],
+        clip_activation=param['clip_activation'],
+        dropout_ratio_input=param['dropout_input'],
+        dropout_ratio_hidden=param['dropout_hidden'],
+        num_proj=param['num_proj'],
+        weight_decay=param['weight_decay'])
+
+    network.model_dir = model_path
+    print(network.model_dir)
+    do_watch(network=network,
+             label_type=corpus['label_type'],
+             num_stack=feature['num_stack'],
+             num_skip=feature['num_skip'],
+             eval_batch_size=(param.get('eval_batch_size') or
+                              param['batch_size']),
+             interval=interval,
+             blank_skip_threshold=param.get('blank_skip_threshold'))
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) == 2:
+        main(model_path=args[1])
+    elif len(args) == 3:
+        main(model_path=args[1], interval=int(args[2]))
+    else:
+        raise ValueError(
+            ("Set a path to saved model.\n"
+             "Usase: python watch_ctc.py path_to_saved_model [interval_sec]"))
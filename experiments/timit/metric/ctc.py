@@ -7,14 +7,13 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import re
-import Levenshtein
+import time
 from tqdm import tqdm
 
-from utils.labels.character import num2char
-from utils.labels.phone import num2phone, phone2num
-from .mapping import map_to_39phone
+from utils.labels.vocab import load_vocab
+from .mapping import load_phone39_mapper
 from .edit_distance import compute_edit_distance
+from utils.edit_distance import compute_error_rate
 from utils.sparsetensor import list2sparsetensor, sparsetensor2list
 from utils.exception_func import exception
 
@@ -51,15 +50,20 @@ def do_eval_per(session, decode_op, per_op, network, dataset, label_type,
         label_type[5:7] + '.txt'
     phone2num_39_map_file_path = '../metric/mapping_files/ctc/phone2num_39.txt'
     phone2phone_map_file_path = '../metric/mapping_files/phone2phone.txt'
-    iterator = tqdm(range(iteration)) if is_progressbar else range(iteration)
-    for step in iterator:
+    phone39_mapper = load_phone39_mapper(label_type,
+                                         phone2phone_map_file_path,
+                                         phone2num_map_file_path,
+                                         phone2num_39_map_file_path)
+    start_time = time.time()
+    iterator = dataset.iter_batches(batch_size)
+    if is_progressbar:
+        iterator = tqdm(iterator, total=iteration)
+    for batch in iterator:
         # Create feed dictionary for next mini batch
         if not is_multitask:
-            inputs, labels_true, inputs_seq_len, _ = dataset.next_batch(
-                batch_size=batch_size)
+            inputs, labels_true, inputs_seq_len, _ = batch
         else:
-            inputs, _, labels_true, inputs_seq_len, _ = dataset.next_batch(
-                batch_size=batch_size)
+            inputs, _, labels_true, inputs_seq_len, _ = batch
 
         feed_dict = {
             network.inputs: inputs,
@@ -80,29 +84,18 @@ def do_eval_per(session, decode_op, per_op, network, dataset, label_type,
             # Evaluate by 39 phones
             labels_pred_st = session.run(decode_op, feed_dict=feed_dict)
             labels_pred = sparsetensor2list(labels_pred_st, batch_size_each)
-            for i_batch in range(batch_size_each):
-                # Convert num to phone (list of phone strings)
-                phone_pred_seq = num2phone(
-                    labels_pred[i_batch], phone2num_map_file_path)
-                phone_pred_list = phone_pred_seq.split(' ')
 
-                # Mapping to 39 phones (list of phone strings)
-                phone_pred_list = map_to_39phone(
-                    phone_pred_list, label_type, phone2phone_map_file_path)
-
-                # Convert phone to num (list of phone indices)
-                phone_pred_list = phone2num(
-                    phone_pred_list, phone2num_39_map_file_path)
-                labels_pred[i_batch] = phone_pred_list
+            # Mapping to 39 phones (list of phone indices)
+            labels_pred = phone39_mapper(labels_pred)
 
             # Compute edit distance
-            labels_true_st = list2sparsetensor(labels_true)
-            labels_pred_st = list2sparsetensor(labels_pred)
-            per_local = compute_edit_distance(
-                session, labels_true_st, labels_pred_st)
+            per_local = compute_edit_distance(labels_true, labels_pred)
             per_global += per_local * batch_size_each
 
     per_global /= dataset.data_num
+    duration = time.time() - start_time
+    print('  %d utterances in %.3f sec (%.1f utt/sec)' %
+          (dataset.data_num, duration, dataset.data_num / duration))
 
     return per_global
 
@@ -130,15 +123,17 @@ def do_eval_cer(session, decode_op, network, dataset, eval_batch_size=1,
     cer_sum = 0
 
     map_file_path = '../metric/mapping_files/ctc/char2num.txt'
-    iterator = tqdm(range(iteration)) if is_progressbar else range(iteration)
-    for step in iterator:
+    space_index = load_vocab(map_file_path).label2id['_']
+    start_time = time.time()
+    iterator = dataset.iter_batches(batch_size)
+    if is_progressbar:
+        iterator = tqdm(iterator, total=iteration)
+    for batch in iterator:
         # Create feed dictionary for next mini batch
         if not is_multitask:
-            inputs, labels_true, inputs_seq_len, _ = dataset.next_batch(
-                batch_size=batch_size)
+            inputs, labels_true, inputs_seq_len, _ = batch
         else:
-            inputs, labels_true, _, inputs_seq_len, _ = dataset.next_batch(
-                batch_size=batch_size)
+            inputs, labels_true, _, inputs_seq_len, _ = batch
 
         feed_dict = {
             network.inputs: inputs,
@@ -151,21 +146,14 @@ def do_eval_cer(session, decode_op, network, dataset, eval_batch_size=1,
         batch_size_each = len(labels_true)
         labels_pred_st = session.run(decode_op, feed_dict=feed_dict)
         labels_pred = sparsetensor2list(labels_pred_st, batch_size_each)
-        for i_batch in range(batch_size_each):
-
-            # Convert from list to string
-            str_pred = num2char(labels_pred[i_batch], map_file_path)
-            str_true = num2char(labels_true[i_batch], map_file_path)
 
-            # Remove silence(_) labels
-            str_pred = re.sub(r'[_]+', "", str_pred)
-            str_true = re.sub(r'[_]+', "", str_true)
-
-            # Compute edit distance
-            cer_each = Levenshtein.distance(
-                str_pred, str_true) / len(list(str_true))
-            cer_sum += cer_each
+        # Compute edit distance without silence(_) labels
+        cer_sum += compute_error_rate(labels_true, labels_pred,
+                                      ignore_index=space_index).sum()
 
     cer_mean = cer_sum / dataset.data_num
+    duration = time.time() - start_time
+    print('  %d utterances in %.3f sec (%.1f utt/sec)' %
+          (dataset.data_num, duration, dataset.data_num / duration))
 
     return cer_mean
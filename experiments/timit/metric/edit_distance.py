@@ -7,24 +7,16 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import tensorflow as tf
+from utils.edit_distance import compute_error_rate
 
 
-def compute_edit_distance(session, labels_true_st, labels_pred_st):
-    """Compute edit distance.
+def compute_edit_distance(labels_true, labels_pred):
+    """Compute edit distance normalized by the length of ground truth. This
+       does not build any operation in the graph.
     Args:
-        session:
-        labels_true_st: A `SparseTensor` of ground truth
-        labels_pred_st: A `SparseTensor` of prediction
+        labels_true: list of label sequences of ground truth
+        labels_pred: list of label sequences of prediction
     Returns:
-        edit_distance: edit distance
+        edit_distance: An average of normalized edit distance in the batch
     """
-    indices, values, dense_shape = labels_true_st
-    labels_pred_pl = tf.SparseTensor(indices, values, dense_shape)
-    indices, values, dense_shape = labels_pred_st
-    labels_true_pl = tf.SparseTensor(indices, values, dense_shape)
-    edit_op = tf.reduce_mean(tf.edit_distance(
-        labels_pred_pl, labels_true_pl, normalize=True))
-    edit_distance = session.run(edit_op)
-
-    return edit_distance
+    return float(compute_error_rate(labels_true, labels_pred).mean())
@@ -7,6 +7,40 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+from os.path import abspath
+import numpy as np
+
+from utils.labels.vocab import load_vocab
+
+# key => (label_type, absolute path to the mapping file)
+_map_dict_cache = {}
+_mapper_cache = {}
+
+
+def _load_map_dict(label_type, map_file_path):
+    """Read a mapping file only at the first call in the process.
+    Returns:
+        map_dict:
+            key => phone of label_type (string)
+            value => 39 phone (string), '' for removed phones (q)
+    """
+    key = (label_type, abspath(map_file_path))
+    if key not in _map_dict_cache:
+        map_dict = {}
+        with open(map_file_path) as f:
+            for line in f:
+                line = line.strip().split()
+                if label_type == 'phone61':
+                    if line[1] != 'nan':
+                        map_dict[line[0]] = line[2]
+                    else:
+                        map_dict[line[0]] = ''
+                elif label_type == 'phone48':
+                    if line[1] != 'nan':
+                        map_dict[line[1]] = line[2]
+        _map_dict_cache[key] = map_dict
+    return _map_dict_cache[key]
+
 
 def map_to_39phone(phone_list, label_type, map_file_path):
     """Map from 61 or 48 phones to 39 phones.
@@ -20,19 +54,7 @@ def map_to_39phone(phone_list, label_type, map_file_path):
     if label_type == 'phone39':
         return phone_list
 
-    # Read a mapping file
-    map_dict = {}
-    with open(map_file_path) as f:
-        for line in f:
-            line = line.strip().split()
-            if label_type == 'phone61':
-                if line[1] != 'nan':
-                    map_dict[line[0]] = line[2]
-                else:
-                    map_dict[line[0]] = ''
-            elif label_type == 'phone48':
-                if line[1] != 'nan':
-                    map_dict[line[1]] = line[2]
+    map_dict = _load_map_dict(label_type, map_file_path)
 
     # Map to 39 phones
     for i in range(len(phone_list)):
@@ -43,3 +65,61 @@ def map_to_39phone(phone_list, label_type, map_file_path):
         phone_list.remove('')
 
     return phone_list
+
+
+class Phone39Mapper(object):
+    """Map indices of 61 or 48 phones to indices of 39 phones by a lookup
+       array, so that a whole batch is mapped at once.
+    Args:
+        label_type: phone39 or phone48 or phone61
+        map_file_path: path to the mapping file between phones
+            (phone2phone.txt)
+        phone2num_map_file_path: path to the mapping file of label_type
+        phone2num_39_map_file_path: path to the mapping file of 39 phones
+    """
+
+    def __init__(self, label_type, map_file_path, phone2num_map_file_path,
+                 phone2num_39_map_file_path):
+        vocab = load_vocab(phone2num_map_file_path)
+        vocab_39 = load_vocab(phone2num_39_map_file_path)
+
+        # index of label_type => index of 39 phones (-1 for removed phones)
+        self.table = np.full((len(vocab.id2label),), -1, dtype=np.int64)
+        if label_type == 'phone39':
+            self.table[:] = np.arange(len(vocab.id2label))
+        else:
+            map_dict = _load_map_dict(label_type, map_file_path)
+            for index, phone in enumerate(vocab.id2label):
+                if map_dict[phone] != '':
+                    self.table[index] = vocab_39.label2id[map_dict[phone]]
+
+    def __call__(self, labels):
+        """
+        Args:
+            labels: list of indices of phones (label_type) of each utterance
+        Returns:
+            labels_39: list of np.ndarray of indices of 39 phones
+        """
+        lengths = [len(each_label) for each_label in labels]
+        if sum(lengths) == 0:
+            return [np.zeros((0,), dtype=np.int64) for _ in labels]
+
+        mapped = self.table[np.concatenate(
+            [np.asarray(each_label, dtype=np.int64) for each_label in labels])]
+        labels_39 = np.split(mapped, np.cumsum(lengths)[:-1])
+
+        # Ignore q (only if 61 phones)
+        return [each_label[each_label >= 0] for each_label in labels_39]
+
+
+def load_phone39_mapper(label_type, map_file_path, phone2num_map_file_path,
+                        phone2num_39_map_file_path):
+    """Make Phone39Mapper only at the first call in the process."""
+    key = (label_type, abspath(map_file_path),
+           abspath(phone2num_map_file_path),
+           abspath(phone2num_39_map_file_path))
+    if key not in _mapper_cache:
+        _mapper_cache[key] = Phone39Mapper(
+            label_type, map_file_path, phone2num_map_file_path,
+            phone2num_39_map_file_path)
+    return _mapper_cache[key]
@@ -21,15 +21,26 @@ sys.path.append('../../../')
 from data.read_dataset_attention import DataSet
 # from models.attention.load_model import load
 from models.attention import blstm_attention_seq2seq
+from models.data_parallel import split_batch, session_config
 from metric.attention import do_eval_per, do_eval_cer
 from utils.sparsetensor import list2sparsetensor
+from utils.prefetch import Prefetcher
+from utils.timer import StepTimer
+from utils.profiler import Profiler
+from utils.scheduler import LearningRateScheduler, EarlyStopping
+from utils.checkpoint import CheckpointSaver, restore_latest_checkpoint
+from utils.monitor import Monitor
 from utils.directory import mkdir, mkdir_join
 from utils.parameter import count_total_parameters
-from utils.loss import save_loss
+from utils.csv import save_loss
 
 
 def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
-             label_type, num_stack, num_skip):
+             label_type, eos_index, num_prefetch=0,
+             storage_dtype=None, num_tower=1, num_accumulate=1,
+             is_resume=False, num_keep_last=None,
+             num_keep_best=1,
+             profile_steps=None, lr_scheduler=None, early_stopping=None):
     """Run training. If target labels are phone, the model is evaluated by PER
     with 39 phones.
     Args:
@@ -40,40 +51,72 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
         batch_size: size of mini batch
         epoch_num: epoch num to train
         label_type: phone39 or phone48 or phone61 or character
-        num_stack: int, the number of frames to stack
-        num_skip: int, the number of frames to skip
+        eos_index: int, the index of <EOS> class
+        num_prefetch: int, the number of mini-batches to prefetch in the
+            background. If 0, mini-batches are made in the main thread.
+        storage_dtype: data type to keep inputs in memory.
+            ex.) float32, float16. If None, float32
+        num_tower: int, the number of towers for data-parallel training.
+            Each mini-batch is split into num_tower parts, and gradients of
+            all towers are averaged and applied once
+        num_accumulate: int, the number of micro-batches to accumulate
+            gradients over before one update. Each mini-batch is sorted by
+            length and split into num_accumulate micro-batches, so that the
+            effective batch size is batch_size while only
+            batch_size / num_accumulate utterances are in memory at a time
+        is_resume: if True, resume training from the latest checkpoint in
+            network.model_dir
+        num_keep_last: int, the number of the latest checkpoints to keep.
+            If None, all checkpoints are kept
+        num_keep_best: int, the number of checkpoints with the best dev
+            scores to keep in addition to the latest ones
+        profile_steps: list of steps (1-origin) to profile op by op. The
+            Chrome timeline and tables of ops and name scopes are saved in
+            network.model_dir. Steps with reports (every 10 steps) are not
+            profiled
+        lr_scheduler: LearningRateScheduler. If None, the learning rate is
+            constant
+        early_stopping: EarlyStopping. If None, train for epoch_num epochs
     """
+    if lr_scheduler is None:
+        lr_scheduler = LearningRateScheduler(learning_rate)
+    if early_stopping is None:
+        early_stopping = EarlyStopping()
+
     # Load dataset
     train_data = DataSet(data_type='train', label_type=label_type,
-                         num_stack=num_stack, num_skip=num_skip,
-                         is_sorted=True)
+                         eos_index=eos_index, is_sorted=True,
+                         storage_dtype=storage_dtype)
     if label_type == 'character':
         dev_data = DataSet(data_type='dev', label_type='character',
-                           num_stack=num_stack, num_skip=num_skip,
-                           is_sorted=False)
+                           eos_index=eos_index, is_sorted=False,
+                           storage_dtype=storage_dtype)
         test_data = DataSet(data_type='test', label_type='character',
-                            num_stack=num_stack, num_skip=num_skip,
-                            is_sorted=False)
+                            eos_index=eos_index, is_sorted=False,
+                            storage_dtype=storage_dtype)
     else:
         dev_data = DataSet(data_type='dev', label_type='phone39',
-                           num_stack=num_stack, num_skip=num_skip,
-                           is_sorted=False)
+                           eos_index=eos_index, is_sorted=False,
+                           storage_dtype=storage_dtype)
         test_data = DataSet(data_type='test', label_type='phone39',
-                            num_stack=num_stack, num_skip=num_skip,
-                            is_sorted=False)
+                            eos_index=eos_index, is_sorted=False,
+                            storage_dtype=storage_dtype)
 
     # Tell TensorFlow that the model will be built into the default graph
     with tf.Graph().as_default():
 
         # Define model
-        network.define()
+        network.define(num_tower=num_tower)
         # NOTE: define model under tf.Graph()
 
         # Add to the graph each operation
+        # NOTE: loss_op is the loss of the first tower
         loss_op = network.compute_loss()
+        loss_op_train = tf.add_n(network.tower_losses) / num_tower
         train_op = network.train(optimizer=optimizer,
                                  learning_rate_init=learning_rate,
-                                 is_scheduled=False)
+                                 is_scheduled=True,
+                                 num_accumulate=num_accumulate)
         decode_op_train, decode_op_infer = network.decoder(
             decode_type='beam_search',
             beam_width=20)
@@ -87,9 +130,14 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
         # Add the variable initializer operation
         init_op = tf.global_variables_initializer()
 
-        # Create a saver for writing training checkpoints
+        # Create a saver for restoring checkpoints
         saver = tf.train.Saver(max_to_keep=None)
 
+        # Write checkpoints in the background and delete stale ones
+        checkpointer = CheckpointSaver(network.model_dir,
+                                       num_keep_last=num_keep_last,
+                                       num_keep_best=num_keep_best)
+
         # Count total parameters
         parameters_dict, total_parameters = count_total_parameters(
             tf.trainable_variables())
@@ -100,8 +148,9 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                "{:,}".format(total_parameters / 1000000)))
 
         csv_steps, csv_train_loss, csv_dev_loss = [], [], []
+        error_best = 1
         # Create a session for running operation on the graph
-        with tf.Session() as sess:
+        with tf.Session(config=session_config(num_tower)) as sess:
 
             # Instantiate a SummaryWriter to output summaries and the graph
             summary_writer = tf.summary.FileWriter(
@@ -110,6 +159,63 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
             # Initialize parameters
             sess.run(init_op)
 
+            # Resume from the latest checkpoint (variables including the
+            # global step and slots of the optimizer, the position of the
+            # sampler and curves)
+            start_step = 0
+            if is_resume:
+                state = restore_latest_checkpoint(
+                    sess, saver, network.model_dir)
+                start_step = state['step']
+                error_best = state['error_best']
+                train_data.sampler.load_state_dict(state['sampler'])
+                lr_scheduler.load_state_dict(state['lr_scheduler'])
+                early_stopping.load_state_dict(state['early_stopping'])
+                (csv_steps, csv_train_loss, csv_dev_loss) = state['csv']
+
+            # Make feed dictionaries of training data in the background
+            def make_feed_dict_train(inputs, labels, inputs_seq_len,
+                                     labels_seq_len, _):
+                # Split the mini-batch into micro-batches and towers
+                # (padding of each part is trimmed to its longest utterance)
+                feed_dict_list = []
+                for indices_micro in split_batch(inputs_seq_len,
+                                                 num_accumulate, num_tower):
+                    feed_dict = {
+                        network.keep_prob_input: network.dropout_ratio_input,
+                        network.keep_prob_hidden: network.dropout_ratio_hidden
+                    }
+                    for i_tower, indices in enumerate(indices_micro):
+                        max_frame_num = max(inputs_seq_len[indices])
+                        max_seq_len = max(labels_seq_len[indices])
+                        feed_dict[network.inputs_list[i_tower]] = inputs[
+                            indices, :max_frame_num]
+                        feed_dict[network.labels_list[i_tower]] = labels[
+                            indices, :max_seq_len]
+                        feed_dict[network.inputs_seq_len_list[i_tower]] = inputs_seq_len[
+                            indices]
+                        feed_dict[network.labels_seq_len_list[i_tower]] = labels_seq_len[
+                            indices]
+                    feed_dict_list.append(feed_dict)
+                return feed_dict_list
+            train_batches = Prefetcher(train_data, batch_size,
+                                       make_feed_dict_train,
+                                       queue_size=num_prefetch)
+
+            # Draw dev mini-batches only when a report is due
+            def make_feed_dict_dev(inputs, labels, inputs_seq_len,
+                                   labels_seq_len, _):
+                return {
+                    network.inputs: inputs,
+                    network.labels: labels,
+                    network.inputs_seq_len: inputs_seq_len,
+                    network.labels_seq_len: labels_seq_len,
+                    network.keep_prob_input: 1.0,
+                    network.keep_prob_hidden: 1.0
+                }
+            dev_monitor = Monitor(dev_data, batch_size, make_feed_dict_dev,
+                                  interval=10)
+
             # Train model
             iter_per_epoch = int(train_data.data_num / batch_size)
             train_step = train_data.data_num / batch_size
@@ -119,58 +225,55 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
             start_time_train = time.time()
             start_time_epoch = time.time()
             start_time_step = time.time()
-            error_best = 1
-            for step in range(max_steps):
-
-                # Create feed dictionary for next mini batch (train)
-                inputs, labels, inputs_seq_len, labels_seq_len = train_data.next_batch(
-                    batch_size=batch_size)
-                feed_dict_train = {
-                    network.inputs: inputs,
-                    network.labels: labels,
-                    network.inputs_seq_len: inputs_seq_len,
-                    network.labels_seq_len: labels_seq_len,
-                    network.keep_prob_input: network.dropout_ratio_input,
-                    network.keep_prob_hidden: network.dropout_ratio_hidden,
-                    network.learning_rate: learning_rate
-                }
-
-                # Create feed dictionary for next mini batch (dev)
-                inputs, labels, inputs_seq_len, labels_seq_len = dev_data.next_batch(
-                    batch_size=batch_size)
-                feed_dict_dev = {
-                    network.inputs: inputs,
-                    network.labels: labels,
-                    network.inputs_seq_len: inputs_seq_len,
-                    network.labels_seq_len: labels_seq_len,
-                    network.keep_prob_input: network.dropout_ratio_input,
-                    network.keep_prob_hidden: network.dropout_ratio_hidden,
-                    network.learning_rate: learning_rate
-                }
-
-                # Update parameters & compute loss
-                _, loss_train = sess.run(
-                    [train_op, loss_op], feed_dict=feed_dict_train)
-                loss_dev = sess.run(loss_op, feed_dict=feed_dict_dev)
-                csv_steps.append(step)
-                csv_train_loss.append(loss_train)
-                csv_dev_loss.append(loss_dev)
-
-                if (step + 1) % 10 == 0:
-
-                    # Change feed dict for evaluation
-                    feed_dict_train[network.keep_prob_input] = 1.0
-                    feed_dict_train[network.keep_prob_hidden] = 1.0
-                    feed_dict_dev[network.keep_prob_input] = 1.0
-                    feed_dict_dev[network.keep_prob_hidden] = 1.0
-
-                    # Predict ids
-                    predicted_ids_train, predicted_ids_infer = sess.run(
-                        [decode_op_train, decode_op_infer],
-                        feed_dict=feed_dict_train)
+            step_timer = StepTimer(save_path=network.model_dir)
+            profiler = Profiler(network.model_dir, steps=profile_steps)
+            for step in range(start_step, max_steps):
+
+                # Create feed dictionaries for next mini batch (train)
+                with step_timer.measure('data_wait'):
+                    feed_dict_train_list, batch_train = train_batches.next()
+                step_timer.add('feed', train_batches.duration_feed)
+                step_timer.count(batch_train[2])
+
+                # Accumulate gradients of micro-batches except the last one
+                with step_timer.measure('compute'):
+                    for feed_dict_train in feed_dict_train_list[:-1]:
+                        sess.run(network.accumulate_op,
+                                 feed_dict=feed_dict_train)
+                feed_dict_train = feed_dict_train_list[-1]
+                feed_dict_train[network.learning_rate] = lr_scheduler(step)
+
+                if not dev_monitor.is_due(step):
+                    # Update parameters
+                    with step_timer.measure('compute'):
+                        if profiler.is_due(step):
+                            profiler.run(sess, train_op, feed_dict_train,
+                                         step + 1)
+                        else:
+                            sess.run(train_op, feed_dict=feed_dict_train)
+
+                else:
+                    # Update parameters & compute loss & predict ids of the
+                    # mini batch in the same forward pass (with dropout)
+                    # NOTE: loss is averaged over towers, ids are predicted
+                    # in the first tower (of the last micro-batch)
+                    with step_timer.measure('compute'):
+                        _, loss_train, predicted_ids_train, predicted_ids_infer = sess.run(
+                            [train_op, loss_op_train, decode_op_train,
+                             decode_op_infer],
+                            feed_dict=feed_dict_train)
+
+                    # Compute loss of dev data
+                    with step_timer.measure('summary'):
+                        loss_dev, _ = dev_monitor.run(sess, loss_op)
+                    csv_steps.append(step)
+                    csv_train_loss.append(loss_train)
+                    csv_dev_loss.append(loss_dev)
 
                     # Convert to sparsetensor for computing LER
-                    indices, values, shape = list2sparsetensor(labels)
+                    labels_train = batch_train[1][split_batch(
+                        batch_train[2], num_accumulate, num_tower)[-1][0]]
+                    indices, values, shape = list2sparsetensor(labels_train)
                     indices_train, values_train, shape_train = list2sparsetensor(
                         predicted_ids_train)
                     indices_infer, values_infer, shape_infer = list2sparsetensor(
@@ -187,8 +290,9 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                     # TODO: Add dev version
 
                     # Compute accuracy & update event file
-                    ler_train = sess.run(
-                        [ler_op], feed_dict=feed_dict_ler)
+                    with step_timer.measure('summary'):
+                        ler_train = sess.run(
+                            [ler_op], feed_dict=feed_dict_ler)
                     # ler_train, summary_str_train = sess.run(
                     #     [ler_op, summary_train], feed_dict=feed_dict_train)
                     # ler_dev, summary_str_dev = sess.run(
@@ -197,10 +301,17 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                     # summary_writer.add_summary(summary_str_dev, step + 1)
                     # summary_writer.flush()
 
+                    # Report the breakdown of step time and throughput
+                    timing = step_timer.report(step + 1)
+                    summary_writer.add_summary(step_timer.summary(timing),
+                                               step + 1)
+                    summary_writer.flush()
+
                     duration_step = time.time() - start_time_step
                     print("Step %d: loss = %.3f (%.3f) / ler = %.4f (%.4f) (%.3f min)" %
                           (step + 1, loss_train, loss_dev, ler_train,
                            1, duration_step / 60))
+                    print(step_timer.format(timing))
                     sys.stdout.flush()
                     start_time_step = time.time()
 
@@ -210,12 +321,25 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                     epoch = (step + 1) // iter_per_epoch
                     print('-----EPOCH:%d (%.3f min)-----' %
                           (epoch, duration_epoch / 60))
-
-                    # Save model (check point)
-                    checkpoint_file = join(network.model_dir, 'model.ckpt')
-                    save_path = saver.save(
-                        sess, checkpoint_file, global_step=epoch)
-                    print("Model saved in file: %s" % save_path)
+                    print('Padding efficiency: %.3f' %
+                          train_data.sampler.padding_efficiency)
+                    train_data.sampler.reset_padding_efficiency()
+
+                    # Schedule the learning rate (the model is not evaluated)
+                    learning_rate_epoch = lr_scheduler.update(epoch)
+                    print('Learning rate: %e' % learning_rate_epoch)
+
+                    # Save model (check point) with the training state
+                    with step_timer.measure('checkpoint'):
+                        save_path = checkpointer.save(
+                            sess, epoch,
+                            state={'step': step + 1,
+                                   'error_best': error_best,
+                                   'sampler': train_data.sampler.state_dict(epoch),
+                                   'lr_scheduler': lr_scheduler.state_dict(),
+                                   'early_stopping': early_stopping.state_dict(),
+                                   'csv': (csv_steps, csv_train_loss, csv_dev_loss)})
+                    print("Model is being saved in file: %s" % save_path)
 
                 #     if epoch >= 10:
                 #         start_time_eval = time.time()
@@ -277,6 +401,9 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                 # start_time_epoch = time.time()
                 # start_time_step = time.time()
 
+            train_batches.stop()
+            checkpointer.close()
+
             duration_train = time.time() - start_time_train
             print('Total time: %.3f hour' % (duration_train / 3600))
 
@@ -308,74 +435,63 @@ def main(config_path):
         output_size = 32
 
     # Model setting
-    # CTCModel = load(model_type=config['model_name'])
-    network = (
-        batch_size=batch_size,
-        input_size=inputs[0].shape[1],
-        encoder_num_units=256,
-        encoder_num_layer=2,
-        attention_dim=128,
-        decoder_num_units=256,
-        decoder_num_layer=1,
-        embedding_dim=50,
-        output_size=output_size,
-        sos_index=output_size - 2,
-        eos_index=output_size - 1,
-        max_decode_length=50,
-        parameter_init=0.1,
-        clip_grad=5.0,
-        clip_activation_encoder=50,
-        clip_activation_decoder=50,
-        dropout_ratio_input=1.0,
-        dropout_ratio_hidden=1.0,
-        weight_decay=1e-6,
-        beam_width=0)
-
     network = blstm_attention_seq2seq.BLSTMAttetion(
         batch_size=param['batch_size'],
-        input_size=feature['input_size'] * feature['num_stack'],
-        encoder_num_unit=param['encoder_num_units'],
-        encoder_num_layer=num_cell=param['num_cell'],
-        num_layer=param['num_layer'],
+        input_size=feature['input_size'],
+        encoder_num_unit=param['encoder_num_unit'],
+        encoder_num_layer=param['encoder_num_layer'],
+        attention_dim=param['attention_dim'],
+        decoder_num_unit=param['decoder_num_unit'],
+        decoder_num_layer=param['decoder_num_layer'],
+        embedding_dim=param['embedding_dim'],
         output_size=output_size,
+        sos_index=output_size - 2,
+        eos_index=output_size - 1,
+        max_decode_length=param['max_decode_length'],
+        parameter_init=param['weight_init'],
         clip_grad=param['clip_grad'],
-        clip_activation=param['clip_activation'],
+        clip_activation_encoder=param['clip_activation_encoder'],
+        clip_activation_decoder=param['clip_activation_decoder'],
         dropout_ratio_input=param['dropout_input'],
         dropout_ratio_hidden=param['dropout_hidden'],
-        num_proj=param['num_proj'],
-        weight_decay=param['weight_decay'])
+        weight_decay=param['weight_decay'],
+        attention_window=param.get('attention_window'))
 
     network.model_name = config['model_name'].upper()
-    network.model_name += '_' + str(param['num_cell'])
-    network.model_name += '_' + str(param['num_layer'])
+    network.model_name += '_encoder' + str(param['encoder_num_unit'])
+    network.model_name += '_' + str(param['encoder_num_layer'])
+    network.model_name += '_attdim' + str(param['attention_dim'])
+    network.model_name += '_decoder' + str(param['decoder_num_unit'])
+    network.model_name += '_' + str(param['decoder_num_layer'])
     network.model_name += '_' + param['optimizer']
     network.model_name += '_lr' + str(param['learning_rate'])
-    if param['num_proj'] != 0:
-        network.model_name += '_proj' + str(param['num_proj'])
-    if feature['num_stack'] != 1:
-        network.model_name += '_stack' + str(feature['num_stack'])
     if param['weight_decay'] != 0:
         network.model_name += '_weightdecay' + str(param['weight_decay'])
+    if param.get('attention_window') is not None:
+        network.model_name += '_window%d-%d' % tuple(param['attention_window'])
 
     # Set save path
-    network.model_dir = mkdir('/n/sd8/inaguma/result/timit/ctc/')
+    network.model_dir = mkdir('/n/sd8/inaguma/result/timit/attention/')
     network.model_dir = mkdir_join(network.model_dir, corpus['label_type'])
     network.model_dir = mkdir_join(network.model_dir, network.model_name)
 
-    # Reset model directory
-    if not isfile(join(network.model_dir, 'complete.txt')):
+    # Reset model directory unless resuming from the latest checkpoint
+    if isfile(join(network.model_dir, 'complete.txt')):
+        raise ValueError('File exists.')
+    is_resume = (param.get('is_resume', False) and
+                 tf.train.latest_checkpoint(network.model_dir) is not None)
+    if not is_resume:
         tf.gfile.DeleteRecursively(network.model_dir)
         tf.gfile.MakeDirs(network.model_dir)
-    else:
-        raise ValueError('File exists.')
 
     # Set process name
-    setproctitle('ctc_timit_' + corpus['label_type'])
+    setproctitle('attention_timit_' + corpus['label_type'])
 
     # Save config file
     shutil.copyfile(config_path, join(network.model_dir, 'config.yml'))
 
-    sys.stdout = open(join(network.model_dir, 'train.log'), 'w')
+    sys.stdout = open(join(network.model_dir, 'train.log'),
+                      'a' if is_resume else 'w')
     print(network.model_name)
     do_train(network=network,
              optimizer=param['optimizer'],
@@ -383,8 +499,25 @@ def main(config_path):
              batch_size=param['batch_size'],
              epoch_num=param['num_epoch'],
              label_type=corpus['label_type'],
-             num_stack=feature['num_stack'],
-             num_skip=feature['num_skip'])
+             eos_index=output_size - 1,
+             num_prefetch=param.get('num_prefetch', 0),
+             storage_dtype=feature.get('storage_dtype'),
+             num_tower=param.get('num_tower', 1),
+             num_accumulate=param.get('num_accumulate', 1),
+             is_resume=is_resume,
+             num_keep_last=param.get('num_keep_last'),
+             num_keep_best=param.get('num_keep_best', 1),
+             profile_steps=param.get('profile_steps'),
+             lr_scheduler=LearningRateScheduler(
+                 param['learning_rate'],
+                 decay_type=param.get('lr_decay_type'),
+                 decay_rate=param.get('lr_decay_rate', 0.5),
+                 decay_patience=param.get('lr_decay_patience', 1),
+                 decay_start_epoch=param.get('lr_decay_start_epoch', 1),
+                 min_learning_rate=param.get('min_learning_rate', 0.),
+                 warmup_steps=param.get('warmup_steps', 0)),
+             early_stopping=EarlyStopping(
+                 patience=param.get('early_stopping_patience')))
     sys.stdout = sys.__stdout__
 
 
@@ -20,15 +20,27 @@ sys.path.append('../../')
 sys.path.append('../../../')
 from data.read_dataset_multitask_ctc import DataSet
 from models.ctc.load_model_multitask import load
+from models.data_parallel import tower_scopes, split_batch, session_config
 from metric.ctc import do_eval_per, do_eval_cer
 from utils.sparsetensor import list2sparsetensor
+from utils.prefetch import Prefetcher
+from utils.timer import StepTimer
+from utils.profiler import Profiler
+from utils.scheduler import LearningRateScheduler, EarlyStopping
+from utils.checkpoint import CheckpointSaver, restore_latest_checkpoint
+from utils.monitor import Monitor
 from utils.directory import mkdir, mkdir_join
 from utils.parameter import count_total_parameters
 from utils.csv import save_loss, save_ler
 
 
 def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
-             label_type_second, num_stack, num_skip):
+             label_type_second, num_stack, num_skip, num_prefetch=0,
+             storage_dtype=None, eval_batch_size=None,
+             monitor_decode_type='greedy', num_tower=1,
+             num_accumulate=1, is_resume=False, num_keep_last=None,
+             num_keep_best=1,
+             profile_steps=None, lr_scheduler=None, early_stopping=None):
     """Run multi-task training. The target labels in the main task is
     characters and those in the second task is 61 phones. The model is
     evaluated by CER and PER with 39 phones.
@@ -42,63 +54,137 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
         label_type_second: phone39 or phone48 or phone61
         num_stack: int, the number of frames to stack
         num_skip: int, the number of frames to skip
+        num_prefetch: int, the number of mini-batches to prefetch in the
+            background. If 0, mini-batches are made in the main thread.
+        storage_dtype: data type to keep inputs in memory.
+            ex.) float32, float16. If None, float32
+        eval_batch_size: size of mini batch on evaluation. If None, the same
+            as batch_size
+        monitor_decode_type: greedy or beam_search, the decoder to compute
+            LER at each report. Evaluation per epoch always uses beam search
+        num_tower: int, the number of towers for data-parallel training.
+            Each mini-batch is split into num_tower parts, and gradients of
+            all towers are averaged and applied once
+        num_accumulate: int, the number of micro-batches to accumulate
+            gradients over before one update. Each mini-batch is sorted by
+            length and split into num_accumulate micro-batches, so that the
+            effective batch size is batch_size while only
+            batch_size / num_accumulate utterances are in memory at a time
+        is_resume: if True, resume training from the latest checkpoint in
+            network.model_dir
+        num_keep_last: int, the number of the latest checkpoints to keep.
+            If None, all checkpoints are kept
+        num_keep_best: int, the number of checkpoints with the best dev
+            scores to keep in addition to the latest ones
+        profile_steps: list of steps (1-origin) to profile op by op. The
+            Chrome timeline and tables of ops and name scopes are saved in
+            network.model_dir. Steps with reports (every 10 steps) are not
+            profiled
+        lr_scheduler: LearningRateScheduler. If None, the learning rate is
+            constant
+        early_stopping: EarlyStopping. If None, train for epoch_num epochs
     """
+    if eval_batch_size is None:
+        eval_batch_size = batch_size
+
+    if lr_scheduler is None:
+        lr_scheduler = LearningRateScheduler(learning_rate)
+    if early_stopping is None:
+        early_stopping = EarlyStopping()
+
     # Load dataset
     train_data = DataSet(data_type='train',
                          label_type_second=label_type_second,
                          num_stack=num_stack, num_skip=num_skip,
-                         is_sorted=True)
+                         is_sorted=True, storage_dtype=storage_dtype)
     dev_data_phone61 = DataSet(data_type='dev', label_type_second='phone61',
                                num_stack=num_stack, num_skip=num_skip,
-                               is_sorted=False)
+                               is_sorted=False, storage_dtype=storage_dtype)
     dev_data_phone39 = DataSet(data_type='dev', label_type_second='phone39',
                                num_stack=num_stack, num_skip=num_skip,
-                               is_sorted=False)
+                               is_sorted=False, storage_dtype=storage_dtype)
     test_data = DataSet(data_type='test', label_type_second='phone39',
                         num_stack=num_stack, num_skip=num_skip,
-                        is_sorted=False)
+                        is_sorted=False, storage_dtype=storage_dtype)
 
     # Tell TensorFlow that the model will be built into the default graph
     with tf.Graph().as_default():
 
-        # Define placeholders
-        network.inputs = tf.placeholder(
-            tf.float32,
-            shape=[None, None, network.input_size],
-            name='input')
-        indices_pl = tf.placeholder(tf.int64, name='indices')
-        values_pl = tf.placeholder(tf.int32, name='values')
-        shape_pl = tf.placeholder(tf.int64, name='shape')
-        network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
-        indices_second_pl = tf.placeholder(tf.int64, name='indices_second')
-        values_second_pl = tf.placeholder(tf.int32, name='values_second')
-        shape_second_pl = tf.placeholder(tf.int64, name='shape_second')
-        network.labels_second = tf.SparseTensor(indices_second_pl,
-                                                values_second_pl,
-                                                shape_second_pl)
-        network.inputs_seq_len = tf.placeholder(tf.int64,
-                                                shape=[None],
-                                                name='inputs_seq_len')
-
-        # Add to the graph each operation
-        loss_op, logits_main, logits_second = network.compute_loss(
-            network.inputs,
-            network.labels,
-            network.labels_second,
-            network.inputs_seq_len)
-        train_op = network.train(loss_op,
+        # Define placeholders & add to the graph each operation for each
+        # tower
+        inputs_pl_list, labels_pl_list, labels_second_pl_list = [], [], []
+        inputs_seq_len_pl_list = []
+        tower_losses = []
+        for i_tower, scope in tower_scopes(num_tower):
+            suffix = '' if num_tower == 1 else '_tower%d' % i_tower
+            inputs_pl_list.append(tf.placeholder(
+                tf.float32,
+                shape=[None, None, network.input_size],
+                name='input' + suffix))
+            indices_pl = tf.placeholder(tf.int64, name='indices' + suffix)
+            values_pl = tf.placeholder(tf.int32, name='values' + suffix)
+            shape_pl = tf.placeholder(tf.int64, name='shape' + suffix)
+            labels_pl_list.append(
+                tf.SparseTensor(indices_pl, values_pl, shape_pl))
+            indices_second_pl = tf.placeholder(
+                tf.int64, name='indices_second' + suffix)
+            values_second_pl = tf.placeholder(
+                tf.int32, name='values_second' + suffix)
+            shape_second_pl = tf.placeholder(
+                tf.int64, name='shape_second' + suffix)
+            labels_second_pl_list.append(tf.SparseTensor(indices_second_pl,
+                                                         values_second_pl,
+                                                         shape_second_pl))
+            inputs_seq_len_pl_list.append(tf.placeholder(
+                tf.int64,
+                shape=[None],
+                name='inputs_seq_len' + suffix))
+
+            loss, logits_main_tower, logits_second_tower = network.compute_loss(
+                inputs_pl_list[-1],
+                labels_pl_list[-1],
+                labels_second_pl_list[-1],
+                inputs_seq_len_pl_list[-1],
+                num_gpu=num_tower,
+                scope=scope)
+            tower_losses.append(loss)
+            if i_tower == 0:
+                logits_main = logits_main_tower
+                logits_second = logits_second_tower
+
+        # Monitoring and evaluation use the first tower
+        network.inputs = inputs_pl_list[0]
+        network.labels = labels_pl_list[0]
+        network.labels_second = labels_second_pl_list[0]
+        network.inputs_seq_len = inputs_seq_len_pl_list[0]
+        loss_op = tower_losses[0]
+        loss_op_train = tf.add_n(tower_losses) / num_tower
+
+        train_op = network.train(tower_losses if num_tower > 1 else loss_op,
                                  optimizer='rmsprop',
                                  learning_rate_init=learning_rate,
-                                 is_scheduled=False)
+                                 is_scheduled=True,
+                                 num_accumulate=num_accumulate)
         decode_op_main, decode_op_second = network.decoder(
             logits_main,
             logits_second,
             network.inputs_seq_len,
             decode_type='beam_search',
             beam_width=20)
-        ler_op_main, ler_op_second = network.compute_ler(
-            decode_op_main, decode_op_second,
-            network.labels, network.labels_second)
+        if monitor_decode_type == 'beam_search':
+            ler_op_main, ler_op_second = network.compute_ler(
+                decode_op_main, decode_op_second,
+                network.labels, network.labels_second)
+        else:
+            # Greedy decoding is enough to monitor training
+            decode_op_main_monitor, decode_op_second_monitor = network.decoder(
+                logits_main,
+                logits_second,
+                network.inputs_seq_len,
+                decode_type='greedy')
+            ler_op_main, ler_op_second = network.compute_ler(
+                decode_op_main_monitor, decode_op_second_monitor,
+                network.labels, network.labels_second)
 
         # Build the summary tensor based on the TensorFlow collection of
         # summaries
@@ -108,9 +194,14 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
         # Add the variable initializer operation
         init_op = tf.global_variables_initializer()
 
-        # Create a saver for writing training checkpoints
+        # Create a saver for restoring checkpoints
         saver = tf.train.Saver(max_to_keep=None)
 
+        # Write checkpoints in the background and delete stale ones
+        checkpointer = CheckpointSaver(network.model_dir,
+                                       num_keep_last=num_keep_last,
+                                       num_keep_best=num_keep_best)
+
         # Count total parameters
         parameters_dict, total_parameters = count_total_parameters(
             tf.trainable_variables())
@@ -123,8 +214,9 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
         csv_steps, csv_loss_train, csv_loss_dev = [], [], []
         csv_cer_train, csv_cer_dev = [], []
         csv_per_train, csv_per_dev = [], []
+        cer_dev_best = 1
         # Create a session for running operation on the graph
-        with tf.Session() as sess:
+        with tf.Session(config=session_config(num_tower)) as sess:
 
             # Instantiate a SummaryWriter to output summaries and the graph
             summary_writer = tf.summary.FileWriter(
@@ -133,6 +225,64 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
             # Initialize parameters
             sess.run(init_op)
 
+            # Resume from the latest checkpoint (variables including the
+            # global step and slots of the optimizer, the position of the
+            # sampler and curves)
+            start_step = 0
+            if is_resume:
+                state = restore_latest_checkpoint(
+                    sess, saver, network.model_dir)
+                start_step = state['step']
+                cer_dev_best = state['cer_dev_best']
+                train_data.sampler.load_state_dict(state['sampler'])
+                lr_scheduler.load_state_dict(state['lr_scheduler'])
+                early_stopping.load_state_dict(state['early_stopping'])
+                (csv_steps, csv_loss_train, csv_loss_dev,
+                 csv_cer_train, csv_cer_dev,
+                 csv_per_train, csv_per_dev) = state['csv']
+
+            # Make feed dictionaries of training data in the background
+            def make_feed_dict_train(inputs, labels_char, labels_phone,
+                                     inputs_seq_len, _):
+                # Split the mini-batch into micro-batches and towers
+                # (padding of each part is trimmed to its longest utterance)
+                feed_dict_list = []
+                for indices_micro in split_batch(inputs_seq_len,
+                                                 num_accumulate, num_tower):
+                    feed_dict = {
+                        network.keep_prob_input: network.dropout_ratio_input,
+                        network.keep_prob_hidden: network.dropout_ratio_hidden
+                    }
+                    for i_tower, indices in enumerate(indices_micro):
+                        max_frame_num = int(max(inputs_seq_len[indices]))
+                        feed_dict[inputs_pl_list[i_tower]] = inputs[
+                            indices, :max_frame_num]
+                        feed_dict[labels_pl_list[i_tower]] = list2sparsetensor(
+                            [labels_char[j] for j in indices])
+                        feed_dict[labels_second_pl_list[i_tower]] = list2sparsetensor(
+                            [labels_phone[j] for j in indices])
+                        feed_dict[inputs_seq_len_pl_list[i_tower]] = inputs_seq_len[
+                            indices]
+                    feed_dict_list.append(feed_dict)
+                return feed_dict_list
+            train_batches = Prefetcher(train_data, batch_size,
+                                       make_feed_dict_train,
+                                       queue_size=num_prefetch)
+
+            # Draw dev mini-batches only when a report is due
+            def make_feed_dict_dev(inputs, labels_char, labels_phone,
+                                   inputs_seq_len, _):
+                return {
+                    network.inputs: inputs,
+                    network.labels: list2sparsetensor(labels_char),
+                    network.labels_second: list2sparsetensor(labels_phone),
+                    network.inputs_seq_len: inputs_seq_len,
+                    network.keep_prob_input: 1.0,
+                    network.keep_prob_hidden: 1.0
+                }
+            dev_monitor = Monitor(dev_data_phone61, batch_size,
+                                  make_feed_dict_dev, interval=10)
+
             # Train model
             iter_per_epoch = int(train_data.data_num / batch_size)
             train_step = train_data.data_num / batch_size
@@ -142,70 +292,69 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
             start_time_train = time.time()
             start_time_epoch = time.time()
             start_time_step = time.time()
-            cer_dev_best = 1
-            for step in range(max_steps):
-
-                # Create feed dictionary for next mini batch (train)
-                inputs, labels_char, labels_phone, inputs_seq_len, _ = train_data.next_batch(
-                    batch_size=batch_size)
-                feed_dict_train = {
-                    network.inputs: inputs,
-                    network.labels: list2sparsetensor(labels_char),
-                    network.labels_second: list2sparsetensor(labels_phone),
-                    network.inputs_seq_len: inputs_seq_len,
-                    network.keep_prob_input: network.dropout_ratio_input,
-                    network.keep_prob_hidden: network.dropout_ratio_hidden,
-                    network.lr: learning_rate
-                }
-
-                # Create feed dictionary for next mini batch (dev)
-                inputs, labels_char, labels_phone, inputs_seq_len, _ = dev_data_phone61.next_batch(
-                    batch_size=batch_size)
-                feed_dict_dev = {
-                    network.inputs: inputs,
-                    network.labels: list2sparsetensor(labels_char),
-                    network.labels_second: list2sparsetensor(labels_phone),
-                    network.inputs_seq_len: inputs_seq_len,
-                    network.keep_prob_input: network.dropout_ratio_input,
-                    network.keep_prob_hidden: network.dropout_ratio_hidden
-                }
-
-                # Update parameters
-                sess.run(train_op, feed_dict=feed_dict_train)
-
-                if (step + 1) % 10 == 0:
-                    # Compute loss
-                    loss_train = sess.run(loss_op, feed_dict=feed_dict_train)
-                    loss_dev = sess.run(loss_op, feed_dict=feed_dict_dev)
+            step_timer = StepTimer(save_path=network.model_dir)
+            profiler = Profiler(network.model_dir, steps=profile_steps)
+            for step in range(start_step, max_steps):
+
+                # Create feed dictionaries for next mini batch (train)
+                with step_timer.measure('data_wait'):
+                    feed_dict_train_list, batch_train = train_batches.next()
+                step_timer.add('feed', train_batches.duration_feed)
+                step_timer.count(batch_train[3])
+
+                # Accumulate gradients of micro-batches except the last one
+                with step_timer.measure('compute'):
+                    for feed_dict_train in feed_dict_train_list[:-1]:
+                        sess.run(network.accumulate_op,
+                                 feed_dict=feed_dict_train)
+                feed_dict_train = feed_dict_train_list[-1]
+                feed_dict_train[network.lr] = lr_scheduler(step)
+
+                if not dev_monitor.is_due(step):
+                    # Update parameters
+                    with step_timer.measure('compute'):
+                        if profiler.is_due(step):
+                            profiler.run(sess, train_op, feed_dict_train,
+                                         step + 1)
+                        else:
+                            sess.run(train_op, feed_dict=feed_dict_train)
+
+                else:
+                    # Update parameters & compute loss & accuracy of the
+                    # mini batch in the same forward pass (with dropout)
+                    # NOTE: loss is averaged over towers, ler is computed in
+                    # the first tower (of the last micro-batch)
+                    with step_timer.measure('compute'):
+                        _, loss_train, cer_train, per_train, summary_str_train = sess.run(
+                            [train_op, loss_op_train, ler_op_main,
+                             ler_op_second, summary_train],
+                            feed_dict=feed_dict_train)
+
+                    # Compute loss & accuracy of dev data & update event file
+                    with step_timer.measure('summary'):
+                        (loss_dev, cer_dev, per_dev, summary_str_dev), _ = dev_monitor.run(
+                            sess, [loss_op, ler_op_main, ler_op_second, summary_dev])
+                        summary_writer.add_summary(summary_str_train, step + 1)
+                        summary_writer.add_summary(summary_str_dev, step + 1)
+                        summary_writer.flush()
                     csv_steps.append(step)
                     csv_loss_train.append(loss_train)
                     csv_loss_dev.append(loss_dev)
-
-                    # Change to evaluation mode
-                    feed_dict_train[network.keep_prob_input] = 1.0
-                    feed_dict_train[network.keep_prob_hidden] = 1.0
-                    feed_dict_dev[network.keep_prob_input] = 1.0
-                    feed_dict_dev[network.keep_prob_hidden] = 1.0
-
-                    # Compute accuracy & update event file
-                    cer_train, per_train, summary_str_train = sess.run(
-                        [ler_op_main, ler_op_second, summary_train],
-                        feed_dict=feed_dict_train)
-                    cer_dev, per_dev, summary_str_dev = sess.run(
-                        [ler_op_main, ler_op_second,  summary_dev],
-                        feed_dict=feed_dict_dev)
                     csv_cer_train.append(cer_train)
                     csv_cer_dev.append(cer_dev)
                     csv_per_train.append(per_train)
                     csv_per_dev.append(per_dev)
-                    summary_writer.add_summary(summary_str_train, step + 1)
-                    summary_writer.add_summary(summary_str_dev, step + 1)
-                    summary_writer.flush()
+
+                    # Report the breakdown of step time and throughput
+                    timing = step_timer.report(step + 1)
+                    summary_writer.add_summary(step_timer.summary(timing),
+                                               step + 1)
 
                     duration_step = time.time() - start_time_step
                     print("Step % d: loss = %.3f (%.3f) / cer = %.4f (%.4f) / per = % .4f (%.4f) (%.3f min)" %
                           (step + 1, loss_train, loss_dev, cer_train, cer_dev,
                            per_train, per_dev, duration_step / 60))
+                    print(step_timer.format(timing))
                     sys.stdout.flush()
                     start_time_step = time.time()
 
@@ -215,13 +364,11 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                     epoch = (step + 1) // iter_per_epoch
                     print('-----EPOCH:%d (%.3f min)-----' %
                           (epoch, duration_epoch / 60))
+                    print('Padding efficiency: %.3f' %
+                          train_data.sampler.padding_efficiency)
+                    train_data.sampler.reset_padding_efficiency()
 
-                    # Save model (check point)
-                    checkpoint_file = join(network.model_dir, 'model.ckpt')
-                    save_path = saver.save(
-                        sess, checkpoint_file, global_step=epoch)
-                    print("Model saved in file: %s" % save_path)
-
+                    cer_dev_epoch = None
                     if epoch >= 10:
                         start_time_eval = time.time()
                         print('=== Dev Data Evaluation ===')
@@ -230,17 +377,17 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                             decode_op=decode_op_main,
                             network=network,
                             dataset=dev_data_phone39,
-                            eval_batch_size=1,
+                            eval_batch_size=eval_batch_size,
                             is_multitask=True)
                         print('  CER: %f %%' % (cer_dev_epoch * 100))
                         per_dev_epoch = do_eval_per(
                             session=sess,
                             decode_op=decode_op_second,
-                            per_op=ler_op_second,
+                            per_op=None,
                             network=network,
                             dataset=dev_data_phone39,
                             label_type=label_type_second,
-                            eval_batch_size=1,
+                            eval_batch_size=eval_batch_size,
                             is_multitask=True)
                         print('  PER: %f %%' % (per_dev_epoch * 100))
 
@@ -254,17 +401,17 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                                 decode_op=decode_op_main,
                                 network=network,
                                 dataset=test_data,
-                                eval_batch_size=1,
+                                eval_batch_size=eval_batch_size,
                                 is_multitask=True)
                             print('  CER: %f %%' % (cer_test_epoch * 100))
                             per_test_epoch = do_eval_per(
                                 session=sess,
                                 decode_op=decode_op_second,
-                                per_op=ler_op_second,
+                                per_op=None,
                                 network=network,
                                 dataset=test_data,
                                 label_type=label_type_second,
-                                eval_batch_size=1,
+                                eval_batch_size=eval_batch_size,
                                 is_multitask=True)
                             print('  PER: %f %%' % (per_test_epoch * 100))
 
@@ -275,6 +422,36 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                         start_time_epoch = time.time()
                         start_time_step = time.time()
 
+                    # Schedule the learning rate and check convergence by the
+                    # dev error
+                    learning_rate_epoch = lr_scheduler.update(
+                        epoch, cer_dev_epoch)
+                    is_stop = early_stopping.update(cer_dev_epoch)
+                    print('Learning rate: %e' % learning_rate_epoch)
+
+                    # Save model (check point) with the training state
+                    with step_timer.measure('checkpoint'):
+                        save_path = checkpointer.save(
+                            sess, epoch,
+                            state={'step': step + 1,
+                                   'cer_dev_best': cer_dev_best,
+                                   'sampler': train_data.sampler.state_dict(epoch),
+                                   'lr_scheduler': lr_scheduler.state_dict(),
+                                   'early_stopping': early_stopping.state_dict(),
+                                   'csv': (csv_steps, csv_loss_train, csv_loss_dev,
+                                           csv_cer_train, csv_cer_dev,
+                                           csv_per_train, csv_per_dev)},
+                            score=cer_dev_epoch)
+                    print("Model is being saved in file: %s" % save_path)
+
+                    if is_stop:
+                        print('Early stopping: no improvement in %d epochs' %
+                              early_stopping.patience)
+                        break
+
+            train_batches.stop()
+            checkpointer.close()
+
             duration_train = time.time() - start_time_train
             print('Total time: %.3f hour' % (duration_train / 3600))
 
@@ -345,12 +522,14 @@ def main(config_path):
         network.model_dir, 'char_' + corpus['label_type_second'])
     network.model_dir = mkdir_join(network.model_dir, network.model_name)
 
-    # Reset model directory
-    if not isfile(join(network.model_dir, 'complete.txt')):
+    # Reset model directory unless resuming from the latest checkpoint
+    if isfile(join(network.model_dir, 'complete.txt')):
+        raise ValueError('File exists.')
+    is_resume = (param.get('is_resume', False) and
+                 tf.train.latest_checkpoint(network.model_dir) is not None)
+    if not is_resume:
         tf.gfile.DeleteRecursively(network.model_dir)
         tf.gfile.MakeDirs(network.model_dir)
-    else:
-        raise ValueError('File exists.')
 
     # Set process name
     setproctitle('multitaskctc_timit')
@@ -358,7 +537,8 @@ def main(config_path):
     # Save config file
     shutil.copyfile(config_path, join(network.model_dir, 'config.yml'))
 
-    sys.stdout = open(join(network.model_dir, 'train.log'), 'w')
+    sys.stdout = open(join(network.model_dir, 'train.log'),
+                      'a' if is_resume else 'w')
     print(network.model_name)
     do_train(network=network,
              optimizer=param['optimizer'],
@@ -367,7 +547,27 @@ def main(config_path):
              epoch_num=param['num_epoch'],
              label_type_second=corpus['label_type_second'],
              num_stack=feature['num_stack'],
-             num_skip=feature['num_skip'])
+             num_skip=feature['num_skip'],
+             num_prefetch=param.get('num_prefetch', 0),
+             storage_dtype=feature.get('storage_dtype'),
+             eval_batch_size=param.get('eval_batch_size'),
+             monitor_decode_type=param.get('monitor_decode_type', 'greedy'),
+             num_tower=param.get('num_tower', 1),
+             num_accumulate=param.get('num_accumulate', 1),
+             is_resume=is_resume,
+             num_keep_last=param.get('num_keep_last'),
+             num_keep_best=param.get('num_keep_best', 1),
+             profile_steps=param.get('profile_steps'),
+             lr_scheduler=LearningRateScheduler(
+                 param['learning_rate'],
+                 decay_type=param.get('lr_decay_type'),
+                 decay_rate=param.get('lr_decay_rate', 0.5),
+                 decay_patience=param.get('lr_decay_patience', 1),
+                 decay_start_epoch=param.get('lr_decay_start_epoch', 1),
+                 min_learning_rate=param.get('min_learning_rate', 0.),
+                 warmup_steps=param.get('warmup_steps', 0)),
+             early_stopping=EarlyStopping(
+                 patience=param.get('early_stopping_patience')))
     sys.stdout = sys.__stdout__
 
 
@@ -18,6 +18,7 @@ sys.path.append('../../../')
 from data.read_dataset_multitask_ctc import DataSet
 from models.ctc.load_model_multitask import load
 from util_decode_ctc import decode_test_multitask
+from utils.checkpoint import compatible_var_dict
 
 
 def do_decode(network, label_type_second, num_stack, num_skip, epoch=None):
@@ -42,9 +43,6 @@ def do_decode(network, label_type_second, num_stack, num_skip, epoch=None):
         decode_type='beam_search',
         beam_width=20)
 
-    # Create a saver for writing training checkpoints
-    saver = tf.train.Saver()
-
     with tf.Session() as sess:
         ckpt = tf.train.get_checkpoint_state(network.model_dir)
 
@@ -55,6 +53,9 @@ def do_decode(network, label_type_second, num_stack, num_skip, epoch=None):
             if epoch is not None:
                 model_path = model_path.split('/')[:-1]
                 model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
+            # Checkpoints with the legacy names of output layers can also
+            # be restored
+            saver = tf.train.Saver(compatible_var_dict(model_path))
             saver.restore(sess, model_path)
             print("Model restored: " + model_path)
         else:
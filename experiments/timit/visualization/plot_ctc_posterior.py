@@ -18,6 +18,7 @@ sys.path.append('../../../')
 from data.read_dataset_ctc import DataSet
 from models.ctc.load_model import load
 from util_plot_ctc import posterior_test
+from utils.checkpoint import compatible_var_dict
 
 
 def do_plot(network, label_type, num_stack, num_skip, epoch=None):
@@ -47,9 +48,6 @@ def do_plot(network, label_type, num_stack, num_skip, epoch=None):
                                 beam_width=20)
     posteriors_op = network.posteriors(decode_op)
 
-    # Create a saver for writing training checkpoints
-    saver = tf.train.Saver()
-
     with tf.Session() as sess:
         ckpt = tf.train.get_checkpoint_state(network.model_dir)
 
@@ -60,6 +58,9 @@ def do_plot(network, label_type, num_stack, num_skip, epoch=None):
             if epoch is not None:
                 model_path = model_path.split('/')[:-1]
                 model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
+            # Checkpoints with the legacy names of output layers can also
+            # be restored
+            saver = tf.train.Saver(compatible_var_dict(model_path))
             saver.restore(sess, model_path)
             print("Model restored: " + model_path)
         else:
@@ -18,6 +18,7 @@ sys.path.append('../../../')
 from data.read_dataset_multitask_ctc import DataSet
 from models.ctc.load_model_multitask import load
 from util_plot_ctc import posterior_test_multitask
+from utils.checkpoint import compatible_var_dict
 
 
 def do_plot(network, label_type_second, num_stack, num_skip, epoch=None):
@@ -44,9 +45,6 @@ def do_plot(network, label_type_second, num_stack, num_skip, epoch=None):
     posteriors_op_main, posteriors_op_second = network.posteriors(
         decode_op_main, decode_op_second)
 
-    # Create a saver for writing training checkpoints
-    saver = tf.train.Saver()
-
     with tf.Session() as sess:
         ckpt = tf.train.get_checkpoint_state(network.model_dir)
 
@@ -57,6 +55,9 @@ def do_plot(network, label_type_second, num_stack, num_skip, epoch=None):
             if epoch is not None:
                 model_path = model_path.split('/')[:-1]
                 model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
+            # Checkpoints with the legacy names of output layers can also
+            # be restored
+            saver = tf.train.Saver(compatible_var_dict(model_path))
             saver.restore(sess, model_path)
             print("Model restored: " + model_path)
         else:
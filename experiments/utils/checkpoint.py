@@ -0,0 +1,278 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Save and restore checkpoints together with the training state, so that
+   training can be resumed from the latest checkpoint."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join, isfile, basename
+from glob import glob
+import re
+import sys
+import threading
+import pickle
+import six
+from six.moves import queue
+import tensorflow as tf
+
+
+class CheckpointSaver(object):
+    """Save checkpoints `model.ckpt-epoch` with the training state
+       `model.ckpt-epoch.state`, and delete stale checkpoints.
+       Values of variables are copied to host memory in the calling thread,
+       and written to disk in a background thread by a separate graph which
+       has a copy of each variable under the same name. So training is not
+       blocked by disk I/O, and checkpoints can be restored by tf.train.Saver
+       of the training graph.
+       The `checkpoint` file is updated after the checkpoint is written, so
+       tf.train.latest_checkpoint always points to a complete checkpoint.
+    Args:
+        model_dir: path to the model directory
+        var_list: list of variables to save. If None, all global variables
+        num_keep_last: int, the number of the latest checkpoints to keep.
+            If None, all checkpoints are kept
+        num_keep_best: int, the number of the best checkpoints (lowest
+            scores) to keep in addition to the latest ones
+        is_async: if False, checkpoints are written in the calling thread
+    """
+
+    def __init__(self, model_dir, var_list=None, num_keep_last=None,
+                 num_keep_best=1, is_async=True):
+        self.model_dir = model_dir
+        self.var_list = var_list or tf.global_variables()
+        self.num_keep_last = num_keep_last
+        self.num_keep_best = num_keep_best or 0
+        self.is_async = is_async
+
+        # Scores of existing checkpoints (in the case of resuming)
+        self.scores = {}
+        ckpt = tf.train.get_checkpoint_state(model_dir)
+        if ckpt is not None:
+            for checkpoint_path in ckpt.all_model_checkpoint_paths:
+                if not os.path.isabs(checkpoint_path):
+                    checkpoint_path = join(model_dir, checkpoint_path)
+                if isfile(checkpoint_path + '.state'):
+                    with open(checkpoint_path + '.state', 'rb') as f:
+                        self.scores[_epoch(checkpoint_path)] = pickle.load(
+                            f)['score']
+
+        # Copy of variables to write
+        self._graph = tf.Graph()
+        with self._graph.as_default():
+            self._placeholders, var_dict = [], {}
+            for var in self.var_list:
+                placeholder = tf.placeholder(var.dtype.base_dtype,
+                                             shape=var.get_shape())
+                var_dict[var.op.name] = tf.Variable(placeholder,
+                                                    trainable=False,
+                                                    collections=[])
+                self._placeholders.append(placeholder)
+            self._assign_op = tf.group(*[var_copy.initializer
+                                         for var_copy in var_dict.values()])
+            self._saver = tf.train.Saver(var_dict, max_to_keep=None,
+                                         save_relative_paths=True)
+        self._session = tf.Session(graph=self._graph)
+
+        if self.is_async:
+            # A snapshot is taken while the previous one is written at most
+            self._queue = queue.Queue(maxsize=1)
+            self._exc_info = None
+            self._thread = threading.Thread(target=self._run,
+                                            name='checkpoint_saver')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def save(self, session, epoch, state, score=None):
+        """Take a snapshot of variables and the training state, and write
+           them (in the background if is_async is True).
+        Args:
+            session: session of training model
+            epoch: int, the number of finished epochs
+            state: dictionary of the training state which is not in the graph
+                (e.g. the step, the sampler state, curves to save as csv
+                files)
+            score: float, the score of the model to choose the best
+                checkpoints to keep (lower is better, e.g. error rate on dev
+                data). If None, the checkpoint is kept only while it is one
+                of the latest
+        Returns:
+            checkpoint_path: path to the checkpoint
+        """
+        self._raise_if_failed()
+        values = session.run(self.var_list)
+        # NOTE: the state is serialized here because lists in it are appended
+        # to by the training thread
+        state_bytes = pickle.dumps({'score': score, 'state': state},
+                                   protocol=2)
+        item = (epoch, values, state_bytes, score)
+
+        if self.is_async:
+            self._queue.put(item)
+        else:
+            self._write(*item)
+        return join(self.model_dir, 'model.ckpt-%d' % epoch)
+
+    def wait(self):
+        """Block until all snapshots are written."""
+        if self.is_async:
+            self._queue.join()
+        self._raise_if_failed()
+
+    def close(self):
+        """Write remaining snapshots and stop the background thread."""
+        if self.is_async:
+            self._queue.put(None)
+            self._thread.join()
+        self._session.close()
+        self._raise_if_failed()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._exc_info is None:
+                    self._write(*item)
+            except Exception:
+                # Re-raise in the main thread
+                self._exc_info = sys.exc_info()
+            finally:
+                self._queue.task_done()
+
+    def _raise_if_failed(self):
+        if self.is_async and self._exc_info is not None:
+            # Keep the traceback of the worker
+            six.reraise(*self._exc_info)
+
+    def _write(self, epoch, values, state_bytes, score):
+        # The state is written first, so that the latest checkpoint always
+        # has its state
+        checkpoint_path = join(self.model_dir, 'model.ckpt-%d' % epoch)
+        with open(checkpoint_path + '.state', 'wb') as f:
+            f.write(state_bytes)
+
+        self._session.run(self._assign_op,
+                          feed_dict=dict(zip(self._placeholders, values)))
+        self._saver.save(self._session, join(self.model_dir, 'model.ckpt'),
+                         global_step=epoch, write_meta_graph=False,
+                         write_state=False)
+        self.scores[epoch] = score
+
+        epochs_keep = self._epochs_to_keep()
+        tf.train.update_checkpoint_state(
+            self.model_dir, basename(checkpoint_path),
+            all_model_checkpoint_paths=['model.ckpt-%d' % e
+                                        for e in epochs_keep])
+        for epoch_stale in sorted(set(self.scores) - set(epochs_keep)):
+            for path in glob(join(self.model_dir,
+                                  'model.ckpt-%d.*' % epoch_stale)):
+                os.remove(path)
+            del self.scores[epoch_stale]
+
+    def _epochs_to_keep(self):
+        """
+        Returns:
+            epochs_keep: sorted list of epochs of checkpoints to keep
+        """
+        epochs = sorted(self.scores)
+        if self.num_keep_last is None:
+            return epochs
+
+        epochs_keep = set(epochs[-self.num_keep_last:]
+                          if self.num_keep_last > 0 else [])
+        epochs_scored = sorted([e for e in epochs
+                                if self.scores[e] is not None],
+                               key=lambda e: (self.scores[e], -e))
+        epochs_keep.update(epochs_scored[:self.num_keep_best])
+        # The latest checkpoint is always kept to resume training
+        epochs_keep.add(epochs[-1])
+        return sorted(epochs_keep)
+
+
+def _epoch(checkpoint_path):
+    return int(checkpoint_path.split('-')[-1])
+
+
+def restore_latest_checkpoint(session, saver, model_dir):
+    """Restore variables (including the global step and slots of the
+       optimizer) from the latest checkpoint and load its training state.
+    Args:
+        session: session of training model
+        saver: tf.train.Saver
+        model_dir: path to the model directory
+    Returns:
+        state: dictionary of the training state saved by CheckpointSaver.
+            None if there is no checkpoint.
+    """
+    checkpoint_path = tf.train.latest_checkpoint(model_dir)
+    if checkpoint_path is None:
+        return None
+    if not isfile(checkpoint_path + '.state'):
+        raise ValueError('Training state of %s does not exist.' %
+                         checkpoint_path)
+
+    saver.restore(session, checkpoint_path)
+    with open(checkpoint_path + '.state', 'rb') as f:
+        state = pickle.load(f)['state']
+    print("Model restored from %s (step %d)" %
+          (checkpoint_path, state['step']))
+    return state
+
+
+# Output and bottleneck layers of CTC models were made by tf.Variable, so
+# their weights and biases were saved as `output/Variable` and
+# `output/Variable_1`. They are now made by tf.get_variable and named as
+# `output/W_output` and `output/b_output`
+_LEGACY_NAME_PATTERN = re.compile(
+    r'(^|/)(bottleneck|output|output_main|output_second)/([Wb])_\2(?=/|$)')
+
+
+def _legacy_name(name):
+    """Return the name of a variable in checkpoints written before CTC
+       models made output layers by tf.get_variable, or None if the name
+       has not changed."""
+    def replace(match):
+        suffix = 'Variable' if match.group(3) == 'W' else 'Variable_1'
+        return match.group(1) + match.group(2) + '/' + suffix
+    legacy_name = _LEGACY_NAME_PATTERN.sub(replace, name)
+    return None if legacy_name == name else legacy_name
+
+
+def compatible_var_dict(checkpoint_path, var_list=None):
+    """Map names in a checkpoint to variables, so that checkpoints written
+       with the legacy names of output layers of CTC models (see
+       _LEGACY_NAME_PATTERN) can also be restored. Use the returned
+       dictionary as var_list of tf.train.Saver.
+    Args:
+        checkpoint_path: path to the checkpoint
+        var_list: list of variables to restore. If None, all global
+            variables
+    Returns:
+        var_dict: dictionary of variables
+            key => name in the checkpoint
+            value => variable
+    """
+    if var_list is None:
+        var_list = tf.global_variables()
+    reader = tf.train.NewCheckpointReader(checkpoint_path)
+    checkpoint_names = set(reader.get_variable_to_shape_map().keys())
+
+    var_dict = {}
+    for var in var_list:
+        name = var.op.name
+        legacy_name = _legacy_name(name)
+        if name not in checkpoint_names and legacy_name is not None:
+            # The second output layer of multitask models was in the name
+            # scope of a hidden layer
+            candidates = [x for x in checkpoint_names
+                          if x == legacy_name or
+                          x.endswith('/' + legacy_name)]
+            if len(candidates) == 1:
+                name = candidates[0]
+        var_dict[name] = var
+    return var_dict
@@ -0,0 +1,88 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Load clusters of a large dataset in a background thread."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import threading
+import six
+from six.moves import queue
+
+
+class ClusterLoader(object):
+    """Load clusters in cyclic order (0, 1, ..., num_cluster - 1, 0, ...) in
+       a background thread, so that the next cluster is ready when the
+       current one runs out. The number of clusters in memory (the current
+       one, loaded ones and the one being loaded) never exceeds
+       max_resident_cluster.
+    Args:
+        load_fn: function to load a cluster from the cluster index
+        num_cluster: int, the number of clusters
+        max_resident_cluster: int, the maximum number of clusters in memory.
+            If 1, the next cluster is loaded after the current one is
+            released (no overlap with training). 2 is double buffering.
+        start_index: int, the index of the first cluster to load
+    """
+
+    def __init__(self, load_fn, num_cluster, max_resident_cluster=2,
+                 start_index=0):
+        if max_resident_cluster < 1:
+            raise ValueError('max_resident_cluster must be at least 1.')
+
+        self.load_fn = load_fn
+        self.num_cluster = num_cluster
+        self.max_resident_cluster = max_resident_cluster
+        self.start_index = start_index
+
+        self._slots = threading.Semaphore(max_resident_cluster)
+        self._queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._is_holding = False
+
+        self._thread = threading.Thread(target=self._run,
+                                        name='cluster_loader')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        cluster_index = self.start_index
+        while True:
+            # Wait for a free slot
+            self._slots.acquire()
+            if self._stop_event.is_set():
+                return
+
+            try:
+                self._queue.put((cluster_index, self.load_fn(cluster_index)))
+            except Exception:
+                # Re-raise in the main thread
+                self._queue.put((None, sys.exc_info()))
+                return
+            cluster_index = (cluster_index + 1) % self.num_cluster
+
+    def next(self):
+        """Release the previous cluster, and get the next one. The caller
+           must drop its references to the previous cluster before calling.
+        Returns:
+            cluster_index: int, the index of the cluster
+            cluster: the output of load_fn
+        """
+        if self._is_holding:
+            self._slots.release()
+        self._is_holding = True
+
+        cluster_index, cluster = self._queue.get()
+        if cluster_index is None:
+            # Keep the traceback of the worker
+            six.reraise(*cluster)
+        return cluster_index, cluster
+
+    def stop(self):
+        """Stop the background thread."""
+        self._stop_event.set()
+        self._slots.release()
+        self._thread.join()
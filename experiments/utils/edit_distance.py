@@ -0,0 +1,116 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compute token-level edit distance of a batch with numpy."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+
+def _pad(labels, max_len, pad_value):
+    padded = np.full((len(labels), max(max_len, 1)), pad_value, dtype=np.int64)
+    for i, each_label in enumerate(labels):
+        padded[i, :len(each_label)] = each_label
+    return padded
+
+
+def compute_edit_distance_batch(labels_true, labels_pred, ignore_index=None):
+    """Compute edit distance between each pair of sequences. Dynamic
+       programming is vectorized over the batch and hypothesis positions,
+       and loops only over reference positions.
+    Args:
+        labels_true: list of label sequences of ground truth
+        labels_pred: list of label sequences of prediction
+        ignore_index: int, the index removed from both sequences before
+            alignment (ex.) space
+    Returns:
+        substitution: np.ndarray of the number of substitutions
+        deletion: np.ndarray of the number of deletions
+        insertion: np.ndarray of the number of insertions
+        ref_len: np.ndarray of the length of ground truth
+    """
+    if len(labels_true) != len(labels_pred):
+        raise ValueError('The number of ground truth and prediction differ.')
+
+    labels_true = [np.asarray(each_label, dtype=np.int64)
+                   for each_label in labels_true]
+    labels_pred = [np.asarray(each_label, dtype=np.int64)
+                   for each_label in labels_pred]
+    if ignore_index is not None:
+        labels_true = [each_label[each_label != ignore_index]
+                       for each_label in labels_true]
+        labels_pred = [each_label[each_label != ignore_index]
+                       for each_label in labels_pred]
+
+    batch_size = len(labels_true)
+    ref_len = np.array([len(each_label) for each_label in labels_true],
+                       dtype=np.int64)
+    hyp_len = np.array([len(each_label) for each_label in labels_pred],
+                       dtype=np.int64)
+    max_ref_len = int(ref_len.max()) if batch_size > 0 else 0
+    max_hyp_len = int(hyp_len.max()) if batch_size > 0 else 0
+
+    # NOTE: padding does not affect distances of prefixes
+    ref = _pad(labels_true, max_ref_len, -1)
+    hyp = _pad(labels_pred, max_hyp_len, -2)
+
+    # dist[b, i, j]: distance between ref[b, :i] and hyp[b, :j]
+    dist = np.empty((batch_size, max_ref_len + 1, max_hyp_len + 1),
+                    dtype=np.int64)
+    hyp_range = np.arange(max_hyp_len + 1)
+    dist[:, 0, :] = hyp_range
+    for i in range(1, max_ref_len + 1):
+        cost = (ref[:, i - 1:i] != hyp[:, :max_hyp_len]).astype(np.int64)
+        # Substitution or deletion
+        row = np.empty((batch_size, max_hyp_len + 1), dtype=np.int64)
+        row[:, 0] = i
+        row[:, 1:] = np.minimum(dist[:, i - 1, 1:] + 1,
+                                dist[:, i - 1, :-1] + cost)
+        # Insertion: dist[i, j] = min_k (row[k] + j - k)
+        dist[:, i, :] = np.minimum.accumulate(
+            row - hyp_range, axis=1) + hyp_range
+
+    # Backtrace all utterances at once to count each type of errors
+    substitution = np.zeros((batch_size,), dtype=np.int64)
+    deletion = np.zeros((batch_size,), dtype=np.int64)
+    insertion = np.zeros((batch_size,), dtype=np.int64)
+    i, j = ref_len.copy(), hyp_len.copy()
+    active = np.flatnonzero((i > 0) | (j > 0))
+    while len(active) > 0:
+        ii, jj = i[active], j[active]
+        ii_prev, jj_prev = np.maximum(ii - 1, 0), np.maximum(jj - 1, 0)
+        d = dist[active, ii, jj]
+        cost = (ref[active, ii_prev] != hyp[active, jj_prev]).astype(np.int64)
+
+        is_diag = (ii > 0) & (jj > 0) & (
+            dist[active, ii_prev, jj_prev] + cost == d)
+        is_up = ~is_diag & (ii > 0) & (dist[active, ii_prev, jj] + 1 == d)
+        is_left = ~is_diag & ~is_up
+
+        substitution[active[is_diag]] += cost[is_diag]
+        deletion[active[is_up]] += 1
+        insertion[active[is_left]] += 1
+        i[active[is_diag | is_up]] -= 1
+        j[active[is_diag | is_left]] -= 1
+
+        active = active[(i[active] > 0) | (j[active] > 0)]
+
+    return substitution, deletion, insertion, ref_len
+
+
+def compute_error_rate(labels_true, labels_pred, ignore_index=None):
+    """Compute edit distance of each utterance normalized by the length of
+       ground truth.
+    Args:
+        labels_true: list of label sequences of ground truth
+        labels_pred: list of label sequences of prediction
+        ignore_index: int, the index removed from both sequences
+    Returns:
+        error_rate: np.ndarray of error rates of each utterance
+    """
+    substitution, deletion, insertion, ref_len = compute_edit_distance_batch(
+        labels_true, labels_pred, ignore_index)
+    return (substitution + deletion + insertion) / np.maximum(ref_len, 1)
@@ -9,7 +9,8 @@ import numpy as np
 from tqdm import tqdm
 
 
-def stack_frame(input_list, input_paths, frame_num_dict, num_stack, num_skip, is_progressbar=False):
+def stack_frame(input_list, input_paths, frame_num_dict, num_stack, num_skip, is_progressbar=False,
+                dtype=None):
     """Stack & skip some frames. This implementation is based on
        https://arxiv.org/abs/1507.06947.
            Sak, Haşim, et al.
@@ -24,13 +25,13 @@ def stack_frame(input_list, input_paths, frame_num_dict, num_stack, num_skip, is
         num_stack: int, the number of frames to stack
         num_skip: int, the number of frames to skip
         is_progressbar: if True, visualize progressbar
+        dtype: data type of stacked inputs. If None, use that of inputs
     Returns:
         stacked_input_list: list of frame-stacked inputs
     """
     if num_stack < num_skip:
         raise ValueError('Error: skip must be less than stack.')
 
-    input_size = input_list[0].shape[1]
     utt_num = len(input_paths)
 
     # Setting for progressbar
@@ -40,54 +41,53 @@ def stack_frame(input_list, input_paths, frame_num_dict, num_stack, num_skip, is
     for i_utt in iterator:
         # Per utterance
         input_name = input_paths[i_utt].split('/')[-1].split('.')[0]
-        frame_num = frame_num_dict[input_name]
-        frame_num_decimated = frame_num / num_skip
-        if frame_num_decimated != int(frame_num_decimated):
-            frame_num_decimated += 1
-        frame_num_decimated = int(frame_num_decimated)
+        stacked_input_list.append(stack_frame_utterance(
+            input_list[i_utt], num_stack, num_skip,
+            frame_num=frame_num_dict[input_name], dtype=dtype))
 
-        stacked_frames = np.zeros(
-            (frame_num_decimated, input_size * num_stack))
-        stack_count = 0  # counter for stacked_frames
-        stack = []
-        for i_frame, frame in enumerate(input_list[i_utt]):
-            #####################
-            # final frame
-            #####################
-            if i_frame == len(input_list[i_utt]) - 1:
-                # Stack the final frame
-                stack.append(frame)
-
-                while stack_count != int(frame_num_decimated):
-                    # Concatenate stacked frames
-                    for i_stack in range(len(stack)):
-                        stacked_frames[stack_count][input_size *
-                                                    i_stack:input_size * (i_stack + 1)] = stack[i_stack]
-                    stack_count += 1
+    return stacked_input_list
 
-                    # Delete some frames to skip
-                    for _ in range(num_skip):
-                        if len(stack) != 0:
-                            stack.pop(0)
 
-            ########################
-            # first & middle frames
-            ########################
-            elif len(stack) < num_stack:
-                # Stack some frames until stack is filled
-                stack.append(frame)
+def stack_frame_utterance(inputs, num_stack, num_skip, frame_num=None,
+                          dtype=None):
+    """Stack & skip frames of one utterance. The i-th output frame is the
+       concatenation of input frames from `i * num_skip` to
+       `i * num_skip + num_stack - 1`, and frames beyond the final frame are
+       filled with 0.
+    Args:
+        inputs: np.ndarray of size `[T, input_size]`
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        frame_num: int, the number of frames. If None, use `len(inputs)`
+        dtype: data type of stacked inputs. If None, use that of inputs
+    Returns:
+        stacked_inputs: np.ndarray of size
+            `[ceil(frame_num / num_skip), input_size * num_stack]`
+    """
+    if num_stack < num_skip:
+        raise ValueError('Error: skip must be less than stack.')
 
-                if len(stack) == num_stack:
-                    # Concatenate stacked frames
-                    for i_stack in range(num_stack):
-                        stacked_frames[stack_count][input_size *
-                                                    i_stack:input_size * (i_stack + 1)] = stack[i_stack]
-                    stack_count += 1
+    if frame_num is None:
+        frame_num = len(inputs)
+    input_size = inputs.shape[1]
+    frame_num_decimated = stacked_frame_num(frame_num, num_skip)
 
-                    # Delete some frames to skip
-                    for _ in range(num_skip):
-                        stack.pop(0)
+    # Fill the j-th block of all output frames at once by a strided slice
+    stacked_inputs = np.zeros((frame_num_decimated, input_size * num_stack),
+                              dtype=inputs.dtype if dtype is None else dtype)
+    for i_stack in range(num_stack):
+        frames = inputs[i_stack:frame_num:num_skip][:frame_num_decimated]
+        stacked_inputs[:len(frames),
+                       input_size * i_stack:input_size * (i_stack + 1)] = frames
+    return stacked_inputs
 
-        stacked_input_list.append(stacked_frames)
 
-    return stacked_input_list
+def stacked_frame_num(frame_num, num_skip):
+    """
+    Args:
+        frame_num: int, the number of frames before stacking
+        num_skip: int, the number of frames to skip
+    Returns:
+        int, the number of frames after stacking & skipping
+    """
+    return -(-frame_num // num_skip)
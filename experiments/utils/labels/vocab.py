@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Label vocabulary loaded once per mapping file."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import abspath
+import numpy as np
+
+# key => absolute path to the mapping file, value => Vocab
+_vocab_cache = {}
+
+
+class Vocab(object):
+    """Mapping between labels and indices. Each line of the mapping file is
+       `label index`.
+    Args:
+        map_file_path: path to the mapping file
+    """
+
+    def __init__(self, map_file_path):
+        self.map_file_path = map_file_path
+
+        label2id = {}
+        with open(map_file_path, 'r') as f:
+            for line in f:
+                line = line.strip().split()
+                if len(line) == 0:
+                    continue
+                label2id[line[0]] = int(line[1])
+        self.label2id = label2id
+
+        # Lookup array from index to label
+        self.id2label = np.empty((max(label2id.values()) + 1,), dtype=object)
+        for label, index in label2id.items():
+            self.id2label[index] = label
+
+    def __len__(self):
+        return len(self.label2id)
+
+    def ids2labels(self, ids):
+        """
+        Args:
+            ids: list or np.ndarray of indices
+        Returns:
+            labels: list of labels (string)
+        """
+        return self.id2label[np.asarray(ids, dtype=np.int64)].tolist()
+
+    def labels2ids(self, labels):
+        """
+        Args:
+            labels: list of labels (string)
+        Returns:
+            ids: np.ndarray of indices
+        """
+        return np.array([self.label2id[label] for label in labels],
+                        dtype=np.int64)
+
+    def ids2str(self, ids, delimiter=''):
+        """
+        Args:
+            ids: list or np.ndarray of indices
+            delimiter: string to join labels
+        Returns:
+            string of labels
+        """
+        return delimiter.join(self.ids2labels(ids))
+
+
+def load_vocab(map_file_path):
+    """Load a mapping file only at the first call in the process.
+    Args:
+        map_file_path: path to the mapping file
+    Returns:
+        vocab: Vocab class
+    """
+    key = abspath(map_file_path)
+    if key not in _vocab_cache:
+        _vocab_cache[key] = Vocab(map_file_path)
+    return _vocab_cache[key]
@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Report memory of inputs of a split for each storage data type.
+   Only the frame number dictionary is read, so this is fast even for CSJ.
+
+   Usage (in the experiments directory):
+       python -m utils.memory_report path_to_frame_num_dict input_size num_stack num_skip batch_size
+       (ex.) python -m utils.memory_report .../ctc/character/train/frame_num.pickle 123 3 3 32
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import pickle
+import numpy as np
+
+from utils.frame_stack import stacked_frame_num
+
+
+DTYPES = ['float64', 'float32', 'float16']
+
+
+def memory_report(frame_num_list, input_size, num_stack=None, num_skip=None,
+                  batch_size=None):
+    """Compute memory of inputs for each data type.
+    Args:
+        frame_num_list: list of the number of frames of each utterance
+        input_size: int, the dimension of input features (before stacking)
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        batch_size: int, the size of mini-batch. If given, the size of the
+            largest padded mini-batch is also computed
+    Returns:
+        report: dictionary of dictionaries
+            key => data type
+            value => dictionary of bytes
+                `raw`: inputs before stacking (kept with lazy stacking)
+                `stacked`: inputs after stacking
+                `batch`: the largest padded mini-batch. Mini-batches are
+                    always made in float32 (DataSet upcasts from the
+                    storage data type), so this does not depend on it
+                `feed`: memory fed to TensorFlow, equal to `batch`
+    """
+    frame_nums = np.asarray(frame_num_list, dtype=np.int64)
+    if (num_stack is not None) and (num_skip is not None):
+        stacked_frame_nums = stacked_frame_num(frame_nums, num_skip)
+        stacked_input_size = input_size * num_stack
+    else:
+        stacked_frame_nums = frame_nums
+        stacked_input_size = input_size
+
+    report = {}
+    for dtype in DTYPES:
+        itemsize = np.dtype(dtype).itemsize
+        report[dtype] = {
+            'raw': int(frame_nums.sum()) * input_size * itemsize,
+            'stacked': int(stacked_frame_nums.sum()) * stacked_input_size * itemsize
+        }
+        if batch_size is not None:
+            batch_elements = (batch_size * int(stacked_frame_nums.max()) *
+                              stacked_input_size)
+            report[dtype]['batch'] = batch_elements * \
+                np.dtype(np.float32).itemsize
+            report[dtype]['feed'] = report[dtype]['batch']
+    return report
+
+
+def print_report(report):
+    keys = [key for key in ['raw', 'stacked', 'batch', 'feed']
+            if key in report[DTYPES[0]]]
+    print('%-8s ' % 'dtype' + ' '.join(['%12s' % key for key in keys]))
+    for dtype in DTYPES:
+        print('%-8s ' % dtype + ' '.join(
+            ['%9.1f MB' % (report[dtype][key] / 1024 ** 2) for key in keys]))
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) != 6:
+        raise ValueError(
+            ("Set a path to the frame number dictionary, input_size, "
+             "num_stack, num_skip and batch_size.\n"
+             "Usage: python -m utils.memory_report path_to_frame_num_dict "
+             "input_size num_stack num_skip batch_size"))
+    with open(args[1], 'rb') as f:
+        frame_num_dict = pickle.load(f)
+    print(str(len(frame_num_dict)) + ' utterances')
+    print_report(memory_report(list(frame_num_dict.values()),
+                               input_size=int(args[2]),
+                               num_stack=int(args[3]),
+                               num_skip=int(args[4]),
+                               batch_size=int(args[5])))
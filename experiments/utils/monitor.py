@@ -0,0 +1,49 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Monitor a model on mini-batches of a dataset at regular intervals."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+
+class Monitor(object):
+    """Run monitoring operations on a mini-batch of a dataset only when a
+       report is due. A mini-batch is drawn and its feed dictionary is made
+       at each report, not at each training step.
+    Args:
+        dataset: Dataset class
+        batch_size: int, the size of mini-batch
+        feed_dict_fn: function to make a feed dictionary (in evaluation
+            mode) from the outputs of `dataset.next_batch`
+        interval: int, report every `interval` steps
+    """
+
+    def __init__(self, dataset, batch_size, feed_dict_fn, interval=10):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.feed_dict_fn = feed_dict_fn
+        self.interval = interval
+
+    def is_due(self, step):
+        """
+        Args:
+            step: int, the training step (0-origin)
+        Returns:
+            If True, report at this step
+        """
+        return (step + 1) % self.interval == 0
+
+    def run(self, session, fetches):
+        """Draw the next mini-batch and run fetches in a single `sess.run`.
+        Args:
+            session: session of training model
+            fetches: operations to run
+        Returns:
+            outputs: the outputs of `session.run(fetches)`
+            batch: A tuple of the outputs of `dataset.next_batch`
+        """
+        batch = self.dataset.next_batch(batch_size=self.batch_size)
+        outputs = session.run(fetches, feed_dict=self.feed_dict_fn(*batch))
+        return outputs, batch
@@ -0,0 +1,152 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Pack per-utterance .npy files of a split into one contiguous file.
+   The packed file is memory-mapped when loading, so that each utterance
+   becomes a zero-copy view and only the index has to be read at startup.
+
+   Usage:
+       python packed_dataset.py path_to_dataset (ex. .../ctc/phone61/train)
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join, basename, isfile
+import sys
+import numpy as np
+from tqdm import tqdm
+
+
+def pack(paths, save_path, dtype=None, is_progressbar=False):
+    """Write arrays into one contiguous file and an offsets/lengths index.
+    Args:
+        paths: list of paths to .npy files of each utterance
+        save_path: path to save files (without extension)
+            `save_path.npy` and `save_path_index.npz` are written
+        dtype: data type of the packed file. If None, use the data type of
+            the first array
+        is_progressbar: if True, visualize progressbar
+    """
+    if len(paths) == 0:
+        raise ValueError('There are not any files to pack.')
+    names = [basename(path).split('.')[0] for path in paths]
+
+    # Utterances are looked up by file names, so the same name in different
+    # (speaker) directories can not be distinguished
+    name2path = {}
+    for name, path in zip(names, paths):
+        if name in name2path:
+            raise ValueError('%s and %s have the same utterance name.' %
+                             (name2path[name], path))
+        name2path[name] = path
+
+    # Read shapes only (the data itself is not loaded)
+    lengths = np.zeros((len(paths),), dtype=np.int64)
+    for i, path in enumerate(paths):
+        array = np.load(path, mmap_mode='r')
+        if array.ndim == 0 or array.dtype.kind not in 'biuf':
+            raise ValueError(
+                '%s is not a numeric array and can not be packed.' % path)
+        if i == 0:
+            trailing_shape = array.shape[1:]
+            if dtype is None:
+                dtype = array.dtype
+        elif array.shape[1:] != trailing_shape:
+            raise ValueError('The shape of %s is not consistent.' % path)
+        lengths[i] = array.shape[0]
+    offsets = np.zeros((len(paths),), dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)[:-1]
+
+    # Copy each array into the contiguous file
+    packed = np.lib.format.open_memmap(
+        save_path + '.npy', mode='w+', dtype=dtype,
+        shape=(int(lengths.sum()),) + trailing_shape)
+    iterator = tqdm(range(len(paths))) if is_progressbar else range(len(paths))
+    for i in iterator:
+        packed[offsets[i]:offsets[i] + lengths[i]] = np.load(paths[i])
+    packed.flush()
+    del packed
+
+    np.savez(save_path + '_index.npz',
+             names=np.array(names), offsets=offsets, lengths=lengths)
+
+
+def pack_dataset(dataset_path, is_progressbar=False):
+    """Pack inputs (as float32) & labels of one split.
+    Args:
+        dataset_path: path to the split including `input` and `label`
+            directories (speaker directories are also allowed)
+        is_progressbar: if True, visualize progressbar
+    """
+    save_path = join(dataset_path, 'packed')
+    if not os.path.isdir(save_path):
+        os.mkdir(save_path)
+
+    for data_name in ['input', 'label']:
+        paths = []
+        for root, _, file_names in os.walk(join(dataset_path, data_name)):
+            for file_name in file_names:
+                if file_name.endswith('.npy'):
+                    paths.append(join(root, file_name))
+        paths = sorted(paths)
+
+        print('=> Packing ' + str(len(paths)) + ' ' + data_name + 's...')
+        pack(paths, join(save_path, data_name),
+             dtype=np.float32 if data_name == 'input' else None,
+             is_progressbar=is_progressbar)
+
+
+class PackedArray(object):
+    """Memory-mapped arrays written by `pack`.
+    Args:
+        path: path to the packed file (without extension)
+    """
+
+    def __init__(self, path):
+        if not isfile(path + '.npy'):
+            raise ValueError(
+                'There is not a packed file. Run packed_dataset.py first.')
+
+        self.data = np.load(path + '.npy', mmap_mode='r')
+        index = np.load(path + '_index.npz')
+        self.offsets = index['offsets']
+        self.lengths = index['lengths']
+        self.name2index = dict(
+            zip(index['names'].tolist(), range(len(self.offsets))))
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, name):
+        """Return a view of the array of the utterance (no copy)."""
+        i = self.name2index[name]
+        return self.data[self.offsets[i]:self.offsets[i] + self.lengths[i]]
+
+    def load(self, names, dtype=None):
+        """
+        Args:
+            names: list of utterance names
+            dtype: data type of arrays. If given and different from that of
+                the packed file, arrays are copied into memory
+        Returns:
+            array_list: np.ndarray of views, the data type is object
+        """
+        array_list = np.empty((len(names),), dtype=object)
+        for i, name in enumerate(names):
+            array_list[i] = self[name]
+            if dtype is not None:
+                array_list[i] = array_list[i].astype(dtype, copy=False)
+        return array_list
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) != 2:
+        raise ValueError(
+            ("Set a path to the dataset.\n"
+             "Usage: python packed_dataset.py path_to_dataset"))
+    pack_dataset(args[1], is_progressbar=True)
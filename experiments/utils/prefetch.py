@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Prefetch mini-batches in a background thread."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import threading
+import six
+from six.moves import queue
+
+
+class Prefetcher(object):
+    """Make feed dictionaries of the next mini-batches in a background
+       thread, so that padding inputs and making sparse labels overlap with
+       `sess.run`. The order of mini-batches is the same as that of
+       `dataset.next_batch`.
+    Args:
+        dataset: Dataset class
+        batch_size: int, the size of mini-batch
+        feed_dict_fn: function to make a feed dictionary from the outputs of
+            `dataset.next_batch`
+        queue_size: int, the maximum number of prefetched mini-batches.
+            If 0 or None, mini-batches are made synchronously in the main
+            thread.
+    Attributes:
+        duration_feed: float, seconds spent in feed_dict_fn for the
+            mini-batch returned by the last `next`
+    """
+
+    def __init__(self, dataset, batch_size, feed_dict_fn, queue_size=0):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.feed_dict_fn = feed_dict_fn
+        self.queue_size = queue_size or 0
+        self.duration_feed = 0.
+
+        if self.queue_size > 0:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._stop_event = threading.Event()
+            self._thread = threading.Thread(target=self._run,
+                                            name='prefetcher')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _make(self):
+        batch = self.dataset.next_batch(batch_size=self.batch_size)
+        start_time = time.time()
+        feed_dict = self.feed_dict_fn(*batch)
+        return feed_dict, batch, time.time() - start_time
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                item = self._make()
+            except Exception:
+                # Re-raise in the main thread
+                item = sys.exc_info()
+
+            # Block until there is a free slot (check stop every second)
+            while not self._stop_event.is_set():
+                try:
+                    self._queue.put(item, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+
+            if isinstance(item[0], type):
+                return
+
+    def next(self):
+        """
+        Returns:
+            feed_dict: feed dictionary of the next mini-batch
+            batch: A tuple of the outputs of `dataset.next_batch`
+        """
+        if self.queue_size == 0:
+            item = self._make()
+        else:
+            item = self._queue.get()
+            if isinstance(item[0], type):
+                # Keep the traceback of the worker
+                six.reraise(*item)
+
+        feed_dict, batch, self.duration_feed = item
+        return feed_dict, batch
+
+    def stop(self):
+        """Stop the background thread."""
+        if self.queue_size > 0:
+            self._stop_event.set()
+            self._thread.join()
@@ -0,0 +1,154 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Profile training steps op by op."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import join
+import re
+from collections import defaultdict
+import tensorflow as tf
+from tensorflow.python.client import timeline
+
+# Name scopes of models to group ops by. The innermost matching scope of an
+# op is used (e.g. attention_layer in the decoder)
+SCOPES = (r'b?(lstm|gru)_hidden\d+', r'\w+_encoder_hidden\d+', 'Encoder',
+          'bridge', 'target_embedding', 'decoder', 'attention_layer',
+          'bottleneck', 'output', 'ctc_loss', 'weight_decay_loss', 'ler',
+          'average_gradients', 'accumulate_gradients')
+
+
+class Profiler(object):
+    """Run chosen training steps with full tracing, and write the Chrome
+       timeline `timeline_step%d.json` (open in chrome://tracing), the
+       table of ops `ops_step%d.csv` and the table of name scopes
+       `scopes_step%d.csv` in save_path. Ops are grouped by the name scopes
+       of the model, separately in the forward and backward (`gradients/`)
+       passes. Towers are merged.
+    Args:
+        save_path: path to the directory to save results
+        steps: list of steps (1-origin) to profile
+        scopes: list of regular expressions of name scopes to group ops by.
+            Ops in none of them are grouped by their outermost scope
+    """
+
+    def __init__(self, save_path, steps=None, scopes=SCOPES):
+        self.save_path = save_path
+        self.steps = set(steps or [])
+        self._scope_patterns = [re.compile(scope + '$') for scope in scopes]
+
+    def is_due(self, step):
+        """
+        Args:
+            step: int, the training step (0-origin)
+        Returns:
+            If True, profile this step
+        """
+        return (step + 1) in self.steps
+
+    def run(self, session, fetches, feed_dict, step):
+        """Run fetches with full tracing and save the results.
+        Args:
+            session: session of training model
+            fetches: operations to run
+            feed_dict: feed dictionary
+            step: int, the training step (1-origin)
+        Returns:
+            outputs: the outputs of `session.run(fetches)`
+        """
+        run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+        run_metadata = tf.RunMetadata()
+        outputs = session.run(fetches, feed_dict=feed_dict,
+                              options=run_options, run_metadata=run_metadata)
+
+        with open(join(self.save_path, 'timeline_step%d.json' % step),
+                  'w') as f:
+            f.write(timeline.Timeline(
+                run_metadata.step_stats).generate_chrome_trace_format(
+                    show_memory=True))
+
+        ops = self.aggregate_ops(run_metadata.step_stats)
+        self._save_ops(ops, step)
+        self._save_scopes(ops, step)
+        return outputs
+
+    def group(self, node_name):
+        """
+        Args:
+            node_name: string, the name of op
+        Returns:
+            scope: string, the name scope to group the op by
+            is_backward: bool, if True, the op is in the backward pass
+        """
+        names = node_name.split('/')
+        is_backward = any(name.startswith('gradients') for name in names)
+        names = [name for name in names[:-1]
+                 if not re.match(r'(tower_\d+|gradients(_\d+)?)$', name)]
+        for name in reversed(names):
+            if any(pattern.match(name) for pattern in self._scope_patterns):
+                return name, is_backward
+        return (names[0] if len(names) > 0 else '(root)'), is_backward
+
+    def aggregate_ops(self, step_stats):
+        """Sum the time and memory of each op over devices.
+        Args:
+            step_stats: StepStats of RunMetadata
+        Returns:
+            ops: dictionary of op name to a dictionary of `type`,
+                `time_ms` and `output_mb`
+        """
+        ops = defaultdict(lambda: {'type': '', 'time_ms': 0.,
+                                   'output_mb': 0.})
+        for dev_stats in step_stats.dev_stats:
+            # NOTE: ops on GPU are also listed in each stream
+            if dev_stats.device.endswith('/stream:all'):
+                continue
+            for node_stats in dev_stats.node_stats:
+                op = ops[node_stats.node_name]
+                if ' = ' in node_stats.timeline_label:
+                    op['type'] = node_stats.timeline_label.split(
+                        ' = ')[1].split('(')[0]
+                op['time_ms'] += node_stats.all_end_rel_micros / 1000
+                op['output_mb'] += sum(
+                    output.tensor_description.allocation_description.requested_bytes
+                    for output in node_stats.output) / 1024 ** 2
+        return ops
+
+    def _save_ops(self, ops, step):
+        with open(join(self.save_path, 'ops_step%d.csv' % step), 'w') as f:
+            f.write('op,type,scope,pass,time_ms,output_mb\n')
+            for node_name, op in sorted(ops.items(),
+                                        key=lambda x: -x[1]['time_ms']):
+                scope, is_backward = self.group(node_name)
+                f.write('%s,%s,%s,%s,%.3f,%.3f\n' %
+                        (node_name, op['type'], scope,
+                         'backward' if is_backward else 'forward',
+                         op['time_ms'], op['output_mb']))
+
+    def _save_scopes(self, ops, step):
+        scopes = defaultdict(lambda: [0, 0., 0.])
+        for node_name, op in ops.items():
+            scope = scopes[self.group(node_name)]
+            scope[0] += 1
+            scope[1] += op['time_ms']
+            scope[2] += op['output_mb']
+        time_total = sum(scope[1] for scope in scopes.values()) or 1.
+
+        print('Profile of step %d:' % step)
+        print('  %-28s %-8s %6s %10s %6s %10s' %
+              ('scope', 'pass', 'ops', 'time(ms)', '%', 'output(MB)'))
+        with open(join(self.save_path, 'scopes_step%d.csv' % step),
+                  'w') as f:
+            f.write('scope,pass,num_op,time_ms,time_percent,output_mb\n')
+            for (name, is_backward), (num_op, time_ms, output_mb) in sorted(
+                    scopes.items(), key=lambda x: -x[1][1]):
+                pass_name = 'backward' if is_backward else 'forward'
+                f.write('%s,%s,%d,%.3f,%.2f,%.3f\n' %
+                        (name, pass_name, num_op, time_ms,
+                         time_ms / time_total * 100, output_mb))
+                print('  %-28s %-8s %6d %10.3f %6.2f %10.3f' %
+                      (name, pass_name, num_op, time_ms,
+                       time_ms / time_total * 100, output_mb))
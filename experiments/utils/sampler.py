@@ -0,0 +1,211 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Length-bucketed mini-batch sampler."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import deque
+import numpy as np
+
+
+class BucketSampler(object):
+    """Sample mini-batches of utterances which have similar frame num.
+       Utterances are grouped into buckets by frame num, and batches are made
+       in each bucket. Each epoch is planned once, so that drawing a batch
+       costs O(batch_size).
+    Args:
+        frame_num_list: list of the number of frames of each utterance
+        bucket_width: int, the width of each bucket (the number of frames).
+            If None, all utterances are in one bucket (random sampling)
+        is_shuffled: if True, shuffle utterances in each bucket and batches
+            across buckets at each epoch. If False, batches are made in
+            ascending order of frame num
+        seed: int or np.random.RandomState, random seed
+    """
+
+    def __init__(self, frame_num_list, bucket_width=None, is_shuffled=True,
+                 seed=None):
+        self.frame_nums = np.asarray(frame_num_list, dtype=np.int64)
+        self.data_num = len(self.frame_nums)
+        self.bucket_width = bucket_width
+        self.is_shuffled = is_shuffled
+        if isinstance(seed, np.random.RandomState):
+            self.rng = seed
+        else:
+            self.rng = np.random.RandomState(seed)
+
+        self.epoch = 0
+        self.batch_size = None
+        self.batches = deque()
+
+        # RNG states before planning each epoch (for resuming training)
+        self._rng_states = {}
+
+        # For computing padding efficiency
+        self.real_frame_num = 0
+        self.padded_frame_num = 0
+
+    def set_frame_num_list(self, frame_num_list):
+        """Replace utterances to sample (ex.) the next cluster of a large
+           dataset). Batches planned for the previous utterances are dropped,
+           and the epoch, the RNG and padding efficiency are carried over.
+        Args:
+            frame_num_list: list of the number of frames of each utterance
+        """
+        self.frame_nums = np.asarray(frame_num_list, dtype=np.int64)
+        self.data_num = len(self.frame_nums)
+        self.batches = deque()
+        self.batch_size = None
+
+    def _plan(self, indices, batch_size):
+        """Make batches from indices.
+        Args:
+            indices: np.ndarray of utterance indices to divide into batches
+            batch_size: int, the size of mini-batch
+        Returns:
+            batches: list of np.ndarray of utterance indices. Only the final
+                batch can be smaller than batch_size.
+        """
+        if not self.is_shuffled:
+            # Ascending order of frame num
+            indices = indices[np.argsort(
+                self.frame_nums[indices], kind='mergesort')]
+            return [indices[i:i + batch_size]
+                    for i in range(0, len(indices), batch_size)]
+
+        indices = self.rng.permutation(indices)
+        if self.bucket_width is None:
+            return [indices[i:i + batch_size]
+                    for i in range(0, len(indices), batch_size)]
+
+        # Group into buckets (the order in each bucket is random)
+        bucket_ids = self.frame_nums[indices] // self.bucket_width
+        order = np.argsort(bucket_ids, kind='mergesort')
+        indices, bucket_ids = indices[order], bucket_ids[order]
+        boundaries = np.flatnonzero(np.diff(bucket_ids)) + 1
+        batches, rest = [], []
+        for bucket in np.split(indices, boundaries):
+            full_num = len(bucket) // batch_size * batch_size
+            if full_num > 0:
+                batches.extend(np.split(bucket[:full_num],
+                                        full_num // batch_size))
+            rest.append(bucket[full_num:])
+
+        # Remainders of all buckets are merged in ascending order of frame num
+        rest = np.concatenate(rest)
+        rest = rest[np.argsort(self.frame_nums[rest], kind='mergesort')]
+        rest_batches = [rest[i:i + batch_size]
+                        for i in range(0, len(rest), batch_size)]
+        if len(rest_batches) > 0 and len(rest_batches[-1]) < batch_size:
+            last_batch = [rest_batches.pop()]
+        else:
+            last_batch = []
+
+        # Shuffle batches across buckets
+        batches += rest_batches
+        batches = [batches[i] for i in self.rng.permutation(len(batches))]
+
+        return batches + last_batch
+
+    def next(self, batch_size):
+        """Draw the next mini-batch.
+        Args:
+            batch_size: int, the size of mini-batch
+        Returns:
+            indices: np.ndarray of utterance indices
+            is_new_epoch: if True, the returned batch is the last one of the
+                current epoch
+        """
+        if len(self.batches) == 0:
+            # Keep the states of the last 2 epochs because a prefetcher can
+            # start the next epoch before the checkpoint of the current one
+            self._rng_states[self.epoch] = self.rng.get_state()
+            self._rng_states.pop(self.epoch - 2, None)
+
+            self.batches = deque(
+                self._plan(np.arange(self.data_num), batch_size))
+            self.batch_size = batch_size
+        elif batch_size != self.batch_size:
+            # Make batches again from the rest of the current epoch
+            rest = np.concatenate(list(self.batches))
+            self.batches = deque(self._plan(rest, batch_size))
+            self.batch_size = batch_size
+
+        indices = self.batches.popleft()
+        is_new_epoch = len(self.batches) == 0
+        if is_new_epoch:
+            self.epoch += 1
+
+        frame_nums = self.frame_nums[indices]
+        self.real_frame_num += int(frame_nums.sum())
+        self.padded_frame_num += int(frame_nums.max()) * len(indices)
+
+        return indices, is_new_epoch
+
+    @property
+    def padding_efficiency(self):
+        """The ratio of real frames to padded frames in drawn batches."""
+        if self.padded_frame_num == 0:
+            return 1.0
+        return self.real_frame_num / self.padded_frame_num
+
+    def reset_padding_efficiency(self):
+        self.real_frame_num = 0
+        self.padded_frame_num = 0
+
+    def state_dict(self, epoch=None):
+        """Return the state to draw mini-batches from the beginning of an
+           epoch again.
+        Args:
+            epoch: int, the number of finished epochs. If None, self.epoch
+        Returns:
+            state: dictionary of the epoch and the RNG state
+        """
+        if epoch is None:
+            epoch = self.epoch
+
+        if epoch in self._rng_states:
+            rng_state = self._rng_states[epoch]
+        elif epoch == self.epoch and len(self.batches) == 0:
+            # The next epoch has not been planned yet
+            rng_state = self.rng.get_state()
+        else:
+            raise ValueError(
+                'The state at the beginning of epoch %d is not kept.' % epoch)
+
+        return {'epoch': epoch, 'rng_state': rng_state}
+
+    def load_state_dict(self, state):
+        """Restore the state returned by state_dict. The next mini-batch is
+           the first one of the epoch.
+        Args:
+            state: dictionary of the epoch and the RNG state
+        """
+        self.epoch = state['epoch']
+        self.rng.set_state(state['rng_state'])
+        self.batches = deque()
+        self.batch_size = None
+        self._rng_states = {}
+
+
+def compute_padding_efficiency(frame_num_list, batch_size, bucket_width,
+                               seed=None):
+    """Compute the padding efficiency of one epoch without drawing batches
+       from a sampler in use. This is useful to tune bucket_width.
+    Args:
+        frame_num_list: list of the number of frames of each utterance
+        batch_size: int, the size of mini-batch
+        bucket_width: int, the width of each bucket (the number of frames)
+        seed: int, random seed
+    Returns:
+        efficiency: the ratio of real frames to padded frames
+    """
+    sampler = BucketSampler(frame_num_list, bucket_width=bucket_width,
+                            seed=seed)
+    is_new_epoch = False
+    while not is_new_epoch:
+        _, is_new_epoch = sampler.next(batch_size)
+    return sampler.padding_efficiency
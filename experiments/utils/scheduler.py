@@ -0,0 +1,139 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Schedule the learning rate and stop training early by the error rate on
+   the dev set at each epoch."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+
+class LearningRateScheduler(object):
+    """Decide the learning rate of each step.
+       Usage:
+           feed_dict[network.lr] = lr_scheduler(step)
+           ...
+           # At the end of each epoch
+           lr_scheduler.update(epoch, error_dev_epoch)
+    Args:
+        learning_rate_init: float, the initial learning rate
+        decay_type: the way to decay the learning rate at the end of epochs.
+            None: constant
+            plateau: decay when the dev error has not improved for
+                decay_patience epochs
+            exponential: decay at every epoch
+        decay_rate: float, the learning rate is multiplied by this when
+            decayed
+        decay_patience: int, the number of epochs without improvement
+            before decay (plateau)
+        decay_start_epoch: int, the learning rate is not decayed before this
+            epoch
+        min_learning_rate: float, the lower bound of the learning rate
+        warmup_steps: int, the learning rate is linearly increased from 0
+            over the first warmup_steps steps
+    """
+
+    def __init__(self, learning_rate_init, decay_type=None, decay_rate=0.5,
+                 decay_patience=1, decay_start_epoch=1, min_learning_rate=0.,
+                 warmup_steps=0):
+        if decay_type not in [None, 'plateau', 'exponential']:
+            raise ValueError(
+                'decay_type is None or "plateau" or "exponential".')
+
+        self.learning_rate = learning_rate_init
+        self.decay_type = decay_type
+        self.decay_rate = decay_rate
+        self.decay_patience = decay_patience
+        self.decay_start_epoch = decay_start_epoch
+        self.min_learning_rate = min_learning_rate
+        self.warmup_steps = warmup_steps
+
+        self.error_best = float('inf')
+        self.num_bad_epoch = 0
+
+    def __call__(self, step):
+        """
+        Args:
+            step: int, the training step (0-origin)
+        Returns:
+            learning_rate: float, the learning rate of this step
+        """
+        if step < self.warmup_steps:
+            return self.learning_rate * (step + 1) / self.warmup_steps
+        return self.learning_rate
+
+    def update(self, epoch, error=None):
+        """Decay the learning rate at the end of an epoch.
+        Args:
+            epoch: int, the number of finished epochs
+            error: float, the error rate on the dev set at this epoch. If
+                None (not evaluated), the plateau is not checked
+        Returns:
+            learning_rate: float, the learning rate of the next epoch
+        """
+        is_decay = False
+        if self.decay_type == 'exponential':
+            is_decay = True
+        elif self.decay_type == 'plateau' and error is not None:
+            if error < self.error_best:
+                self.error_best = error
+                self.num_bad_epoch = 0
+            else:
+                self.num_bad_epoch += 1
+                is_decay = self.num_bad_epoch >= self.decay_patience
+
+        if is_decay and epoch >= self.decay_start_epoch:
+            self.learning_rate = max(self.learning_rate * self.decay_rate,
+                                     self.min_learning_rate)
+            self.num_bad_epoch = 0
+        return self.learning_rate
+
+    def state_dict(self):
+        return {'learning_rate': self.learning_rate,
+                'error_best': self.error_best,
+                'num_bad_epoch': self.num_bad_epoch}
+
+    def load_state_dict(self, state):
+        self.learning_rate = state['learning_rate']
+        self.error_best = state['error_best']
+        self.num_bad_epoch = state['num_bad_epoch']
+
+
+class EarlyStopping(object):
+    """Stop training when the dev error has not improved for a while.
+    Args:
+        patience: int, the number of epochs without improvement to stop
+            training. If None, training is never stopped early
+    """
+
+    def __init__(self, patience=None):
+        self.patience = patience
+        self.error_best = float('inf')
+        self.num_bad_epoch = 0
+
+    def update(self, error=None):
+        """
+        Args:
+            error: float, the error rate on the dev set at this epoch. If
+                None (not evaluated), the epoch is not counted
+        Returns:
+            If True, stop training
+        """
+        if self.patience is None or error is None:
+            return False
+
+        if error < self.error_best:
+            self.error_best = error
+            self.num_bad_epoch = 0
+        else:
+            self.num_bad_epoch += 1
+        return self.num_bad_epoch >= self.patience
+
+    def state_dict(self):
+        return {'error_best': self.error_best,
+                'num_bad_epoch': self.num_bad_epoch}
+
+    def load_state_dict(self, state):
+        self.error_best = state['error_best']
+        self.num_bad_epoch = state['num_bad_epoch']
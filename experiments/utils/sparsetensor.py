@@ -15,39 +15,48 @@ def list2sparsetensor(labels):
     Returns:
         labels_st: sparse tensor of labels, list of indices, values, dense_shape
     """
-    indices, values = [], []
-    for i_utt, each_label in enumerate(labels):
-        for i_l, l in enumerate(each_label):
-            indices.append([i_utt, i_l])
-            values.append(l)
-    dense_shape = [len(labels), np.asarray(indices).max(0)[1] + 1]
-    labels_st = [np.array(indices), np.array(values), np.array(dense_shape)]
+    lengths = np.array([len(each_label) for each_label in labels],
+                       dtype=np.int64)
+
+    # Row & column index of each label (built at once)
+    offsets = np.cumsum(lengths) - lengths
+    rows = np.repeat(np.arange(len(labels), dtype=np.int64), lengths)
+    cols = np.arange(lengths.sum(), dtype=np.int64) - \
+        np.repeat(offsets, lengths)
+    indices = np.column_stack((rows, cols))
+
+    # NOTE: empty labels are excluded so as not to change the data type
+    non_empty_labels = [each_label for each_label, length in zip(labels, lengths)
+                        if length > 0]
+    if len(non_empty_labels) > 0:
+        values = np.concatenate(non_empty_labels)
+    else:
+        values = np.zeros((0,), dtype=np.int64)
+
+    max_length = lengths.max() if len(lengths) > 0 else 0
+    dense_shape = np.array([len(labels), max_length], dtype=np.int64)
+    labels_st = [indices, values, dense_shape]
 
     return labels_st
 
 
 def sparsetensor2list(labels_st, batch_size):
-    """Convert labels from sparse tensor to list.
+    """Convert labels from sparse tensor to list. Utterances which have no
+       labels (ex. CTC models do not output any labels) become empty lists.
     Args:
         labels_st: sparse tensor of labels
+        batch_size: int, the size of mini-batch
     Returns:
         labels: list of labels
     """
-    indices = labels_st.indices
-    values = labels_st.values
-
-    labels = []
-    batch_boundary = np.where(indices[:, 1] == 0)[0]
-
-    # TODO: fix error occurred when ctc models do not output any labels
-    # print(batch_boundary)
-    # if len(batch_boundary) != batch_size:
-    #     batch_boundary = np.array(batch_boundary.tolist() + [max(batch_boundary) + 1])
-    # print(indices)
-
-    for i in range(batch_size - 1):
-        label_each_wav = values[batch_boundary[i]:batch_boundary[i + 1]]
-        labels.append(label_each_wav.tolist())
-    labels.append(values[batch_boundary[-1]:].tolist())
+    indices = np.asarray(labels_st.indices)
+    values = np.asarray(labels_st.values)
+
+    # Split values by the batch row index of each label
+    counts = np.bincount(indices[:, 0].astype(np.int64),
+                         minlength=batch_size)
+    ends = np.cumsum(counts).tolist()
+    values = values.tolist()
+    labels = [values[start:end] for start, end in zip([0] + ends[:-1], ends)]
 
     return labels
@@ -0,0 +1,117 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../')
+from utils.sampler import BucketSampler
+
+
+def draw_epoch(sampler, batch_size):
+    """Draw mini-batches up to the end of the current epoch."""
+    batches = []
+    is_new_epoch = False
+    while not is_new_epoch:
+        indices, is_new_epoch = sampler.next(batch_size)
+        batches.append(list(indices))
+    return batches
+
+
+class TestBucketSampler(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.frame_num_list = rng.randint(10, 500, size=1003)
+
+    def test_epoch(self):
+        data_num = len(self.frame_num_list)
+        for bucket_width in [None, 20]:
+            for batch_size in [1, 32, 64, 1003, 2000]:
+                sampler = BucketSampler(self.frame_num_list,
+                                        bucket_width=bucket_width, seed=1)
+                for epoch in range(2):
+                    batches = draw_epoch(sampler, batch_size)
+                    self.assertEqual(sampler.epoch, epoch + 1)
+
+                    # Each utterance must be used exactly once
+                    indices = np.concatenate(batches)
+                    self.assertEqual(len(indices), data_num)
+                    self.assertEqual(len(set(indices)), data_num)
+
+                    # Only the final batch can be smaller than batch_size
+                    self.assertEqual(len(batches),
+                                     int(np.ceil(data_num / batch_size)))
+                    for batch in batches[:-1]:
+                        self.assertEqual(len(batch), batch_size)
+
+    def test_seed(self):
+        for bucket_width in [None, 20]:
+            sampler1 = BucketSampler(self.frame_num_list,
+                                     bucket_width=bucket_width, seed=1)
+            sampler2 = BucketSampler(self.frame_num_list,
+                                     bucket_width=bucket_width, seed=1)
+            sampler3 = BucketSampler(self.frame_num_list,
+                                     bucket_width=bucket_width, seed=2)
+            for _ in range(2):
+                batches1 = draw_epoch(sampler1, 64)
+                self.assertEqual(batches1, draw_epoch(sampler2, 64))
+                self.assertNotEqual(batches1, draw_epoch(sampler3, 64))
+
+    def test_resume(self):
+        batch_size = 64
+        for bucket_width in [None, 20]:
+            sampler = BucketSampler(self.frame_num_list,
+                                    bucket_width=bucket_width, seed=1)
+            draw_epoch(sampler, batch_size)
+
+            # Between epochs (the next epoch is not planned yet)
+            state_boundary = sampler.state_dict()
+            batches = draw_epoch(sampler, batch_size)
+            batches += draw_epoch(sampler, batch_size)
+
+            # In the middle of an epoch (that of the beginning of the epoch)
+            sampler = BucketSampler(self.frame_num_list,
+                                    bucket_width=bucket_width, seed=1)
+            draw_epoch(sampler, batch_size)
+            for _ in range(3):
+                sampler.next(batch_size)
+            state_middle = sampler.state_dict()
+            self.assertEqual(state_middle['epoch'], 1)
+
+            for state in [state_boundary, state_middle]:
+                sampler_resumed = BucketSampler(self.frame_num_list,
+                                                bucket_width=bucket_width,
+                                                seed=2)
+                sampler_resumed.load_state_dict(state)
+                self.assertEqual(sampler_resumed.epoch, 1)
+                batches_resumed = draw_epoch(sampler_resumed, batch_size)
+                batches_resumed += draw_epoch(sampler_resumed, batch_size)
+                self.assertEqual(batches_resumed, batches)
+
+    def test_state_of_finished_epoch(self):
+        sampler = BucketSampler(self.frame_num_list, bucket_width=20, seed=1)
+        draw_epoch(sampler, 64)
+        # A prefetcher can start the next epoch before the checkpoint of the
+        # finished one
+        first_batch = list(sampler.next(64)[0])
+        batches = [first_batch] + draw_epoch(sampler, 64)
+
+        sampler_resumed = BucketSampler(self.frame_num_list,
+                                        bucket_width=20, seed=2)
+        sampler_resumed.load_state_dict(sampler.state_dict(epoch=1))
+        self.assertEqual(draw_epoch(sampler_resumed, 64), batches)
+
+        # States of old epochs are not kept
+        draw_epoch(sampler, 64)
+        with self.assertRaises(ValueError):
+            sampler.state_dict(epoch=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
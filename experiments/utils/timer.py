@@ -0,0 +1,142 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Measure where the time of training steps goes."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import join, isfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+import tensorflow as tf
+
+
+class StepTimer(object):
+    """Accumulate time spent in each phase of training steps, and report
+       seconds per step of each phase and the throughput over the steps since
+       the last report. Each report is appended to `timing.csv`.
+       Phases:
+           data_wait: the training thread waits for the next mini-batch.
+               If mini-batches are not prefetched, this includes feed
+           feed: making feed dictionaries (in the background if prefetched)
+           compute: `sess.run` of training operations
+           summary: monitoring on dev data and writing summaries
+           checkpoint: taking a snapshot of variables for a checkpoint
+       `total` is wall time per step, which also includes evaluation.
+    Args:
+        save_path: path to the directory to save timing.csv. If None, reports
+            are not saved
+        phases: list of names of phases
+    """
+
+    def __init__(self, save_path=None,
+                 phases=('data_wait', 'feed', 'compute', 'summary',
+                         'checkpoint')):
+        self.phases = list(phases)
+        self.csv_path = None
+        if save_path is not None:
+            self.csv_path = join(save_path, 'timing.csv')
+        self._reset()
+
+    def _reset(self):
+        self.durations = OrderedDict((phase, 0.) for phase in self.phases)
+        self.num_step = 0
+        self.num_utt = 0
+        self.num_frame = 0
+        self._start_time = time.time()
+
+    @contextmanager
+    def measure(self, phase):
+        """Measure the time of the block as the phase.
+           Usage:
+               with step_timer.measure('compute'):
+                   sess.run(train_op, feed_dict=feed_dict_train)
+        Args:
+            phase: string, the name of phase
+        """
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.durations[phase] += time.time() - start_time
+
+    def add(self, phase, duration):
+        """
+        Args:
+            phase: string, the name of phase
+            duration: float, seconds
+        """
+        self.durations[phase] += duration
+
+    def count(self, inputs_seq_len):
+        """Count a training step.
+        Args:
+            inputs_seq_len: A tensor of size `[batch_size]`
+        """
+        # Labels are also in mini-batches, so check that not labels but
+        # the number of frames of each utterance are passed
+        if any(np.ndim(seq_len) != 0 for seq_len in inputs_seq_len):
+            raise ValueError(
+                'inputs_seq_len must be the number of frames of each '
+                'utterance, but a sequence is included.')
+        self.num_step += 1
+        self.num_utt += len(inputs_seq_len)
+        self.num_frame += int(np.sum(inputs_seq_len))
+
+    def report(self, step):
+        """Summarize the steps since the last report, and start a new one.
+        Args:
+            step: int, the training step (1-origin)
+        Returns:
+            timing: OrderedDict of `step`, seconds per step of each phase,
+                `total`, `frames_per_sec` and `utt_per_sec`
+        """
+        duration_total = time.time() - self._start_time
+        num_step = max(self.num_step, 1)
+
+        timing = OrderedDict([('step', step)])
+        for phase, duration in self.durations.items():
+            timing[phase] = duration / num_step
+        timing['total'] = duration_total / num_step
+        timing['frames_per_sec'] = self.num_frame / duration_total
+        timing['utt_per_sec'] = self.num_utt / duration_total
+
+        if self.csv_path is not None:
+            is_new = not isfile(self.csv_path)
+            with open(self.csv_path, 'a') as f:
+                if is_new:
+                    f.write(','.join(timing.keys()) + '\n')
+                f.write(','.join(str(value)
+                                 for value in timing.values()) + '\n')
+
+        self._reset()
+        return timing
+
+    def format(self, timing):
+        """
+        Args:
+            timing: OrderedDict returned by report
+        Returns:
+            string to print
+        """
+        return ('  Time/step: %s / total %.3f sec (%.1f frames/sec, '
+                '%.2f utt/sec)' %
+                (' / '.join('%s %.3f' % (phase, timing[phase])
+                            for phase in self.phases),
+                 timing['total'], timing['frames_per_sec'],
+                 timing['utt_per_sec']))
+
+    def summary(self, timing):
+        """
+        Args:
+            timing: OrderedDict returned by report
+        Returns:
+            summary: tf.Summary of scalars `timing/*` for TensorBoard
+        """
+        return tf.Summary(value=[
+            tf.Summary.Value(tag='timing/' + name, simple_value=value)
+            for name, value in timing.items() if name != 'step'])
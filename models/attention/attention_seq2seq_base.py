@@ -9,8 +9,10 @@ from __future__ import print_function
 
 from collections import namedtuple, OrderedDict
 import tensorflow as tf
-# from .decoders.decoder_util import transpose_batch_time, flatten_dict
-# from .decoders.beam_search_decoder_from_seq2seq import BeamSearchDecoder
+
+from models.data_parallel import tower_scopes, average_gradients, \
+    accumulate_gradients
+from .decoders.beam_search_decoder import BeamSearchDecoder
 
 
 OPTIMIZER_CLS_NAMES = {
@@ -85,17 +87,47 @@ class AttentionBase(object):
             with tf.variable_scope(self.name):
                 return self._build(inputs, labels, labels_seq_len)
 
-    def _generate_placeholer(self):
-        """Generate placeholders."""
-        # `[batch_size, max_time, input_size]`
-        self.inputs = tf.placeholder(tf.float32,
-                                     shape=[None, None, self.input_size],
-                                     name='input')
-
-        # `[batch_size, max_time]`
-        self.labels = tf.placeholder(tf.int32,
-                                     shape=[None, None],
-                                     name='label')
+    def _generate_placeholer(self, num_tower=1):
+        """Generate placeholders.
+        Args:
+            num_tower: int, the number of towers. Placeholders of inputs and
+                labels are generated for each tower, and `self.inputs` etc.
+                refer to those of the first tower
+        """
+        self.inputs_list, self.labels_list = [], []
+        self.inputs_seq_len_list, self.labels_seq_len_list = [], []
+        for i_tower in range(num_tower):
+            suffix = '' if num_tower == 1 else '_tower%d' % i_tower
+
+            # `[batch_size, max_time, input_size]`
+            self.inputs_list.append(tf.placeholder(
+                tf.float32,
+                shape=[None, None, self.input_size],
+                name='input' + suffix))
+
+            # `[batch_size, max_time]`
+            self.labels_list.append(tf.placeholder(
+                tf.int32,
+                shape=[None, None],
+                name='label' + suffix))
+
+            # The length of input features `[batch_size]`
+            self.inputs_seq_len_list.append(tf.placeholder(
+                tf.int32,
+                shape=[None],
+                name='inputs_seq_len' + suffix))
+            # NOTE: change to tf.int64 if you use the bidirectional model
+
+            # The length of target labels `[batch_size]`
+            self.labels_seq_len_list.append(tf.placeholder(
+                tf.int32,
+                shape=[None],
+                name='labels_seq_len' + suffix))
+
+        self.inputs = self.inputs_list[0]
+        self.labels = self.labels_list[0]
+        self.inputs_seq_len = self.inputs_seq_len_list[0]
+        self.labels_seq_len = self.labels_seq_len_list[0]
 
         # These are prepared for computing LER
         self.label_indices_true = tf.placeholder(tf.int64, name='indices')
@@ -111,18 +143,7 @@ class AttentionBase(object):
                                                   self.label_values_pred,
                                                   self.label_shape_pred)
 
-        # The length of input features
-        self.inputs_seq_len = tf.placeholder(tf.int32,
-                                             shape=[None],  # `[batch_size]`
-                                             name='inputs_seq_len')
-        # NOTE: change to tf.int64 if you use the bidirectional model
-
-        # The length of target labels
-        self.labels_seq_len = tf.placeholder(tf.int32,
-                                             shape=[None],  # `[batch_size]`
-                                             name='labels_seq_len')
-
-        # For dropout
+        # For dropout (shared by all towers)
         self.keep_prob_input = tf.placeholder(tf.float32,
                                               name='keep_prob_input')
         self.keep_prob_hidden = tf.placeholder(tf.float32,
@@ -150,50 +171,45 @@ class AttentionBase(object):
         """Create attention decoder."""
         NotImplementedError
 
-    def define(self):
+    def define(self, num_tower=1):
         """Define model graph."""
         NotImplementedError
 
-    def choose_top_k(scores_flat, config):
-        """Chooses the top-k beams as successors.
+    def choose_top_k(self, scores_flat, k):
+        """Chooses the top-k candidates as beam successors.
         Args:
-            scores:
-            config:
+            scores_flat: A tensor of size
+                `[batch_size, beam_width * num_classes]`
+            k: int, the number of candidates to choose
         Returns:
-            next_beam_scores:
-            word_indices:
+            next_beam_scores: A tensor of size `[batch_size, k]`
+            word_indices: A tensor of size `[batch_size, k]`
         """
-        next_beam_scores, word_indices = tf.nn.top_k(
-            scores_flat, k=config.beam_width)
+        next_beam_scores, word_indices = tf.nn.top_k(scores_flat, k=k)
         return next_beam_scores, word_indices
 
-    # def _beam_search_decoder_wrapper(self, decoder, beam_width=None,
-    #                                  length_penalty_weight=0.0):
-    #     """Wraps a decoder into a Beam Search decoder.
-    #     Args:
-    #         decoder: The decoder class instance
-    #         beam_width: Number of beams to use, an integer
-    #         length_penalty_weight: Weight for the length penalty factor. 0.0
-    #             disables the penalty.
-    #         choose_successors_fn: A function used to choose beam successors
-    #             based on their scores.
-    #             Maps from (scores, config) => (chosen scores, chosen_ids)
-    #     Returns:
-    #         A BeamSearchDecoder with the same interfaces as the decoder.
-    #     """
-    #     if beam_width is None:
-    #         # Greedy decoding
-    #         return decoder
-    #
-    #     config = BeamSearchConfig(
-    #         beam_width=beam_width,
-    #         vocab_size=self.num_classes,
-    #         eos_token=self.eos_index,
-    #         length_penalty_weight=length_penalty_weight,
-    #         choose_successors_fn=self.choose_top_k)
-    #
-    #     return BeamSearchDecoder(decoder=decoder,
-    #                              config=config)
+    def _beam_search_decoder_wrapper(self, decoder, beam_width=None,
+                                     length_penalty_weight=0.0):
+        """Wraps a decoder into a Beam Search decoder.
+        Args:
+            decoder: The decoder class instance
+            beam_width: Number of beams to use, an integer
+            length_penalty_weight: Weight for the length penalty factor. 0.0
+                disables the penalty.
+        Returns:
+            A BeamSearchDecoder wrapping the decoder, or the decoder itself
+            if beam_width is None or 0 (greedy decoding)
+        """
+        if not beam_width:
+            # Greedy decoding
+            return decoder
+
+        return BeamSearchDecoder(decoder=decoder,
+                                 beam_width=beam_width,
+                                 num_classes=self.num_classes,
+                                 eos_index=self.eos_index,
+                                 length_penalty_weight=length_penalty_weight,
+                                 choose_successors_fn=self.choose_top_k)
 
     @property
     def decode(self):
@@ -249,7 +265,7 @@ class AttentionBase(object):
         Returns:
             decoder_outputs: A tuple of `(AttentionDecoderOutput, final_state)`
         """
-        batch_size = tf.shape(self.inputs)[0]
+        batch_size = tf.shape(encoder_outputs.outputs)[0]
         # if self.use_beam_search:
         #     batch_size = self.beam_width
         # TODO: why?
@@ -278,41 +294,82 @@ class AttentionBase(object):
 
         return (decoder_outputs, final_state)
 
+    def _decode_beam_search(self, decoder, bridge, beam_width,
+                            length_penalty_weight=0.0):
+        """Runs beam search decoding in inference mode.
+        Args:
+            decoder: An instance of the decoder class
+            bridge:
+            beam_width: int, the number of hypotheses to keep
+            length_penalty_weight: float, the weight of the length
+                normalization
+        Returns:
+            decoder_outputs: An instance of `BeamSearchDecoderOutput`
+        """
+        decoder = self._beam_search_decoder_wrapper(
+            decoder, beam_width=beam_width,
+            length_penalty_weight=length_penalty_weight)
+        target_embedding = self._generate_target_embedding(reuse=True)
+        decoder_initial_state = bridge(reuse=True)
+        return decoder(initial_state=decoder_initial_state,
+                       embedding=target_embedding,
+                       sos_index=self.sos_index)
+
     def compute_loss(self):
         """Operation for computing cross entropy sequence loss.
         Returns:
             loss: operation for computing cross entropy sequence loss.
-                  This is a single scalar tensor to minimize.
+                  This is a single scalar tensor to minimize. In
+                  data-parallel training, this is the loss of the first
+                  tower and losses of all towers are kept in
+                  `self.tower_losses`.
+        """
+        self.tower_losses = []
+        for i_tower, _ in tower_scopes(len(self.inputs_list)):
+            self.tower_losses.append(self._compute_loss(
+                self.decoder_outputs_train_list[i_tower].logits,
+                self.labels_list[i_tower],
+                self.labels_seq_len_list[i_tower]))
+        self.loss = self.tower_losses[0]
+
+        # Add a scalar summary for the snapshot of loss
+        self.summaries_train.append(
+            tf.summary.scalar('loss_train', self.loss))
+        self.summaries_dev.append(
+            tf.summary.scalar('loss_dev', self.loss))
+
+        return self.loss
+
+    def _compute_loss(self, logits, labels, labels_seq_len):
+        """Operation for computing cross entropy sequence loss of a tower.
+        Args:
+            logits: A tensor of size `[batch_size, max_time, num_classes]`
+            labels: Target labels of size `[batch_size, max_time]`
+            labels_seq_len: The length of target labels
+        Returns:
+            loss: operation for computing cross entropy sequence loss
         """
         # Calculate loss per example
-        logits = self.decoder_outputs_train.logits
-        max_time = tf.shape(self.labels[:, 1:])[1]
-        loss_mask = tf.sequence_mask(tf.to_int32(self.labels_seq_len - 1),
+        max_time = tf.shape(labels[:, 1:])[1]
+        loss_mask = tf.sequence_mask(tf.to_int32(labels_seq_len - 1),
                                      maxlen=max_time,
                                      dtype=tf.float32)
         losses = tf.contrib.seq2seq.sequence_loss(
             logits=logits,
-            targets=self.labels[:, 1:],
+            targets=labels[:, 1:],
             weights=loss_mask,
             average_across_timesteps=True,
             average_across_batch=False,
             softmax_loss_function=None)
 
         # Calculate the average log perplexity
-        # self.loss = tf.reduce_sum(losses) / tf.to_float(
-        #     tf.reduce_sum(self.labels_seq_len - 1))
-        self.loss = tf.reduce_sum(losses)
-
-        # Add a scalar summary for the snapshot of loss
-        self.summaries_train.append(
-            tf.summary.scalar('loss_train', self.loss))
-        self.summaries_dev.append(
-            tf.summary.scalar('loss_dev', self.loss))
-
-        return self.loss
+        # loss = tf.reduce_sum(losses) / tf.to_float(
+        #     tf.reduce_sum(labels_seq_len - 1))
+        return tf.reduce_sum(losses)
 
     def train(self, optimizer, learning_rate_init=None,
-              clip_gradients_by_norm=None, is_scheduled=False):
+              clip_gradients_by_norm=None, is_scheduled=False,
+              num_accumulate=1):
         """Operation for training.
         Args:
             optimizer: string, name of the optimizer in OPTIMIZER_CLS_NAMES
@@ -320,6 +377,10 @@ class AttentionBase(object):
             clip_gradients_by_norm: if True, clip gradients by norm of the
                 value of self.clip_grad
             is_scheduled: if True, schedule learning rate at each epoch
+            num_accumulate: int, the number of micro-batches to accumulate
+                gradients over before one update. If larger than 1, run
+                `self.accumulate_op` for each micro-batch except the last
+                one, and train_op for the last one
         Returns:
             train_op: operation for training
         """
@@ -351,37 +412,54 @@ class AttentionBase(object):
         # Create a variable to track the global step
         global_step = tf.Variable(0, name='global_step', trainable=False)
 
+        # Compute gradients (averaged over towers)
+        trainable_vars = tf.trainable_variables()
+        grads = average_gradients(
+            [tf.gradients(loss, trainable_vars,
+                          colocate_gradients_with_ops=True)
+             for loss in self.tower_losses])
+        # TODO: Optionally add gradient noise
+
+        # Remove variables without gradients (keep pairs aligned)
+        grads_and_vars = [(g, v) for g, v in zip(grads, trainable_vars)
+                          if g is not None]
+        grads = [g for g, _ in grads_and_vars]
+        trainable_vars = [v for _, v in grads_and_vars]
+
+        self.accumulate_op = None
+        if num_accumulate > 1:
+            # Gradient accumulation (clipping is applied to the accumulated
+            # gradients)
+            self.accumulate_op, grads, reset_op_fn = accumulate_gradients(
+                grads, trainable_vars, num_accumulate)
+
         # Gradient clipping
         if self.clip_grad is not None:
-            # Compute gradients
-            trainable_vars = tf.trainable_variables()
-            grads = tf.gradients(self.loss, trainable_vars)
-            # TODO: Optionally add gradient noise
-
             if clip_gradients_by_norm:
                 # Clip by norm
-                self.clipped_grads = [tf.clip_by_norm(
+                grads = [tf.clip_by_norm(
                     g,
-                    clip_norm=self.clip_grad) for g in grads if g is not None]
+                    clip_norm=self.clip_grad) for g in grads]
             else:
                 # Clip by absolute values
-                self.clipped_grads = [tf.clip_by_value(
+                grads = [tf.clip_by_value(
                     g,
                     clip_value_min=-self.clip_grad,
-                    clip_value_max=self.clip_grad) for g in grads if g is not None]
+                    clip_value_max=self.clip_grad) for g in grads]
+            self.clipped_grads = grads
 
             # TODO: Add histograms for variables, gradients (norms)
-            # TODO: なんでNoneが発生した？
 
-            # Create gradient updates
-            train_op = self.optimizer.apply_gradients(
-                zip(self.clipped_grads, trainable_vars),
-                global_step=global_step,
-                name='train')
+        # Apply the gradients and also increment the global step counter as
+        # a single training step
+        train_op = self.optimizer.apply_gradients(
+            zip(grads, trainable_vars),
+            global_step=global_step,
+            name='train')
 
-        # Use the optimizer to apply the gradients that minimize the loss
-        # and also increment the global step counter as a single training step
-        train_op = self.optimizer.minimize(self.loss, global_step=global_step)
+        if num_accumulate > 1:
+            # Zero the accumulators after the update
+            train_op = reset_op_fn([train_op])
 
         return train_op
 
@@ -389,26 +467,40 @@ class AttentionBase(object):
         """Adds scaled noise from a 0-mean normal distribution to gradients."""
         raise NotImplementedError
 
-    def decoder(self, decode_type, beam_width=None):
+    def decoder(self, decode_type, beam_width=None,
+                length_penalty_weight=0.0):
         """Operation for decoding.
         Args:
             decode_type: greedy or beam_search
             beam_width: beam width for beam search
+            length_penalty_weight: float, the weight of the length
+                normalization in beam search. 0 disables it
         Return:
             decoded_train: operation for decoding in training
-            decoded_infer: operation for decoding in inference
+            decoded_infer: operation for decoding in inference. In beam
+                search, the best hypotheses of size `[batch_size, max_time]`
+                and n-best lists are in `self.decoder_outputs_beam_search`
         """
         if decode_type not in ['greedy', 'beam_search']:
             raise ValueError('decode_type is "greedy" or "beam_search".')
 
+        decoded_train = self.decoder_outputs_train.predicted_ids
+
         if decode_type == 'greedy':
-            decoded_train = self.decoder_outputs_train.predicted_ids
             decoded_infer = self.decoder_outputs_infer.predicted_ids
 
         elif decode_type == 'beam_search':
             if beam_width is None:
                 raise ValueError('Set beam_width.')
-            NotImplementedError
+
+            # Decode the first tower
+            self.decoder_outputs_beam_search = self._decode_beam_search(
+                decoder=self._create_decoder(self.encoder_outputs, None),
+                bridge=self.bridge,
+                beam_width=beam_width,
+                length_penalty_weight=length_penalty_weight)
+            decoded_infer = self.decoder_outputs_beam_search.predicted_ids[
+                :, 0, :]
 
         return decoded_train, decoded_infer
 
@@ -7,6 +7,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+from models.data_parallel import tower_scopes
 from .attention_seq2seq_base import AttentionBase
 from .encoders.load_encoder import load as load_encoder
 from .decoders.load_decoder import load as load_decoder
@@ -44,6 +45,10 @@ class BLSTMAttetion(AttentionBase):
         dropout_ratio_hidden: A float value. Dropout ratio in hidden-hidden
             layers
         weight_decay:
+        beam_width: if 0, use greedy decoding
+        attention_window: tuple of ints `(left, right)`. If set, attend only
+            frames in the window around the peak of the previous attention
+            weights (see AttentionLayer). If None, attend all frames
     """
 
     def __init__(self,
@@ -68,6 +73,7 @@ class BLSTMAttetion(AttentionBase):
                  dropout_ratio_hidden=1.0,
                  weight_decay=0.0,
                  beam_width=0,
+                 attention_window=None,
                  name='blstm_attention_seq2seq'):
 
         AttentionBase.__init__(self, batch_size, input_size,
@@ -97,6 +103,7 @@ class BLSTMAttetion(AttentionBase):
         self.attention_weights_tempareture = attention_weights_tempareture
         # NOTE: attention_weights_tempareture is good for narrow focus.
         # Assume that β = 1 / attention_weights_tempareture, β=2 is recommended.
+        self.attention_window = attention_window
 
     def _encode(self, inputs, inputs_seq_len):
         """Encode input features.
@@ -134,7 +141,8 @@ class BLSTMAttetion(AttentionBase):
         self.attention_layer = AttentionLayer(
             num_unit=self.attention_dim,
             attention_weights_tempareture=self.attention_weights_tempareture,
-            attention_type='bahdanau')
+            attention_type='bahdanau',
+            window=self.attention_window)
 
         # Define RNN decoder
         rnn_decoder = load_decoder(model_type='lstm_decoder')
@@ -155,43 +163,74 @@ class BLSTMAttetion(AttentionBase):
 
         return decoder
 
-    def define(self):
-        """Define model graph."""
-
+    def define(self, num_tower=1):
+        """Define model graph.
+        Args:
+            num_tower: int, the number of towers for data-parallel training
+                (see models/data_parallel.py). All towers share variables
+        """
         # Generate placeholders
-        self._generate_placeholer()
-
+        self._generate_placeholer(num_tower)
+
+        self.decoder_outputs_train_list = []
+        self.decoder_outputs_infer_list = []
+        self.encoder_outputs_list, self.bridge_list = [], []
+        for i_tower, _ in tower_scopes(num_tower):
+            decoder_outputs_train, decoder_outputs_infer = self._define_tower(
+                self.inputs_list[i_tower],
+                self.labels_list[i_tower],
+                self.inputs_seq_len_list[i_tower],
+                self.labels_seq_len_list[i_tower])
+            self.decoder_outputs_train_list.append(decoder_outputs_train)
+            self.decoder_outputs_infer_list.append(decoder_outputs_infer)
+
+        # Operations for monitoring and evaluation use the first tower
+        self.decoder_outputs_train = self.decoder_outputs_train_list[0]
+        self.decoder_outputs_infer = self.decoder_outputs_infer_list[0]
+        # NOTE: beam search is built on these in self.decoder()
+        self.encoder_outputs = self.encoder_outputs_list[0]
+        self.bridge = self.bridge_list[0]
+
+    def _define_tower(self, inputs, labels, inputs_seq_len, labels_seq_len):
+        """Define model graph of a tower.
+        Args:
+            inputs: A tensor of size `[batch_size, max_time, input_size]`
+            labels: Target labels of size `[batch_size, max_time]`
+            inputs_seq_len: A tensor of size `[batch_size]`
+            labels_seq_len: A tensor of size `[batch_size]`
+        Returns:
+            decoder_outputs_train: outputs of the decoder in training
+            decoder_outputs_infer: outputs of the decoder in inference
+        """
         # Encode input features
-        encoder_outputs = self._encode(self.inputs, self.inputs_seq_len)
+        encoder_outputs = self._encode(inputs, inputs_seq_len)
 
         # Define decoder (initialization)
-        decoder_train = self._create_decoder(encoder_outputs, self.labels)
-        decoder_infer = self._create_decoder(encoder_outputs, self.labels)
+        decoder_train = self._create_decoder(encoder_outputs, labels)
+        decoder_infer = self._create_decoder(encoder_outputs, labels)
         # NOTE: initial_state and helper will be substituted in
         # self._decode_train() or self._decode_infer()
 
-        # Wrap decoder
-        # decoder_train = self._beam_search_decoder_wrapper(decoder_train,
-        #                                                   beam_width=20)
-        # decoder_infer = self._beam_search_decoder_wrapper(decoder_infer,
-        #                                                   beam_width=20)
-
         # Connect between encoder and decoder
         bridge = InitialStateBridge(
             encoder_outputs=encoder_outputs,
             decoder_state_size=decoder_train.cell.state_size)
+        self.encoder_outputs_list.append(encoder_outputs)
+        self.bridge_list.append(bridge)
 
         # Call decoder (divide into training and inference)
         # Training
-        self.decoder_outputs_train, _ = self._decode_train(
+        decoder_outputs_train, _ = self._decode_train(
             decoder=decoder_train,
             bridge=bridge,
             encoder_outputs=encoder_outputs,
-            labels=self.labels,
-            labels_seq_len=self.labels_seq_len)
+            labels=labels,
+            labels_seq_len=labels_seq_len)
 
         # Inference
-        self.decoder_outputs_infer, _ = self._decode_infer(
+        decoder_outputs_infer, _ = self._decode_infer(
             decoder=decoder_infer,
             bridge=bridge,
             encoder_outputs=encoder_outputs)
+
+        return decoder_outputs_train, decoder_outputs_infer
@@ -79,6 +79,7 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         # Not initialized yet
         self.initial_state = None
         self.helper = None
+        self.att_encoder_states = None
 
     def __call__(self, *args, **kwargs):
         # TODO: variable_scope
@@ -187,10 +188,12 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
 
         return finished, first_inputs, self.initial_state
 
-    def compute_output(self, cell_output):
+    def compute_output(self, cell_output, attention_peak=None):
         """Computes the decoder outputs at each time.
         Args:
             cell_output: The previous state of the decoder
+            attention_peak: The frame of the peak of the previous attention
+                weights `[batch_size]` (only for windowed attention)
         Returns:
             softmax_input:
             logits:
@@ -199,10 +202,11 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         """
         # Compute attention weights & context
         attention_weights, attention_context = self.attention_layer(
-            encoder_states=self.attention_encoder_states,
+            att_encoder_states=self.att_encoder_states,
             current_decoder_state=cell_output,
             values=self.attention_values,
-            values_length=self.attention_values_length)
+            values_length=self.attention_values_length,
+            attention_peak=attention_peak)
 
         # TODO: Make this a parameter: We may or may not want this.
         # Transform attention context.
@@ -231,9 +235,69 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         return (self.softmax_input, logits,
                 attention_weights, attention_context)
 
+    def compute_step(self, inputs, state):
+        """Runs the cell and computes the decoder outputs at each time.
+        Args:
+            inputs: A tensor of size `[batch_size, input_size]`
+            state: The state of the cell, or a tuple of
+                `(cell_state, attention_peak)` (see attention_initial_state)
+        Returns:
+            softmax_input:
+            logits:
+            attention_weights:
+            attention_context:
+            next_state: The state of the next step
+        """
+        if self.attention_layer.window is None:
+            cell_state, attention_peak = state, None
+        else:
+            cell_state, attention_peak = state
+
+        # Call LSTMCell
+        cell_output_prev, cell_state_prev = self.cell(inputs, cell_state)
+        cell_output, logits, attention_weights, attention_context = \
+            self.compute_output(cell_output_prev, attention_peak)
+
+        if self.attention_layer.window is None:
+            next_state = cell_state_prev
+        else:
+            next_state = (cell_state_prev,
+                          tf.to_int32(tf.argmax(attention_weights, axis=1)))
+
+        return (cell_output, logits, attention_weights, attention_context,
+                next_state)
+
+    def attention_initial_state(self, cell_state):
+        """Returns the initial state of decoding. With windowed attention,
+           the peak of the previous attention weights is kept in the state,
+           starting from the first frame.
+        Args:
+            cell_state: The initial state of the cell
+        Returns:
+            cell_state, or a tuple of `(cell_state, attention_peak)`
+        """
+        if self.attention_layer.window is None:
+            return cell_state
+        batch_size = tf.shape(nest.flatten([cell_state])[0])[0]
+        return (cell_state, tf.zeros([batch_size], dtype=tf.int32))
+
+    def project_attention_keys(self, reuse):
+        """Transform the encoder outputs for attention (U_a * h_j) once
+           before decoding, instead of at every step. Variables are in the
+           same scope as those created in `step`.
+        Args:
+            reuse: if True, reuse the variables
+        """
+        with tf.variable_scope("decoder"):
+            with tf.variable_scope("step", reuse=reuse):
+                self.att_encoder_states = \
+                    self.attention_layer.project_encoder_states(
+                        self.attention_encoder_states)
+
     def _setup(self, initial_state, helper):
-        self.initial_state = initial_state
+        self.initial_state = self.attention_initial_state(initial_state)
         self.helper = helper
+        self.project_attention_keys(reuse=self.reuse)
 
         def att_next_inputs(time, outputs, state, sample_ids, name=None):
             """Wraps the original decoder helper function to append the
@@ -281,10 +345,8 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
                     complete, for each sequence in the batch.
         """
         with tf.variable_scope("step", reuse=self.reuse):
-            # Call LSTMCell
-            cell_output_prev, cell_state_prev = self.cell(inputs, state)
-            cell_output, logits, attention_weights, attention_context = \
-                self.compute_output(cell_output_prev)
+            (cell_output, logits, attention_weights, attention_context,
+             cell_state_prev) = self.compute_step(inputs, state)
 
             sample_ids = self.helper.sample(time=time,
                                             outputs=logits,
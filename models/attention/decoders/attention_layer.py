@@ -17,31 +17,63 @@ class AttentionLayer(object):
             "Neural machine translation by jointly learning to align and
             translate."
             arXiv preprint arXiv:1409.0473 (2014).
+       Optionally, only frames in a window around the peak of the previous
+       attention weights are scored (windowing in
+       https://arxiv.org/abs/1506.07503), so that the cost of a step is
+       O(window) instead of O(max_time).
     Args:
         num_unit: Number of units used in the attention layer
         attention_type: bahdanau or layer_dot
+        window: tuple of ints `(left, right)`, the number of frames before
+            and after the previous peak to attend. If None, attend all frames
     """
 
     def __init__(self, num_unit, attention_weights_tempareture,
-                 attention_type='bahdanau', name='attention_layer'):
+                 attention_type='bahdanau', window=None,
+                 name='attention_layer'):
         self.num_unit = num_unit
         self.attention_weights_tempareture = attention_weights_tempareture
         self.attention_type = attention_type
+        self.window = window
         self.name = name
 
     def __call__(self, *args, **kwargs):
         # TODO: variable_scope
-        return self._build(*args, **kwargs)
-
-    def _build(self, encoder_states, current_decoder_state, values,
-               values_length):
-        """Computes attention scores and outputs.
+        # NOTE: only a name scope to group ops (e.g. in profiles), so that
+        # names of variables do not change
+        with tf.name_scope(self.name):
+            return self._build(*args, **kwargs)
+
+    def project_encoder_states(self, encoder_states):
+        """Transform the encoder outputs into the keys of attention. They do
+           not depend on the decoder state, so compute them once for an
+           utterance and pass them to every step.
         Args:
             encoder_states: The outputs of the encoder and equivalent to
                 `values`. This is used to calculate attention scores.
                 A tensor of shape `[batch_size, max_time, encoder_num_units]`
                 where each element in the `time` dimension corresponds to the
                 decoder states for that value.
+        Returns:
+            att_encoder_states: A tensor of shape
+                `[batch_size, max_time, num_unit]`
+        """
+        with tf.name_scope(self.name):
+            # h_j (j: time index of input) => U_a * h_j
+            return tf.contrib.layers.fully_connected(
+                inputs=encoder_states,
+                num_outputs=self.num_unit,
+                activation_fn=None,
+                # reuse=True,
+                scope="att_encoder_states")
+
+    def _build(self, att_encoder_states, current_decoder_state, values,
+               values_length, attention_peak=None):
+        """Computes attention scores and outputs.
+        Args:
+            att_encoder_states: The encoder outputs transformed by
+                `project_encoder_states`. This is used to calculate attention
+                scores. A tensor of shape `[batch_size, max_time, num_unit]`
             current_decoder_state: The current state of the docoder.
                 This is used to calculate attention scores.
                 A tensor of shape `[batch_size, decoder_num_units]`
@@ -49,6 +81,9 @@ class AttentionLayer(object):
                 A tensor of shape `[batch_size, max_time, encoder_num_units]`.
             values_length: An int32 tensor of shape `[batch_size]` defining
                 the sequence length of the attention values.
+            attention_peak: An int32 tensor of shape `[batch_size]`, the
+                frame of the peak of the previous attention weights.
+                Required if self.window is set
         Returns:
             A tuple `(attention_weights, attention_context)`.
                 `attention_weights` is vector of length `time` where each
@@ -59,16 +94,9 @@ class AttentionLayer(object):
                     corresponding to the weighted inputs.
                     A tensor of shape `[batch_size, encoder_num_units]`.
         """
-        # Fully connected layers to transform both encoder_states and
-        # current_decoder_state into a tensor with `num_unit` units
-        # h_j (j: time index of input) => U_a * h_j
-        att_encoder_states = tf.contrib.layers.fully_connected(
-            inputs=encoder_states,
-            num_outputs=self.num_unit,
-            activation_fn=None,
-            # reuse=True,
-            scope="att_encoder_states")
-
+        # Fully connected layer to transform current_decoder_state into a
+        # tensor with `num_unit` units (encoder_states have been transformed
+        # in project_encoder_states)
         # s_{i-1} (i: time index of output) => W_a * s_{i-1}
         att_decoder_state = tf.contrib.layers.fully_connected(
             inputs=current_decoder_state,
@@ -80,6 +108,15 @@ class AttentionLayer(object):
         # decoder_num_units
         # NOTE: エンコーダがBidirectionalのときユニット数を2倍にすることに注意??
 
+        max_time = tf.shape(values)[1]
+        if self.window is not None:
+            # Attend only frames in the window
+            window_indices = self._window_indices(
+                attention_peak, tf.to_int32(values_length), max_time)
+            att_encoder_states = _gather_frames(att_encoder_states,
+                                                window_indices)
+            values = _gather_frames(values, window_indices)
+
         # Compute attention scores over encoder outputs (energy: e_ij)
         # v_a = f(U_a * h_j, W_a * s_{i-1})
         scores = self.attention_score_func(att_encoder_states,
@@ -87,10 +124,15 @@ class AttentionLayer(object):
 
         # Replace all scores for padded inputs with tf.float32.min
         num_scores = tf.shape(scores)[1]  # input length
-        scores_mask = tf.sequence_mask(
-            lengths=tf.to_int32(values_length),
-            maxlen=tf.to_int32(num_scores),
-            dtype=tf.float32)
+        if self.window is not None:
+            scores_mask = tf.to_float(tf.less(
+                window_indices,
+                tf.expand_dims(tf.to_int32(values_length), axis=1)))
+        else:
+            scores_mask = tf.sequence_mask(
+                lengths=tf.to_int32(values_length),
+                maxlen=tf.to_int32(num_scores),
+                dtype=tf.float32)
         # ex.)
         # tf.sequence_mask([1, 3, 2], 5) = [[True, False, False, False, False],
         #                                   [True, True, True, False, False],
@@ -117,8 +159,33 @@ class AttentionLayer(object):
         # `[batch_size, encoder_num_units]`
         attention_context.set_shape([None, values_depth])
 
+        if self.window is not None:
+            # Put the weights back to all frames `[batch_size, max_time]`
+            batch_size = tf.shape(window_indices)[0]
+            attention_weights = tf.scatter_nd(
+                _batch_indices(window_indices), attention_weights,
+                tf.stack([batch_size, max_time]))
+
         return (attention_weights, attention_context)
 
+    def _window_indices(self, attention_peak, values_length, max_time):
+        """Frame indices of the window of each utterance. The window is
+           shifted so as to be in the utterance as far as possible.
+        Args:
+            attention_peak: An int32 tensor of shape `[batch_size]`
+            values_length: An int32 tensor of shape `[batch_size]`
+            max_time: An int32 scalar tensor
+        Returns:
+            window_indices: An int32 tensor of shape
+                `[batch_size, window_size]`
+        """
+        window_left, window_right = self.window
+        window_size = tf.minimum(window_left + window_right + 1, max_time)
+        start = tf.maximum(tf.minimum(attention_peak - window_left,
+                                      values_length - window_size), 0)
+        return tf.expand_dims(start, axis=1) + \
+            tf.expand_dims(tf.range(window_size), axis=0)
+
     def attention_score_func(self, encoder_states, current_decoder_state):
         """An attention layer that calculates attention scores.
         Args:
@@ -160,3 +227,24 @@ class AttentionLayer(object):
             raise ValueError('attention_type is "bahdanau" or "layer_dot".')
 
         return attention_sum
+
+
+def _batch_indices(indices):
+    """Pair indices `[batch_size, k]` with their batch index, for gather_nd
+       and scatter_nd. Returns a tensor of shape `[batch_size, k, 2]`."""
+    batch_size, k = tf.shape(indices)[0], tf.shape(indices)[1]
+    batch_pos = tf.tile(tf.expand_dims(tf.range(batch_size), axis=1), [1, k])
+    return tf.stack([batch_pos, indices], axis=2)
+
+
+def _gather_frames(tensor, indices):
+    """Gather frames of each utterance.
+    Args:
+        tensor: A tensor of shape `[batch_size, max_time, depth]`
+        indices: An int32 tensor of shape `[batch_size, k]`
+    Returns:
+        A tensor of shape `[batch_size, k, depth]`
+    """
+    frames = tf.gather_nd(tensor, _batch_indices(indices))
+    frames.set_shape([None, None, tensor.get_shape()[-1]])
+    return frames
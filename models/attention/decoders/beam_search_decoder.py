@@ -0,0 +1,304 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Batched beam search decoder for the attention decoder."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import namedtuple
+import tensorflow as tf
+from tensorflow.python.util import nest
+
+# Large enough to exclude hypotheses, small enough not to overflow
+INF = 1e7
+
+
+class BeamSearchDecoderOutput(namedtuple(
+        "BeamSearchDecoderOutput",
+        [
+            "predicted_ids",
+            "scores",
+            "lengths"
+        ])):
+    """
+    Args:
+        predicted_ids: A tensor of size `[batch_size, beam_width, max_time]`.
+            Hypotheses of each utterance from the best, padded with eos
+        scores: A tensor of size `[batch_size, beam_width]`, the (length
+            normalized) log probabilities of the hypotheses. If fewer than
+            beam_width hypotheses end by max_decode_length, the rest of the
+            list is filled with unfinished ones scored around -INF
+        lengths: A tensor of size `[batch_size, beam_width]`, the number of
+            labels of the hypotheses including eos
+    """
+    pass
+
+
+def choose_top_k(scores_flat, k):
+    """Chooses the top-k candidates as successors.
+    Args:
+        scores_flat: A tensor of size `[batch_size, beam_width * num_classes]`
+        k: int, the number of candidates to choose
+    Returns:
+        scores: A tensor of size `[batch_size, k]`
+        indices: A tensor of size `[batch_size, k]`, indices in scores_flat
+    """
+    return tf.nn.top_k(scores_flat, k=k)
+
+
+def tile_beam(tensor, beam_width):
+    """Tile each utterance of a mini-batch beam_width times.
+    Args:
+        tensor: A tensor of size `[batch_size, ...]`
+        beam_width: int, the number of hypotheses for each utterance
+    Returns:
+        A tensor of size `[batch_size * beam_width, ...]`, where the copies
+        of an utterance are adjacent
+    """
+    static_shape = tensor.get_shape()
+    multiples = [1, beam_width] + [1] * (static_shape.ndims - 1)
+    tiled = tf.tile(tf.expand_dims(tensor, axis=1), multiples)
+    tiled = tf.reshape(tiled, tf.concat([[-1], tf.shape(tensor)[1:]], axis=0))
+    tiled.set_shape(tf.TensorShape([None]).concatenate(static_shape[1:]))
+    return tiled
+
+
+def _gather_beams(tensor, indices):
+    """Gather hypotheses in each utterance.
+    Args:
+        tensor: A tensor of size `[batch_size, num_hyp, ...]`
+        indices: A tensor of size `[batch_size, k]`, indices in num_hyp
+    Returns:
+        A tensor of size `[batch_size, k, ...]`
+    """
+    batch_size, k = tf.shape(indices)[0], tf.shape(indices)[1]
+    batch_pos = tf.tile(tf.expand_dims(tf.range(batch_size), axis=1), [1, k])
+    return tf.gather_nd(tensor, tf.stack([batch_pos, indices], axis=2))
+
+
+def _gather_flat(tensor, indices, beam_width):
+    """Gather hypotheses of flattened tensors.
+    Args:
+        tensor: A tensor of size `[batch_size * beam_width, ...]`
+        indices: A tensor of size `[batch_size, beam_width]`, indices of
+            beams in each utterance
+        beam_width: int
+    Returns:
+        A tensor of size `[batch_size * beam_width, ...]`
+    """
+    offsets = tf.expand_dims(tf.range(tf.shape(indices)[0]) * beam_width,
+                             axis=1)
+    return tf.gather(tensor, tf.reshape(indices + offsets, [-1]))
+
+
+class BeamSearchDecoder(object):
+    """Beam search over the attention decoder. All utterances in a mini-batch
+       are decoded at once: the encoder outputs are tiled once for each beam,
+       and the decoder runs on `batch_size * beam_width` hypotheses at each
+       step. Hypotheses which emit eos leave the beam and are kept in the
+       n-best list, and decoding stops when no hypothesis in the beam can
+       beat the n-best list any longer, or at max_decode_length.
+       Hypotheses are ranked by log p(y|x) / lp(y), where
+           lp(y) = ((5 + |y|) / 6) ^ length_penalty_weight
+       is the length normalization in https://arxiv.org/abs/1609.08144.
+    Args:
+        decoder: An instance of `AttentionDecoder`. Its attention tensors are
+            replaced by the tiled ones
+        beam_width: int, the number of hypotheses to keep
+        num_classes: int, the number of output classes
+        eos_index: index of the end of sentence tag (<EOS>)
+        length_penalty_weight: float, the weight of the length
+            normalization. 0 disables it
+        choose_successors_fn: A function which maps
+            `(scores_flat, k)` => `(scores, indices)` of chosen candidates.
+            By default, choose_top_k
+    """
+
+    def __init__(self,
+                 decoder,
+                 beam_width,
+                 num_classes,
+                 eos_index,
+                 length_penalty_weight=0.0,
+                 choose_successors_fn=None,
+                 name='beam_search_decoder'):
+        self.decoder = decoder
+        self.beam_width = beam_width
+        self.num_classes = num_classes
+        self.eos_index = eos_index
+        self.length_penalty_weight = length_penalty_weight
+        self.choose_successors_fn = choose_top_k \
+            if choose_successors_fn is None else choose_successors_fn
+        self.name = name
+
+        # Transform and tile the encoder outputs once for all steps
+        decoder.project_attention_keys(reuse=True)
+        decoder.att_encoder_states = tile_beam(
+            decoder.att_encoder_states, beam_width)
+        decoder.attention_values = tile_beam(
+            decoder.attention_values, beam_width)
+        decoder.attention_values_length = tile_beam(
+            decoder.attention_values_length, beam_width)
+
+    @property
+    def cell(self):
+        return self.decoder.cell
+
+    def __call__(self, *args, **kwargs):
+        with tf.name_scope(self.name):
+            return self._build(*args, **kwargs)
+
+    def _length_penalty(self, length):
+        return tf.pow((5. + tf.to_float(length)) / 6.,
+                      self.length_penalty_weight)
+
+    def _build(self, initial_state, embedding, sos_index):
+        """
+        Args:
+            initial_state: A tensor or tuple of tensors of size
+                `[batch_size, ...]`, the initial state of the decoder cell
+            embedding: A tensor of size `[num_classes, embedding_dim]`, the
+                embedding of target labels
+            sos_index: index of the start of sentence tag (<SOS>)
+        Returns:
+            An instance of BeamSearchDecoderOutput
+        """
+        beam_width = self.beam_width
+        max_decode_length = self.decoder.max_decode_length
+        batch_size = tf.shape(nest.flatten([initial_state])[0])[0]
+
+        # The first inputs are <SOS> and the empty attention context
+        state = nest.map_structure(
+            lambda x: tile_beam(x, beam_width),
+            self.decoder.attention_initial_state(initial_state))
+        encoder_num_unit = self.decoder.attention_values.get_shape(
+        ).as_list()[-1]
+        inputs = tf.concat(
+            [tf.nn.embedding_lookup(
+                embedding, tf.fill([batch_size * beam_width], sos_index)),
+             tf.zeros([batch_size * beam_width, encoder_num_unit])], axis=1)
+
+        # Only the first beam is alive at first, so that the beam is not
+        # filled with copies of the same hypothesis
+        alive_seq = tf.zeros([batch_size, beam_width, 0], dtype=tf.int32)
+        alive_log_probs = tf.tile(
+            [[0.] + [-INF] * (beam_width - 1)], [batch_size, 1])
+        finished_seq = alive_seq
+        finished_scores = tf.fill([batch_size, beam_width], -INF)
+        finished_flags = tf.zeros([batch_size, beam_width], dtype=tf.bool)
+
+        def condition(time, inputs, state, alive_seq, alive_log_probs,
+                      finished_seq, finished_scores, finished_flags):
+            # Log probabilities only decrease, so the best alive hypothesis
+            # can not get a better score than this
+            best_alive_score = alive_log_probs[:, 0] / self._length_penalty(
+                max_decode_length)
+            is_done = tf.reduce_all(
+                finished_scores[:, -1] > best_alive_score)
+            return tf.logical_and(time < max_decode_length,
+                                  tf.logical_not(is_done))
+
+        def body(time, inputs, state, alive_seq, alive_log_probs,
+                 finished_seq, finished_scores, finished_flags):
+            with tf.variable_scope("step", reuse=True):
+                _, logits, _, attention_context, cell_state = \
+                    self.decoder.compute_step(inputs, state)
+
+            # Extend each alive hypothesis by each class
+            log_probs = tf.reshape(
+                tf.nn.log_softmax(logits),
+                [batch_size, beam_width, self.num_classes])
+            log_probs += tf.expand_dims(alive_log_probs, axis=2)
+            log_probs_flat = tf.reshape(
+                log_probs, [batch_size, beam_width * self.num_classes])
+
+            # Choose 2 * beam_width candidates, so that beam_width
+            # candidates are left alive even if the others emit eos
+            topk_log_probs, topk_indices = self.choose_successors_fn(
+                log_probs_flat, 2 * beam_width)
+            topk_beam_indices = topk_indices // self.num_classes
+            topk_ids = topk_indices % self.num_classes
+            topk_seq = tf.concat(
+                [_gather_beams(alive_seq, topk_beam_indices),
+                 tf.expand_dims(topk_ids, axis=2)], axis=2)
+            # Candidates extended from dead beams (at the first step, or
+            # with fewer classes than 2 * beam_width) are not finished
+            # hypotheses even if they end with eos
+            topk_finished = tf.logical_and(
+                tf.equal(topk_ids, self.eos_index),
+                topk_log_probs > -INF / 2)
+
+            # Keep beam_width hypotheses which do not end with eos. Those
+            # ending with eos are ranked even below candidates from dead
+            # beams, so that they are never extended
+            _, alive_indices = tf.nn.top_k(
+                topk_log_probs + tf.to_float(
+                    tf.equal(topk_ids, self.eos_index)) * -2 * INF,
+                k=beam_width)
+            alive_seq = _gather_beams(topk_seq, alive_indices)
+            alive_log_probs = _gather_beams(topk_log_probs, alive_indices)
+            parent_indices = _gather_beams(topk_beam_indices, alive_indices)
+            state = nest.map_structure(
+                lambda x: _gather_flat(x, parent_indices, beam_width),
+                cell_state)
+            next_inputs = tf.concat(
+                [tf.nn.embedding_lookup(embedding,
+                                        tf.reshape(alive_seq[:, :, -1], [-1])),
+                 _gather_flat(attention_context, parent_indices,
+                              beam_width)], axis=1)
+
+            # Merge hypotheses which end with eos into the n-best list
+            finished_seq = tf.concat(
+                [finished_seq,
+                 tf.fill([batch_size, beam_width, 1], self.eos_index)],
+                axis=2)
+            topk_scores = topk_log_probs / self._length_penalty(time + 1) + \
+                tf.to_float(tf.logical_not(topk_finished)) * -INF
+            finished_scores, finished_indices = tf.nn.top_k(
+                tf.concat([finished_scores, topk_scores], axis=1),
+                k=beam_width)
+            finished_seq = _gather_beams(
+                tf.concat([finished_seq, topk_seq], axis=1), finished_indices)
+            finished_flags = _gather_beams(
+                tf.concat([finished_flags, topk_finished], axis=1),
+                finished_indices)
+
+            return (time + 1, next_inputs, state, alive_seq, alive_log_probs,
+                    finished_seq, finished_scores, finished_flags)
+
+        seq_shape = tf.TensorShape([None, beam_width, None])
+        with tf.variable_scope("decoder"):
+            (time, _, _, alive_seq, alive_log_probs, finished_seq,
+             finished_scores, finished_flags) = tf.while_loop(
+                condition,
+                body,
+                loop_vars=[tf.constant(0), inputs, state, alive_seq,
+                           alive_log_probs, finished_seq, finished_scores,
+                           finished_flags],
+                shape_invariants=[
+                    tf.TensorShape([]), inputs.get_shape(),
+                    nest.map_structure(lambda x: x.get_shape(), state),
+                    seq_shape, alive_log_probs.get_shape(), seq_shape,
+                    finished_scores.get_shape(),
+                    finished_flags.get_shape()])
+
+        # Utterances without any finished hypotheses (at max_decode_length)
+        # return alive ones
+        has_finished = tf.reduce_any(finished_flags, axis=1)
+        predicted_ids = tf.where(has_finished, finished_seq, alive_seq)
+        scores = tf.where(has_finished, finished_scores,
+                          alive_log_probs / self._length_penalty(time))
+
+        # The number of labels up to the first eos
+        is_before_eos = tf.equal(
+            tf.cumsum(tf.to_int32(tf.equal(predicted_ids, self.eos_index)),
+                      axis=2), 0)
+        lengths = tf.minimum(
+            tf.reduce_sum(tf.to_int32(is_before_eos), axis=2) + 1,
+            tf.shape(predicted_ids)[2])
+
+        return BeamSearchDecoderOutput(predicted_ids=predicted_ids,
+                                       scores=scores,
+                                       lengths=lengths)
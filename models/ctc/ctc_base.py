@@ -9,6 +9,8 @@ from __future__ import print_function
 
 import tensorflow as tf
 
+from models.data_parallel import average_gradients, accumulate_gradients
+
 
 OPTIMIZER_CLS_NAMES = {
     "adagrad": tf.train.AdagradOptimizer,
@@ -74,8 +76,21 @@ class ctcBase(object):
         self.summaries_train = []
         self.summaries_dev = []
 
+        # Placeholders for dropout (shared by all towers)
+        self.keep_prob_input = None
+        self.keep_prob_hidden = None
+
         self.name = name
 
+    def _generate_dropout_placeholders(self):
+        """Generate placeholders for dropout only at the first call, so that
+           all towers are fed the same keep probabilities."""
+        if self.keep_prob_input is None:
+            self.keep_prob_input = tf.placeholder(tf.float32,
+                                                  name='keep_prob_input')
+            self.keep_prob_hidden = tf.placeholder(tf.float32,
+                                                   name='keep_prob_hidden')
+
     def _add_gaussian_noise_to_inputs(self, inputs, stddev=0.075):
         """Add gaussian noise to the inputs.
         Args:
@@ -103,7 +118,9 @@ class ctcBase(object):
             inputs: A tensor of size `[batch_size, max_time, input_size]`
             labels: A SparseTensor of target labels
             inputs_seq_len: A tensor of size `[batch_size]`
-            num_gpu: the number of GPUs
+            num_gpu: the number of towers (see models/data_parallel.py)
+            scope: the name scope of the tower. Only losses in this scope
+                are summed up
         Returns:
             loss: operation for computing ctc loss
             logits:
@@ -127,10 +144,11 @@ class ctcBase(object):
             tf.add_to_collection('losses', ctc_loss_mean)
 
         # Compute total loss
-        loss = tf.add_n(tf.get_collection('losses'), name='total_loss')
+        loss = tf.add_n(tf.get_collection('losses', scope), name='total_loss')
 
-        if num_gpu == 1:
-            # Add a scalar summary for the snapshot of loss
+        if not tf.get_variable_scope().reuse:
+            # Add a scalar summary for the snapshot of loss (only in the
+            # first tower)
             with tf.name_scope("total_loss"):
                 self.summaries_train.append(
                     tf.summary.scalar('loss_train', loss))
@@ -140,15 +158,21 @@ class ctcBase(object):
         return loss, logits
 
     def train(self, loss, optimizer, learning_rate_init=None,
-              clip_grad_by_norm=None, is_scheduled=False):
+              clip_grad_by_norm=None, is_scheduled=False, num_accumulate=1):
         """Operation for training.
         Args:
-            loss: An operation for computing loss
+            loss: An operation for computing loss, or a list of operations
+                for computing loss of each tower. In the latter, gradients of
+                towers are averaged and applied once.
             optimizer: string, name of the optimizer in OPTIMIZER_CLS_NAMES
             learning_rate_init: initial learning rate
             clip_grad_by_norm: if True, clip gradients by norm of the
                 value of self.clip_grad
             is_scheduled: if True, schedule learning rate at each epoch
+            num_accumulate: int, the number of micro-batches to accumulate
+                gradients over before one update. If larger than 1, run
+                `self.accumulate_op` for each micro-batch except the last
+                one, and train_op for the last one
         Returns:
             train_op: operation for training
         """
@@ -177,31 +201,45 @@ class ctcBase(object):
         # Create a variable to track the global step
         global_step = tf.Variable(0, name='global_step', trainable=False)
 
+        # Compute gradients (averaged over towers)
+        trainable_vars = tf.trainable_variables()
+        if isinstance(loss, (list, tuple)):
+            grads = average_gradients(
+                [tf.gradients(loss_each_tower, trainable_vars,
+                              colocate_gradients_with_ops=True)
+                 for loss_each_tower in loss])
+        else:
+            grads = tf.gradients(loss, trainable_vars)
+
+        self.accumulate_op = None
+        if num_accumulate > 1:
+            # Gradient accumulation (clipping is applied to the accumulated
+            # gradients)
+            self.accumulate_op, grads, reset_op_fn = accumulate_gradients(
+                grads, trainable_vars, num_accumulate)
+
         if self.clip_grad is not None:
             # Gradient clipping
-            train_op = self._gradient_clipping(loss,
-                                               optimizer,
-                                               clip_grad_by_norm,
-                                               global_step)
+            grads = self._gradient_clipping(grads, clip_grad_by_norm)
 
             # TODO: Optionally add noise to weight matrix when training
             # どっちが先？
 
-        else:
-            # Use the optimizer to apply the gradients that minimize the loss
-            # and also increment the global step counter as a single training
-            # step
-            train_op = optimizer.minimize(loss, global_step=global_step)
+        # Apply the gradients and also increment the global step counter as
+        # a single training step
+        train_op = optimizer.apply_gradients(
+            zip(grads, trainable_vars),
+            global_step=global_step,
+            name='train')
+
+        if num_accumulate > 1:
+            # Zero the accumulators after the update
+            train_op = reset_op_fn([train_op])
 
         return train_op
 
-    def _gradient_clipping(self, loss, optimizer, clip_grad_by_norm,
-                           global_step):
+    def _gradient_clipping(self, grads, clip_grad_by_norm):
         print('--- Apply gradient clipping ---')
-        # Compute gradients
-        trainable_vars = tf.trainable_variables()
-        grads = tf.gradients(loss, trainable_vars)
-
         if clip_grad_by_norm:
             # Clip by norm
             self.clipped_grads = [tf.clip_by_norm(
@@ -217,21 +255,20 @@ class ctcBase(object):
         # TODO: Add histograms for variables, gradients (norms)
         # self._tensorboard_statistics(trainable_vars)
 
-        # Create gradient updates
-        train_op = optimizer.apply_gradients(
-            zip(self.clipped_grads, trainable_vars),
-            global_step=global_step,
-            name='train')
-
-        return train_op
+        return self.clipped_grads
 
-    def decoder(self, logits, inputs_seq_len, decode_type, beam_width=None):
+    def decoder(self, logits, inputs_seq_len, decode_type, beam_width=None,
+                blank_skip_threshold=None):
         """Operation for decoding.
         Args:
             logits:
             inputs_seq_len: A tensor of size `[batch_size]`
             decode_type: greedy or beam_search
             beam_width: beam width for beam search
+            blank_skip_threshold: float, runs of frames whose blank
+                posteriors are higher than this are collapsed into one frame
+                before beam search (see `_collapse_blank_frames`). If None,
+                all frames are expanded
         Return:
             decode_op: operation for decoding
         """
@@ -246,13 +283,60 @@ class ctcBase(object):
             if beam_width is None:
                 raise ValueError('Set beam_width.')
 
+            inputs_seq_len = tf.cast(inputs_seq_len, tf.int32)
+            if blank_skip_threshold is not None:
+                logits, inputs_seq_len = self._collapse_blank_frames(
+                    logits, inputs_seq_len, blank_skip_threshold)
+
             decoded, _ = tf.nn.ctc_beam_search_decoder(
-                logits, tf.cast(inputs_seq_len, tf.int32),
-                beam_width=beam_width)
+                logits, inputs_seq_len, beam_width=beam_width)
 
         decode_op = tf.to_int32(decoded[0])
         return decode_op
 
+    def _collapse_blank_frames(self, logits, inputs_seq_len, threshold):
+        """Collapse each run of frames whose blank posteriors are higher than
+           the threshold into its first frame, and pack the remaining frames
+           to the beginning. One blank frame is kept for each run so that
+           repeated labels on both sides stay separated. Greedy decoding
+           results are unchanged if threshold >= 0.5, but beam search no
+           longer expands the collapsed frames.
+        Args:
+            logits: A tensor of size `[max_time, batch_size, num_classes]`
+            inputs_seq_len: A tensor of size `[batch_size]` (int32)
+            threshold: float, the threshold of blank posteriors
+        Returns:
+            logits: A tensor of size
+                `[max_time_collapsed, batch_size, num_classes]`
+            inputs_seq_len: A tensor of size `[batch_size]`, the number of
+                the remaining frames
+        """
+        with tf.name_scope("collapse_blank_frames"):
+            max_time = tf.shape(logits)[0]
+            # The blank class is the last class
+            is_blank = tf.nn.softmax(logits)[:, :, -1] > threshold
+            is_blank_prev = tf.concat(
+                [tf.zeros_like(is_blank[:1]), is_blank[:-1]], axis=0)
+            is_valid = tf.transpose(tf.sequence_mask(
+                inputs_seq_len, maxlen=max_time))
+            is_kept = tf.logical_and(
+                is_valid, tf.logical_not(tf.logical_and(is_blank,
+                                                        is_blank_prev)))
+
+            # New time index of each remaining frame
+            is_kept_int = tf.to_int32(is_kept)
+            time_index = tf.cumsum(is_kept_int, axis=0) - 1
+            indices = tf.to_int32(tf.where(is_kept))  # `[N, 2]` (time, batch)
+            indices_new = tf.stack(
+                [tf.gather_nd(time_index, indices), indices[:, 1]], axis=1)
+
+            logits = tf.scatter_nd(indices_new,
+                                   tf.gather_nd(logits, indices),
+                                   tf.shape(logits))
+            inputs_seq_len = tf.reduce_sum(is_kept_int, axis=0)
+            logits = logits[:tf.reduce_max(inputs_seq_len)]
+        return logits, inputs_seq_len
+
     def posteriors(self, logits, decode_op):
         """Operation for computing posteriors of each time steps.
         Args:
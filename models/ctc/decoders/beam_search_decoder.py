@@ -0,0 +1,211 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""CTC prefix beam search decoder with shallow fusion of a n-gram language
+   model, which runs out of the graph on log-posteriors."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+import heapq
+from multiprocessing import Pool
+import numpy as np
+
+LOG_0 = -float('inf')
+
+
+def _log_add(a, b):
+    if a == LOG_0:
+        return b
+    if b == LOG_0:
+        return a
+    if a > b:
+        return a + math.log1p(math.exp(b - a))
+    return b + math.log1p(math.exp(a - b))
+
+
+class BeamSearchDecoder(object):
+    """CTC prefix beam search. This implementation is based on
+        https://arxiv.org/abs/1408.2873.
+            Hannun, Awni Y., et al.
+            "First-pass large vocabulary continuous speech recognition using
+            bi-directional recurrent DNNs."
+            arXiv preprint arXiv:1408.2873 (2014).
+       Hypotheses are ranked by
+           log p_ctc + lm_weight * log p_lm + insertion_bonus * length
+    Args:
+        blank_index: int, the index of the blank class (the last class in
+            tf.nn.ctc_loss)
+        beam_width: int, the number of hypotheses to keep at each frame
+        lm: NgramLM. If None, decode without language model
+        vocab: list of tokens of the language model for each index
+            (e.g. Vocab.id2label). Required if lm is given
+        lm_weight: float, the weight of the language model score
+        insertion_bonus: float, the bonus for each token to balance the
+            language model score
+        prune_threshold: float, tokens whose posteriors are lower than this
+            are not expanded at the frame
+        blank_skip_threshold: float, frames whose blank posteriors are higher
+            than this are only extended by blank, without expanding any
+            token. If None, all frames are expanded
+    """
+
+    def __init__(self, blank_index, beam_width=20, lm=None, vocab=None,
+                 lm_weight=0.5, insertion_bonus=0., prune_threshold=1e-4,
+                 blank_skip_threshold=None):
+        if lm is not None and vocab is None:
+            raise ValueError('Set vocab to use the language model.')
+
+        self.blank_index = blank_index
+        self.beam_width = beam_width
+        self.lm = lm
+        self.vocab = vocab
+        self.lm_weight = lm_weight
+        self.insertion_bonus = insertion_bonus
+        self.log_prune_threshold = math.log(prune_threshold) \
+            if prune_threshold > 0 else LOG_0
+        self.log_blank_skip_threshold = None
+        if blank_skip_threshold is not None:
+            self.log_blank_skip_threshold = math.log(blank_skip_threshold)
+
+    def __call__(self, log_probs, nbest=1):
+        """Decode an utterance.
+        Args:
+            log_probs: A tensor of size `[time, num_classes]`, the
+                log-posteriors of each frame
+            nbest: int, the number of hypotheses to return
+        Returns:
+            hypotheses: list of tuples `(labels, score)` from the best,
+                where labels is a list of indices
+        """
+        # key => prefix (tuple of indices),
+        # value => [log prob ending in blank, log prob ending in non-blank]
+        beams = {(): [0., LOG_0]}
+        # key => prefix, value => (LM state, LM score of the prefix)
+        lm_cache = {(): (self.lm.start() if self.lm is not None else None,
+                         0.)}
+
+        for log_probs_t in log_probs:
+            log_prob_blank = float(log_probs_t[self.blank_index])
+            next_beams = {}
+
+            if (self.log_blank_skip_threshold is not None and
+                    log_prob_blank > self.log_blank_skip_threshold):
+                # Extend all hypotheses by blank only
+                for prefix, (p_b, p_nb) in beams.items():
+                    next_beams[prefix] = [_log_add(p_b, p_nb) +
+                                          log_prob_blank, LOG_0]
+                beams = next_beams
+                continue
+
+            # Tokens to expand at this frame
+            candidates = [int(c) for c in np.where(
+                log_probs_t >= self.log_prune_threshold)[0]
+                if c != self.blank_index]
+
+            for prefix, (p_b, p_nb) in beams.items():
+                p_total = _log_add(p_b, p_nb)
+
+                # Blank: the prefix is unchanged
+                entry = next_beams.setdefault(prefix, [LOG_0, LOG_0])
+                entry[0] = _log_add(entry[0], p_total + log_prob_blank)
+
+                last = prefix[-1] if len(prefix) > 0 else None
+                if last is not None:
+                    # Repeat of the last token without blank in between
+                    entry[1] = _log_add(
+                        entry[1], p_nb + float(log_probs_t[last]))
+
+                for c in candidates:
+                    log_prob_c = float(log_probs_t[c])
+                    new_prefix = prefix + (c,)
+                    new_entry = next_beams.setdefault(new_prefix,
+                                                      [LOG_0, LOG_0])
+                    if c == last:
+                        # The same token is emitted again only after blank
+                        new_entry[1] = _log_add(new_entry[1],
+                                                p_b + log_prob_c)
+                    else:
+                        new_entry[1] = _log_add(new_entry[1],
+                                                p_total + log_prob_c)
+
+            beams = dict(heapq.nlargest(
+                self.beam_width, next_beams.items(),
+                key=lambda x: self._score(x[0], x[1], lm_cache)))
+
+        hypotheses = []
+        for prefix, probs in beams.items():
+            score = self._score(prefix, probs, lm_cache)
+            if self.lm is not None:
+                # End of sentence
+                score += self.lm_weight * self.lm.score(
+                    lm_cache[prefix][0], '</s>')[0]
+            hypotheses.append((list(prefix), score))
+        hypotheses.sort(key=lambda x: -x[1])
+        return hypotheses[:nbest]
+
+    def _score(self, prefix, probs, lm_cache):
+        score = _log_add(probs[0], probs[1]) + \
+            self.insertion_bonus * len(prefix)
+        if self.lm is not None:
+            score += self.lm_weight * self._lm_score(prefix, lm_cache)
+        return score
+
+    def _lm_score(self, prefix, lm_cache):
+        if prefix not in lm_cache:
+            self._lm_score(prefix[:-1], lm_cache)
+            state, score = lm_cache[prefix[:-1]]
+            log_prob, next_state = self.lm.score(
+                state, self.vocab[prefix[-1]])
+            lm_cache[prefix] = (next_state, score + log_prob)
+        return lm_cache[prefix][1]
+
+    def decode_batch(self, log_probs, inputs_seq_len, num_process=1):
+        """Decode a mini-batch (in parallel processes).
+        Args:
+            log_probs: A tensor of size `[batch_size, max_time, num_classes]`
+            inputs_seq_len: A tensor of size `[batch_size]`
+            num_process: int, the number of processes. If 1, decode in this
+                process
+        Returns:
+            labels_pred: list of lists of indices of the best hypotheses
+        """
+        log_probs_list = [log_probs[i, :int(inputs_seq_len[i])]
+                          for i in range(len(inputs_seq_len))]
+        if num_process == 1:
+            return [self(log_probs_i)[0][0] for log_probs_i in log_probs_list]
+
+        # The decoder (and the language model) is sent to each process once
+        pool = Pool(num_process, initializer=_init_worker, initargs=(self,))
+        try:
+            return pool.map(_decode_worker, log_probs_list)
+        finally:
+            pool.close()
+            pool.join()
+
+
+_decoder = None
+
+
+def _init_worker(decoder):
+    global _decoder
+    _decoder = decoder
+
+
+def _decode_worker(log_probs):
+    return _decoder(log_probs)[0][0]
+
+
+def posteriors_to_log_probs(posteriors, batch_size):
+    """Convert outputs of `ctcBase.posteriors` to log-posteriors.
+    Args:
+        posteriors: A tensor of size `[max_time * batch_size, num_classes]`
+            (time-major)
+        batch_size: int, the size of mini-batch
+    Returns:
+        log_probs: A tensor of size `[batch_size, max_time, num_classes]`
+    """
+    posteriors = posteriors.reshape((-1, batch_size, posteriors.shape[-1]))
+    return np.log(np.maximum(posteriors.transpose((1, 0, 2)), 1e-30))
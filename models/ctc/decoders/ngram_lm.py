@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""N-gram language model in the ARPA format."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+
+LOG_10 = math.log(10)
+
+
+class NgramLM(object):
+    """Back-off n-gram language model loaded from an ARPA file. Scores are
+       natural logarithms.
+    Args:
+        arpa_path: path to the ARPA file
+        unk_log_prob: float, the log probability (log10, as in ARPA) of
+            tokens which are not in the vocabulary when the model has no
+            `<unk>`
+    """
+
+    def __init__(self, arpa_path, unk_log_prob=-10.0):
+        # key => tuple of tokens, value => (log prob, log backoff weight)
+        self.ngrams = {}
+        self.order = 0
+
+        with open(arpa_path, 'r') as f:
+            order = 0
+            for line in f:
+                line = line.strip()
+                if line == '' or line.startswith('ngram '):
+                    continue
+                if line == '\\data\\' or line == '\\end\\':
+                    order = 0
+                    continue
+                if line.startswith('\\') and line.endswith('-grams:'):
+                    order = int(line[1:line.index('-')])
+                    self.order = max(self.order, order)
+                    continue
+                if order == 0:
+                    continue
+
+                fields = line.split()
+                log_prob = float(fields[0]) * LOG_10
+                ngram = tuple(fields[1:1 + order])
+                log_backoff = 0.
+                if len(fields) > 1 + order:
+                    log_backoff = float(fields[1 + order]) * LOG_10
+                self.ngrams[ngram] = (log_prob, log_backoff)
+
+        if ('<unk>',) in self.ngrams:
+            self.unk_log_prob = self.ngrams[('<unk>',)][0]
+        else:
+            self.unk_log_prob = unk_log_prob * LOG_10
+
+    def start(self):
+        """
+        Returns:
+            state: tuple of tokens of the history at the beginning of a
+                sentence
+        """
+        return ('<s>',) if self.order > 1 else ()
+
+    def score(self, state, token):
+        """
+        Args:
+            state: tuple of tokens of the history
+            token: string, the next token
+        Returns:
+            log_prob: float, the log probability of the token
+            next_state: tuple of tokens of the history after the token
+        """
+        history = state
+        log_backoff = 0.
+        while True:
+            entry = self.ngrams.get(history + (token,))
+            if entry is not None:
+                log_prob = log_backoff + entry[0]
+                break
+            if len(history) == 0:
+                log_prob = log_backoff + self.unk_log_prob
+                break
+            # Back off to the shorter history
+            log_backoff += self.ngrams.get(history, (0., 0.))[1]
+            history = history[1:]
+
+        next_state = (state + (token,))[-(self.order - 1):] \
+            if self.order > 1 else ()
+        # Keep the longest history which is in the model
+        while len(next_state) > 0 and next_state not in self.ngrams:
+            next_state = next_state[1:]
+        return log_prob, next_state
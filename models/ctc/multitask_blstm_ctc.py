@@ -87,10 +87,7 @@ class Multitask_BLSTM_CTC(ctcBase):
             logits:
         """
         # Dropout for inputs
-        self.keep_prob_input = tf.placeholder(tf.float32,
-                                              name='keep_prob_input')
-        self.keep_prob_hidden = tf.placeholder(tf.float32,
-                                               name='keep_prob_hidden')
+        self._generate_dropout_placeholders()
         outputs = tf.nn.dropout(inputs,
                                 self.keep_prob_input,
                                 name='dropout_input')
@@ -158,14 +155,17 @@ class Multitask_BLSTM_CTC(ctcBase):
                     outputs_hidden = tf.reshape(
                         outputs, shape=[-1, output_node])
 
-                    with tf.name_scope('output_second'):
+                    with tf.variable_scope('output_second'):
                         # Affine
-                        W_output = tf.Variable(tf.truncated_normal(
+                        W_output = tf.get_variable(
+                            'W_output_second',
                             shape=[output_node, self.num_classes_second],
-                            stddev=0.1, name='W_output_second'))
-                        b_output = tf.Variable(tf.zeros(
+                            initializer=tf.truncated_normal_initializer(
+                                stddev=0.1))
+                        b_output = tf.get_variable(
+                            'b_output_second',
                             shape=[self.num_classes_second],
-                            name='b_output_second'))
+                            initializer=tf.zeros_initializer())
                         logits_2d = tf.matmul(
                             outputs_hidden, W_output) + b_output
 
@@ -185,23 +185,29 @@ class Multitask_BLSTM_CTC(ctcBase):
         outputs = tf.reshape(outputs, shape=[-1, output_node])
 
         if self.bottleneck_dim is not None:
-            with tf.name_scope('bottleneck'):
+            with tf.variable_scope('bottleneck'):
                 # Affine
-                W_bottleneck = tf.Variable(tf.truncated_normal(
-                    shape=[output_node, self.bottleneck_dim],
-                    stddev=0.1, name='W_bottleneck'))
-                b_bottleneck = tf.Variable(tf.zeros(
-                    shape=[self.bottleneck_dim], name='b_bottleneck'))
+                W_bottleneck = tf.get_variable(
+                    'W_bottleneck', shape=[output_node, self.bottleneck_dim],
+                    initializer=tf.truncated_normal_initializer(stddev=0.1))
+                b_bottleneck = tf.get_variable(
+                    'b_bottleneck', shape=[self.bottleneck_dim],
+                    initializer=tf.zeros_initializer())
                 outputs = tf.matmul(outputs, W_bottleneck) + b_bottleneck
                 output_node = self.bottleneck_dim
 
-        with tf.name_scope('output_main'):
+        # NOTE: tf.get_variable is used so that variables are shared among
+        # towers in data-parallel training. Older checkpoints have these
+        # variables as `Variable` and `Variable_1` in each scope (see
+        # compatible_var_dict in experiments/utils/checkpoint.py)
+        with tf.variable_scope('output_main'):
             # Affine
-            W_output = tf.Variable(tf.truncated_normal(
-                shape=[output_node, self.num_classes],
-                stddev=0.1, name='W_output_main'))
-            b_output = tf.Variable(tf.zeros(
-                shape=[self.num_classes], name='b_output_main'))
+            W_output = tf.get_variable(
+                'W_output_main', shape=[output_node, self.num_classes],
+                initializer=tf.truncated_normal_initializer(stddev=0.1))
+            b_output = tf.get_variable(
+                'b_output_main', shape=[self.num_classes],
+                initializer=tf.zeros_initializer())
             logits_2d = tf.matmul(outputs, W_output) + b_output
 
             # Reshape back to the original shape
@@ -221,7 +227,9 @@ class Multitask_BLSTM_CTC(ctcBase):
             labels_main: A SparseTensor of target labels in the main task
             labels_second: A SparseTensor of target labels in the second task
             inputs_seq_len: A tensor of size `[batch_size]`
-            num_gpu: the number of GPUs
+            num_gpu: the number of towers (see models/data_parallel.py)
+            scope: the name scope of the tower. Only losses in this scope
+                are summed up
         Returns:
             loss: operation for computing ctc loss
             logits_main:
@@ -230,6 +238,9 @@ class Multitask_BLSTM_CTC(ctcBase):
         # Build model graph
         logits_main, logits_second = self._build(inputs, inputs_seq_len)
 
+        # Add summaries only in the first tower
+        is_first_tower = not tf.get_variable_scope().reuse
+
         # Weight decay
         weight_sum = 0
         for var in tf.trainable_variables():
@@ -246,12 +257,13 @@ class Multitask_BLSTM_CTC(ctcBase):
             tf.add_to_collection(
                 'losses', ctc_loss_mean * self.main_task_weight)
 
-            self.summaries_train.append(
-                tf.summary.scalar('ctc_loss_train_main',
-                                  ctc_loss_mean * self.main_task_weight))
-            self.summaries_dev.append(
-                tf.summary.scalar('ctc_loss_dev_main',
-                                  ctc_loss_mean * self.main_task_weight))
+            if is_first_tower:
+                self.summaries_train.append(
+                    tf.summary.scalar('ctc_loss_train_main',
+                                      ctc_loss_mean * self.main_task_weight))
+                self.summaries_dev.append(
+                    tf.summary.scalar('ctc_loss_dev_main',
+                                      ctc_loss_mean * self.main_task_weight))
 
         with tf.name_scope("ctc_loss_second"):
             ctc_loss = tf.nn.ctc_loss(labels_second,
@@ -262,27 +274,29 @@ class Multitask_BLSTM_CTC(ctcBase):
             tf.add_to_collection(
                 'losses', ctc_loss_mean * self.second_task_weight)
 
-            self.summaries_train.append(
-                tf.summary.scalar('ctc_loss_train_second',
-                                  ctc_loss_mean * self.second_task_weight))
-            self.summaries_dev.append(
-                tf.summary.scalar('ctc_loss_dev_second',
-                                  ctc_loss_mean * self.second_task_weight))
+            if is_first_tower:
+                self.summaries_train.append(
+                    tf.summary.scalar('ctc_loss_train_second',
+                                      ctc_loss_mean * self.second_task_weight))
+                self.summaries_dev.append(
+                    tf.summary.scalar('ctc_loss_dev_second',
+                                      ctc_loss_mean * self.second_task_weight))
 
         # Total loss
-        loss = tf.add_n(tf.get_collection('losses'), name='total_loss')
+        loss = tf.add_n(tf.get_collection('losses', scope), name='total_loss')
 
         # Add a scalar summary for the snapshot of loss
-        with tf.name_scope("total_loss"):
-            self.summaries_train.append(
-                tf.summary.scalar('total_loss_train', loss))
-            self.summaries_dev.append(
-                tf.summary.scalar('total_loss_dev', loss))
+        if is_first_tower:
+            with tf.name_scope("total_loss"):
+                self.summaries_train.append(
+                    tf.summary.scalar('total_loss_train', loss))
+                self.summaries_dev.append(
+                    tf.summary.scalar('total_loss_dev', loss))
 
         return loss, logits_main, logits_second
 
     def decoder(self, logits_main, logits_second, inputs_seq_len, decode_type,
-                beam_width=None):
+                beam_width=None, blank_skip_threshold=None):
         """Operation for decoding.
         Args:
             logits_main:
@@ -290,6 +304,10 @@ class Multitask_BLSTM_CTC(ctcBase):
             inputs_seq_len: A tensor of size `[batch_size]`
             decode_type: greedy or beam_search
             beam_width: beam width for beam search
+            blank_skip_threshold: float, runs of frames whose blank
+                posteriors are higher than this are collapsed into one frame
+                before beam search in each task. If None, all frames are
+                expanded
         Return:
             decode_op_main: operation for decoding of the main task
             decode_op_second: operation for decoding of the second task
@@ -307,12 +325,22 @@ class Multitask_BLSTM_CTC(ctcBase):
             if beam_width is None:
                 raise ValueError('Set beam_width.')
 
+            inputs_seq_len = tf.cast(inputs_seq_len, tf.int32)
+            inputs_seq_len_main = inputs_seq_len
+            inputs_seq_len_second = inputs_seq_len
+            if blank_skip_threshold is not None:
+                # Blank frames differ between tasks
+                logits_main, inputs_seq_len_main = \
+                    self._collapse_blank_frames(
+                        logits_main, inputs_seq_len, blank_skip_threshold)
+                logits_second, inputs_seq_len_second = \
+                    self._collapse_blank_frames(
+                        logits_second, inputs_seq_len, blank_skip_threshold)
+
             decoded_main, _ = tf.nn.ctc_beam_search_decoder(
-                logits_main, tf.cast(inputs_seq_len, tf.int32),
-                beam_width=beam_width)
+                logits_main, inputs_seq_len_main, beam_width=beam_width)
             decoded_second, _ = tf.nn.ctc_beam_search_decoder(
-                logits_second, tf.cast(inputs_seq_len, tf.int32),
-                beam_width=beam_width)
+                logits_second, inputs_seq_len_second, beam_width=beam_width)
 
         decode_op_main = tf.to_int32(decoded_main[0])
         decode_op_second = tf.to_int32(decoded_second[0])
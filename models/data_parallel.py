@@ -0,0 +1,154 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Utilities for data-parallel training with multiple towers. Each tower
+   is a replica of the model graph which shares variables with the others
+   and computes gradients of a part of the mini-batch. Gradients of all
+   towers are averaged and applied once.
+   A mini-batch can be also split into micro-batches whose gradients are
+   accumulated before one update (see accumulate_gradients).
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+
+def tower_scopes(num_tower, device_type='cpu'):
+    """Enter the scopes of each tower in turn.
+       Usage:
+           for i_tower, scope in tower_scopes(num_tower):
+               loss, logits = network.compute_loss(..., num_gpu=num_tower,
+                                                   scope=scope)
+    Args:
+        num_tower: int, the number of towers. If 1, no scope is entered, so
+            that the graph is the same as that of a single model
+        device_type: cpu or gpu. Towers are placed on `/cpu:0`, `/cpu:1`, ...
+            (see session_config) or `/gpu:0`, `/gpu:1`, ...
+    Yields:
+        i_tower: int, the index of the tower
+        scope: string, the name scope of the tower (None if num_tower is 1)
+    """
+    if num_tower == 1:
+        yield 0, None
+        return
+
+    for i_tower in range(num_tower):
+        with tf.device('/%s:%d' % (device_type, i_tower)):
+            with tf.name_scope('tower_%d' % i_tower) as scope:
+                # Variables are created in the first tower and reused in
+                # the others
+                with tf.variable_scope(tf.get_variable_scope(),
+                                       reuse=True if i_tower > 0 else None):
+                    yield i_tower, scope
+
+
+def split_batch(inputs_seq_len, num_accumulate=1, num_tower=1):
+    """Split indices of a mini-batch into micro-batches and towers.
+    Args:
+        inputs_seq_len: A tensor of size `[batch_size]`
+        num_accumulate: int, the number of micro-batches. Utterances are
+            sorted by length, and each micro-batch is a run of utterances of
+            similar length to reduce padding
+        num_tower: int, the number of towers. Utterances of each micro-batch
+            are dealt to towers in turn to balance their lengths
+    Returns:
+        indices_list: list (over micro-batches) of lists (over towers) of
+            arrays of indices. If the mini-batch is smaller than
+            `num_accumulate * num_tower` (e.g. the last mini-batch of an
+            epoch), utterances are repeated so that every part gets at least
+            one.
+    """
+    batch_size = len(inputs_seq_len)
+    if num_accumulate == 1 and num_tower == 1:
+        return [[np.arange(batch_size)]]
+
+    indices = np.argsort(inputs_seq_len, kind='mergesort')
+    num_split = num_accumulate * num_tower
+    if batch_size < num_split:
+        indices = indices[np.arange(num_split) % batch_size]
+
+    return [[indices_micro[i_tower::num_tower]
+             for i_tower in range(num_tower)]
+            for indices_micro in np.array_split(indices, num_accumulate)]
+
+
+def average_gradients(tower_grads):
+    """Average gradients of each variable over towers.
+    Args:
+        tower_grads: list of lists of gradients. The outer list is over
+            towers and the inner list is over variables (the same order in
+            all towers). None is kept for variables without gradients.
+    Returns:
+        grads: list of averaged gradients
+    """
+    grads = []
+    for grads_each_var in zip(*tower_grads):
+        if grads_each_var[0] is None:
+            grads.append(None)
+            continue
+        with tf.name_scope('average_gradients'):
+            # NOTE: IndexedSlices (e.g. gradients of embeddings) are
+            # converted to dense tensors
+            grads.append(tf.add_n([tf.convert_to_tensor(g)
+                                   for g in grads_each_var]) /
+                         float(len(grads_each_var)))
+    return grads
+
+
+def accumulate_gradients(grads, trainable_vars, num_accumulate):
+    """Accumulate gradients over micro-batches in non-trainable variables.
+    Args:
+        grads: list of gradients of each variable (None is kept)
+        trainable_vars: list of variables corresponding to grads
+        num_accumulate: int, the number of micro-batches to accumulate
+    Returns:
+        accumulate_op: operation to add gradients of a micro-batch divided
+            by num_accumulate to the accumulators
+        grads_accumulated: list of accumulated gradients, read after
+            accumulate_op. Apply these to update with the averaged gradients
+            of all micro-batches including the current one
+        reset_op_fn: function which takes a list of operations and returns
+            an operation to zero the accumulators after them
+    """
+    with tf.name_scope('accumulate_gradients'):
+        accumulators = [
+            None if g is None else
+            tf.Variable(tf.zeros(var.get_shape(), dtype=var.dtype.base_dtype),
+                        trainable=False, name='accumulator')
+            for g, var in zip(grads, trainable_vars)]
+        accumulate_op = tf.group(*[
+            acc.assign_add(tf.convert_to_tensor(g) / float(num_accumulate))
+            for g, acc in zip(grads, accumulators) if g is not None])
+        with tf.control_dependencies([accumulate_op]):
+            grads_accumulated = [None if acc is None else tf.identity(acc)
+                                 for acc in accumulators]
+
+    def reset_op_fn(dependencies):
+        with tf.control_dependencies(dependencies):
+            return tf.group(*[acc.assign(tf.zeros_like(acc))
+                              for acc in accumulators if acc is not None],
+                            name='reset_accumulators')
+
+    return accumulate_op, grads_accumulated, reset_op_fn
+
+
+def session_config(num_tower, num_thread=None, device_type='cpu'):
+    """Make a session config which creates one CPU device for each tower.
+    Args:
+        num_tower: int, the number of towers
+        num_thread: int, the number of threads for each op. If None, decided
+            by TensorFlow
+        device_type: cpu or gpu
+    Returns:
+        config: tf.ConfigProto
+    """
+    config = tf.ConfigProto(allow_soft_placement=True)
+    if device_type == 'cpu':
+        config.device_count['CPU'] = num_tower
+    if num_thread is not None:
+        config.intra_op_parallelism_threads = num_thread
+    return config
@@ -0,0 +1,169 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../')
+sys.path.append('../../')
+from attention import blstm_attention_seq2seq
+from util import measure_time
+from data import generate_data
+
+
+def cut_at_eos(labels, eos_index):
+    labels = list(labels)
+    if eos_index in labels:
+        return labels[:labels.index(eos_index) + 1]
+    return labels
+
+
+class TestAttentionBeamSearch(tf.test.TestCase):
+
+    @measure_time
+    def test_attention_beam_search(self):
+        print("Attention beam search Working check.")
+        self.check_beam_search(length_penalty_weight=0.0)
+        self.check_beam_search(length_penalty_weight=1.0)
+
+    def check_beam_search(self, length_penalty_weight):
+        print('----- length_penalty_weight: %.1f -----' %
+              length_penalty_weight)
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            batch_size = 4
+            inputs, labels, inputs_seq_len, labels_seq_len = generate_data(
+                label_type='character',
+                model='attention',
+                batch_size=batch_size)
+            output_size = 26 + 2
+            eos_index = output_size - 1
+            beam_width = 5
+
+            network = blstm_attention_seq2seq.BLSTMAttetion(
+                batch_size=batch_size,
+                input_size=inputs[0].shape[1],
+                encoder_num_unit=64,
+                encoder_num_layer=1,
+                attention_dim=32,
+                decoder_num_unit=64,
+                decoder_num_layer=1,
+                embedding_dim=16,
+                output_size=output_size,
+                sos_index=output_size - 2,
+                eos_index=eos_index,
+                max_decode_length=20,
+                parameter_init=0.1)
+            network.define()
+
+            _, decode_op_greedy = network.decoder(decode_type='greedy')
+            # Beam search with a beam of 1 is greedy decoding (without
+            # length normalization)
+            _, decode_op_beam1 = network.decoder(
+                decode_type='beam_search', beam_width=1,
+                length_penalty_weight=length_penalty_weight)
+            _, decode_op_beam = network.decoder(
+                decode_type='beam_search', beam_width=beam_width,
+                length_penalty_weight=length_penalty_weight)
+            nbest_op = network.decoder_outputs_beam_search
+
+            with self.test_session() as sess:
+                sess.run(tf.global_variables_initializer())
+                feed_dict = {
+                    network.inputs: inputs,
+                    network.inputs_seq_len: inputs_seq_len,
+                    network.keep_prob_input: 1.0,
+                    network.keep_prob_hidden: 1.0
+                }
+                ids_greedy, ids_beam1, ids_beam, nbest = sess.run(
+                    [decode_op_greedy, decode_op_beam1, decode_op_beam,
+                     nbest_op], feed_dict=feed_dict)
+
+        if length_penalty_weight == 0:
+            for i_batch in range(batch_size):
+                self.assertEqual(cut_at_eos(ids_greedy[i_batch], eos_index),
+                                 cut_at_eos(ids_beam1[i_batch], eos_index))
+
+        self.assertEqual(nbest.predicted_ids.shape[:2],
+                         (batch_size, beam_width))
+        self.assertLessEqual(nbest.predicted_ids.shape[2], 20)
+        self.assertAllEqual(ids_beam, nbest.predicted_ids[:, 0])
+        # n-best lists are sorted from the best
+        self.assertTrue(np.all(np.diff(nbest.scores, axis=1) <= 0))
+        for i_batch in range(batch_size):
+            for i_beam in range(beam_width):
+                labels_pred = cut_at_eos(
+                    nbest.predicted_ids[i_batch, i_beam], eos_index)
+                self.assertEqual(nbest.lengths[i_batch, i_beam],
+                                 len(labels_pred))
+
+    @measure_time
+    def test_attention_beam_search_without_eos(self):
+        print("Attention beam search (wider than classes) Working check.")
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            batch_size = 4
+            inputs, labels, inputs_seq_len, labels_seq_len = generate_data(
+                label_type='character',
+                model='attention',
+                batch_size=batch_size)
+            output_size = 26 + 2
+            eos_index = output_size - 1
+            # Wider than output_size / 2, so that candidates are also
+            # extended from dead beams
+            beam_width = 20
+            max_decode_length = 5
+
+            network = blstm_attention_seq2seq.BLSTMAttetion(
+                batch_size=batch_size,
+                input_size=inputs[0].shape[1],
+                encoder_num_unit=64,
+                encoder_num_layer=1,
+                attention_dim=32,
+                decoder_num_unit=64,
+                decoder_num_layer=1,
+                embedding_dim=16,
+                output_size=output_size,
+                sos_index=output_size - 2,
+                eos_index=eos_index,
+                max_decode_length=max_decode_length,
+                parameter_init=0.1)
+            network.define()
+
+            network.decoder(decode_type='beam_search', beam_width=beam_width)
+            nbest_op = network.decoder_outputs_beam_search
+            logits_biases = [var for var in tf.global_variables()
+                             if var.op.name.endswith('logits/biases')]
+            self.assertEqual(len(logits_biases), 1)
+
+            with self.test_session() as sess:
+                sess.run(tf.global_variables_initializer())
+
+                # Never emit eos, so that no hypotheses are finished
+                biases = sess.run(logits_biases[0])
+                biases[eos_index] = -1e3
+                logits_biases[0].load(biases, sess)
+
+                feed_dict = {
+                    network.inputs: inputs,
+                    network.inputs_seq_len: inputs_seq_len,
+                    network.keep_prob_input: 1.0,
+                    network.keep_prob_hidden: 1.0
+                }
+                nbest = sess.run(nbest_op, feed_dict=feed_dict)
+
+        # Alive hypotheses are returned instead of those from dead beams
+        self.assertEqual(nbest.predicted_ids.shape,
+                         (batch_size, beam_width, max_decode_length))
+        self.assertTrue(np.all(nbest.scores > -1e6))
+        self.assertFalse(np.any(nbest.predicted_ids == eos_index))
+        self.assertTrue(np.all(nbest.lengths == max_decode_length))
+
+
+if __name__ == "__main__":
+    tf.test.main()
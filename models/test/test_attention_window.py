@@ -0,0 +1,73 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../')
+sys.path.append('../../')
+from attention.decoders.attention_layer import AttentionLayer
+from util import measure_time
+
+
+class TestAttentionWindow(tf.test.TestCase):
+
+    @measure_time
+    def test_attention_window(self):
+        print("Windowed attention Working check.")
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            batch_size, max_time, encoder_num_unit = 3, 30, 8
+            rng = np.random.RandomState(0)
+            encoder_states = tf.constant(rng.randn(
+                batch_size, max_time, encoder_num_unit).astype(np.float32))
+            decoder_state = tf.constant(
+                rng.randn(batch_size, 6).astype(np.float32))
+            values_length = tf.constant([30, 20, 4])
+            attention_peak = tf.constant([0, 18, 2])
+
+            def attend(window):
+                attention_layer = AttentionLayer(
+                    num_unit=16, attention_weights_tempareture=1.0,
+                    window=window)
+                att_encoder_states = attention_layer.project_encoder_states(
+                    encoder_states)
+                return attention_layer(
+                    att_encoder_states=att_encoder_states,
+                    current_decoder_state=decoder_state,
+                    values=encoder_states,
+                    values_length=values_length,
+                    attention_peak=attention_peak)
+
+            with tf.variable_scope('attention') as scope:
+                outputs_full = attend(None)
+                scope.reuse_variables()
+                # A window wider than utterances is full attention
+                outputs_wide = attend((max_time, max_time))
+                outputs_narrow = attend((2, 3))
+
+            with self.test_session() as sess:
+                sess.run(tf.global_variables_initializer())
+                ((weights_full, context_full), (weights_wide, context_wide),
+                 (weights_narrow, _)) = sess.run(
+                    [outputs_full, outputs_wide, outputs_narrow])
+
+        self.assertAllClose(weights_full, weights_wide)
+        self.assertAllClose(context_full, context_wide)
+
+        # Weights are only in the window (shifted into the utterance)
+        self.assertEqual(weights_narrow.shape, (batch_size, max_time))
+        self.assertAllClose(np.sum(weights_narrow, axis=1),
+                            np.ones(batch_size))
+        for i_batch, (start, end) in enumerate([(0, 6), (14, 20), (0, 4)]):
+            self.assertEqual(np.sum(weights_narrow[i_batch, :start]), 0)
+            self.assertEqual(np.sum(weights_narrow[i_batch, end:]), 0)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,127 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import itertools
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append('../')
+from ctc.decoders.beam_search_decoder import BeamSearchDecoder
+from ctc.decoders.ngram_lm import NgramLM
+from util import measure_time
+
+
+def generate_log_probs(max_time, num_classes, seed=0):
+    rng = np.random.RandomState(seed)
+    logits = rng.randn(max_time, num_classes) * 2
+    logits -= logits.max(axis=1, keepdims=True)
+    return logits - np.log(np.exp(logits).sum(axis=1, keepdims=True))
+
+
+def best_labels_exhaustive(log_probs, blank_index):
+    """Sum probabilities of all alignments for each labeling."""
+    probs = {}
+    for path in itertools.product(range(log_probs.shape[1]),
+                                  repeat=log_probs.shape[0]):
+        labels = tuple(c for i, c in enumerate(path)
+                       if c != blank_index and (i == 0 or c != path[i - 1]))
+        probs[labels] = probs.get(labels, 0) + np.exp(
+            sum(log_probs[t, c] for t, c in enumerate(path)))
+    return list(max(probs.items(), key=lambda x: x[1])[0])
+
+
+ARPA = """\\data\\
+ngram 1=5
+ngram 2=2
+
+\\1-grams:
+-1.0 <s> -0.3
+-1.0 </s>
+-0.5 a -0.3
+-2.0 b -0.3
+-2.0 <unk>
+
+\\2-grams:
+-0.1 <s> a
+-0.1 a </s>
+
+\\end\\
+"""
+
+
+class TestCTCBeamSearch(unittest.TestCase):
+
+    @measure_time
+    def test_ctc_beam_search(self):
+        print("CTC prefix beam search Working check.")
+        self.check_exhaustive()
+        self.check_lm()
+        self.check_blank_skip()
+        self.check_batch()
+
+    def check_exhaustive(self):
+        # A large beam gives the most probable labeling
+        for seed in range(5):
+            log_probs = generate_log_probs(max_time=5, num_classes=3,
+                                           seed=seed)
+            decoder = BeamSearchDecoder(blank_index=2, beam_width=100,
+                                        prune_threshold=0)
+            self.assertEqual(decoder(log_probs)[0][0],
+                             best_labels_exhaustive(log_probs, 2))
+
+    def check_lm(self):
+        # Posteriors are ambiguous between `a` and `b`
+        log_probs = np.log(np.array([[0.45, 0.55, 0.0001],
+                                     [0.0001, 0.0001, 0.9998]]) + 1e-10)
+        decoder = BeamSearchDecoder(blank_index=2, beam_width=10)
+        self.assertEqual(decoder(log_probs)[0][0], [1])
+
+        with tempfile.NamedTemporaryFile('w', suffix='.arpa',
+                                         delete=False) as f:
+            f.write(ARPA)
+        try:
+            lm = NgramLM(f.name)
+        finally:
+            os.remove(f.name)
+        self.assertAlmostEqual(lm.score(('<s>',), 'a')[0],
+                               -0.1 * np.log(10))
+        # Back-off: bow(a) + p(b)
+        self.assertAlmostEqual(lm.score(('a',), 'b')[0],
+                               (-0.3 - 2.0) * np.log(10))
+
+        decoder = BeamSearchDecoder(blank_index=2, beam_width=10, lm=lm,
+                                    vocab=['a', 'b'], lm_weight=0.5)
+        self.assertEqual(decoder(log_probs)[0][0], [0])
+
+    def check_blank_skip(self):
+        log_probs = generate_log_probs(max_time=50, num_classes=5, seed=1)
+        # Make every other frame a confident blank
+        log_probs[::2] = np.log([0.001, 0.001, 0.001, 0.001, 0.996])
+        decoder = BeamSearchDecoder(blank_index=4, beam_width=20)
+        decoder_skip = BeamSearchDecoder(blank_index=4, beam_width=20,
+                                         blank_skip_threshold=0.99)
+        self.assertEqual(decoder(log_probs)[0][0],
+                         decoder_skip(log_probs)[0][0])
+
+    def check_batch(self):
+        log_probs = np.stack([generate_log_probs(30, 6, seed=seed)
+                              for seed in range(4)])
+        inputs_seq_len = np.array([30, 20, 25, 10])
+        decoder = BeamSearchDecoder(blank_index=5, beam_width=8)
+        labels_pred = decoder.decode_batch(log_probs, inputs_seq_len)
+        self.assertEqual(
+            labels_pred,
+            decoder.decode_batch(log_probs, inputs_seq_len, num_process=2))
+        self.assertEqual(labels_pred[3],
+                         decoder(log_probs[3, :10])[0][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../')
+sys.path.append('../../')
+from ctc.ctc_base import ctcBase
+from util import measure_time
+from experiments.utils.sparsetensor import sparsetensor2list
+
+
+def generate_logits(max_time, batch_size, num_classes, seed=0):
+    """Peaky logits with long runs of blank frames (time-major)."""
+    rng = np.random.RandomState(seed)
+    logits = rng.randn(max_time, batch_size, num_classes).astype(np.float32)
+    logits[:, :, -1] += 8
+    for i_batch in range(batch_size):
+        frames = rng.choice(max_time, size=max_time // 5, replace=False)
+        tokens = rng.randint(0, num_classes - 1, size=len(frames))
+        logits[frames, i_batch, tokens] += 12
+    return logits
+
+
+def collapse_blank_frames(logits, inputs_seq_len, threshold):
+    """Reference implementation in numpy."""
+    probs = np.exp(logits) / np.exp(logits).sum(axis=2, keepdims=True)
+    is_blank = probs[:, :, -1] > threshold
+    logits_list = []
+    for i_batch, seq_len in enumerate(inputs_seq_len):
+        logits_list.append([logits[t, i_batch] for t in range(seq_len)
+                            if not (t > 0 and is_blank[t, i_batch] and
+                                    is_blank[t - 1, i_batch])])
+    return logits_list
+
+
+class TestCTCBlankSkip(tf.test.TestCase):
+
+    @measure_time
+    def test_ctc_blank_skip(self):
+        print("CTC blank frame collapsing Working check.")
+        self.check_collapse(threshold=0.99)
+        self.check_collapse(threshold=0.5)
+        self.check_decode(threshold=0.999)
+
+    def check_collapse(self, threshold):
+        max_time, batch_size, num_classes = 50, 4, 6
+        logits = generate_logits(max_time, batch_size, num_classes)
+        inputs_seq_len = np.array([50, 31, 45, 8], dtype=np.int32)
+        logits_list = collapse_blank_frames(logits, inputs_seq_len, threshold)
+
+        with tf.Graph().as_default():
+            network = ctcBase(batch_size, 10, 10, 1, num_classes - 1,
+                              0.1, 5.0, 50, 1.0, 1.0, 0.)
+            logits_op, seq_len_op = network._collapse_blank_frames(
+                tf.constant(logits), tf.constant(inputs_seq_len), threshold)
+            with self.test_session() as sess:
+                logits_collapsed, seq_len_collapsed = sess.run(
+                    [logits_op, seq_len_op])
+
+        self.assertAllEqual(seq_len_collapsed,
+                            [len(x) for x in logits_list])
+        self.assertEqual(logits_collapsed.shape[0], max(seq_len_collapsed))
+        for i_batch, logits_i in enumerate(logits_list):
+            self.assertAllClose(
+                logits_collapsed[:len(logits_i), i_batch], np.array(logits_i))
+
+    def check_decode(self, threshold):
+        max_time, batch_size, num_classes = 100, 8, 6
+        logits = generate_logits(max_time, batch_size, num_classes, seed=1)
+        inputs_seq_len = np.random.RandomState(1).randint(
+            50, max_time + 1, size=batch_size)
+
+        with tf.Graph().as_default():
+            network = ctcBase(batch_size, 10, 10, 1, num_classes - 1,
+                              0.1, 5.0, 50, 1.0, 1.0, 0.)
+            logits_pl = tf.placeholder(tf.float32,
+                                       shape=[None, None, num_classes])
+            inputs_seq_len_pl = tf.placeholder(tf.int64, shape=[None])
+            decode_op = network.decoder(logits_pl, inputs_seq_len_pl,
+                                        decode_type='beam_search',
+                                        beam_width=20)
+            decode_op_skip = network.decoder(
+                logits_pl, inputs_seq_len_pl, decode_type='beam_search',
+                beam_width=20, blank_skip_threshold=threshold)
+            with self.test_session() as sess:
+                feed_dict = {logits_pl: logits,
+                             inputs_seq_len_pl: inputs_seq_len}
+                labels_st, labels_st_skip = sess.run(
+                    [decode_op, decode_op_skip], feed_dict=feed_dict)
+
+        # Confident blank frames hardly change the best path
+        self.assertEqual(sparsetensor2list(labels_st, batch_size),
+                         sparsetensor2list(labels_st_skip, batch_size))
+
+
+if __name__ == "__main__":
+    tf.test.main()